@@ -0,0 +1,3 @@
+"""
+Бенчмарки запускаются из корня проекта: python -m benchmarks.<name>, результат печатается в JSON
+"""
@@ -0,0 +1,220 @@
+"""
+Сквозной прогон бота: настоящие обработчики router.build_handlers() получают обновления через
+UserOrderedUpdateProcessor, как в main.py, а Bot API отвечает локальная заглушка вместо Telegram.
+
+Сценарии: создание игр, 1000 вступлений в одну игру, просмотр игры участниками, распределение, выгрузка CSV.
+Для каждого сценария печатаются p50/p99 обработки обновления, пропускная способность, запросы к Bot API
+и обращения к базе. Прогон идет на RepositoryMemory и, если задан TEST_POSTGRES_DSN, на Postgres -
+отдельной базе, таблицы которой очищаются после прогона. Сохранение диалогов (PostgresPersistence) не входит.
+"""
+
+import asyncio
+import datetime
+import itertools
+import json
+import os
+import statistics
+import time
+from collections import Counter
+
+os.environ.setdefault("BOT_TOKEN", "0:benchmark")
+os.environ.setdefault("DEV_MODE", "1")
+os.environ["MEMORY_STORAGE_PATH"] = ""  # the benchmark never touches the dev journal
+
+from telegram import MessageEntity, Update  # noqa: E402
+from telegram.ext import Application, ContextTypes  # noqa: E402
+from telegram.request import BaseRequest, RequestData  # noqa: E402
+
+from src import db, tg  # noqa: E402
+from src.core import config  # noqa: E402
+from src.repository import RepositoryMemory  # noqa: E402
+from src.tg.elements.buttons import CallbackGame  # noqa: E402
+from src.tg.elements.data import CallbackData, CommandData  # noqa: E402
+from src.tg.utils.context import CustomContext, MemoryCustomContext  # noqa: E402
+from src.tg.utils.tg_calendar import Action, CallbackBuilder  # noqa: E402
+from src.tg.utils.update_processor import UserOrderedUpdateProcessor  # noqa: E402
+
+ADMINS = 100  # games created
+PLAYERS = 1000  # joins into the first game
+CSV_EXPORTS = 20  # by the admin of the first game, one after another
+TABLES = "games, players, notifications, bot_user_data, bot_conversations, game_reminders, games_archive"
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Santa", "username": "santa_benchmark_bot"}
+ADMIN_ID = 1_000_000  # admins are ADMIN_ID + i, players are 1..PLAYERS
+
+
+class StubBotApi(BaseRequest):
+    """Bot API без сети: отвечает на методы, которые вызывают обработчики, и считает запросы"""
+
+    def __init__(self):
+        self.calls = Counter()
+        self._message_ids = itertools.count(1)
+
+    @property
+    def read_timeout(self) -> float | None:
+        return None
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def _message(self, chat_id, text: str = None) -> dict:
+        chat_id = int(chat_id)
+        return {"message_id": next(self._message_ids), "date": int(time.time()), "text": text,
+                "chat": {"id": chat_id, "type": "private"}, "from": BOT_USER}
+
+    async def do_request(self, url: str, method: str, request_data: RequestData = None, *args, **kwargs):
+        name = url.rsplit("/", 1)[-1]
+        self.calls[name] += 1
+        params = request_data.parameters if request_data else {}
+
+        match name:
+            case "getMe":
+                result = BOT_USER
+            case "sendMessage" | "editMessageText" | "sendDocument":
+                result = self._message(params["chat_id"], params.get("text"))
+            case _:  # answerCallbackQuery, editMessageReplyMarkup, setMyCommands
+                result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+class UpdateFactory:
+    def __init__(self, bot):
+        self.bot = bot
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+
+    @staticmethod
+    def _user(user_id: int) -> dict:
+        return {"id": user_id, "is_bot": False, "first_name": f"User {user_id}", "username": f"user{user_id}"}
+
+    def _message(self, user_id: int, text: str, sender: dict = None) -> dict:
+        return {"message_id": next(self._message_ids), "date": int(time.time()), "text": text,
+                "chat": {"id": user_id, "type": "private"}, "from": sender or self._user(user_id)}
+
+    def text(self, user_id: int, text: str) -> Update:
+        message = self._message(user_id, text)
+        if text.startswith("/"):
+            message["entities"] = [{"type": MessageEntity.BOT_COMMAND, "offset": 0, "length": len(text.split()[0])}]
+        return Update.de_json({"update_id": next(self._update_ids), "message": message}, self.bot)
+
+    def command(self, user_id: int, command: str, *args: str) -> Update:
+        return self.text(user_id, " ".join(("/" + command, *args)))
+
+    def callback(self, user_id: int, data: str) -> Update:
+        query = {"id": str(next(self._update_ids)), "from": self._user(user_id), "chat_instance": str(user_id),
+                 "data": data, "message": self._message(user_id, "...", BOT_USER)}
+        return Update.de_json({"update_id": next(self._update_ids), "callback_query": query}, self.bot)
+
+
+class Scenario:
+    """Обрабатывает обновления как Application в main.py и собирает задержки и счетчики"""
+
+    def __init__(self, app: Application, api: StubBotApi):
+        self.app = app
+        self.api = api
+
+    async def _handle(self, update: Update, latencies: list[float]):
+        started = time.perf_counter()
+        await self.app.update_processor.process_update(update, self.app.process_update(update))
+        latencies.append(time.perf_counter() - started)
+
+    async def run(self, name: str, users: list[list[Update]]) -> dict:
+        """Пользователи работают параллельно, обновления одного пользователя идут по очереди"""
+        latencies = []
+        queries, calls = db.query_stats["queries"], sum(self.api.calls.values())
+
+        async def user_session(updates: list[Update]):
+            for update in updates:
+                await self._handle(update, latencies)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user_session(updates) for updates in users))
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            "scenario": name,
+            "updates": len(latencies),
+            "p50_ms": round(statistics.median(latencies) * 1000, 2),
+            "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 2),
+            "updates_per_second": round(len(latencies) / elapsed, 1),
+            "bot_api_calls": sum(self.api.calls.values()) - calls,
+            "db_queries": db.query_stats["queries"] - queries,
+        }
+
+
+async def _run_backend(backend: str, context_class: type[CustomContext]) -> list[dict]:
+    api = StubBotApi()
+    app = (Application.builder()
+           .token(config.BOT_TOKEN)
+           .request(api)
+           .get_updates_request(StubBotApi())
+           .context_types(ContextTypes(context=context_class))
+           .concurrent_updates(UserOrderedUpdateProcessor(config.UPDATE_WORKERS))
+           .build())
+    await tg.setup(app)
+    storage = context_class.db_storage
+
+    async with app:
+        await app.job_queue.start()  # conversation timeouts are scheduled as in production
+        updates = UpdateFactory(app.bot)
+        scenario = Scenario(app, api)
+        date_finish = datetime.date.today() + datetime.timedelta(days=30)
+        select_date = CallbackBuilder(Action.SELECT, [date_finish.year, date_finish.month, date_finish.day]).build()
+
+        results = [await scenario.run("create_game", [[
+            updates.command(ADMIN_ID + i, CommandData.CREATE_GAME),
+            updates.text(ADMIN_ID + i, f"Game {i}"),
+            updates.text(ADMIN_ID + i, "Description"),
+            updates.callback(ADMIN_ID + i, select_date),
+        ] for i in range(ADMINS)])]
+
+        game_uuid = (await storage.get_list(ADMIN_ID))[0].uuid
+        results.append(await scenario.run("join", [
+            [updates.command(user_id, CommandData.START, game_uuid)] for user_id in range(1, PLAYERS + 1)
+        ]))
+
+        view = str(CallbackGame(CallbackData.VIEW_GAME, game_uuid))
+        results.append(await scenario.run("view_game", [
+            [updates.callback(user_id, view)] for user_id in range(1, PLAYERS + 1)
+        ]))
+
+        shuffle = str(CallbackGame(CallbackData.SHUFFLE_PLAYERS, game_uuid))
+        results.append(await scenario.run("shuffle", [[updates.callback(ADMIN_ID, shuffle)]]))
+
+        upload = str(CallbackGame(CallbackData.UPLOAD_LIST_PLAYERS, game_uuid))
+        results.append(await scenario.run("players_csv", [
+            [updates.callback(ADMIN_ID, upload) for _ in range(CSV_EXPORTS)]
+        ]))
+        await app.job_queue.stop()
+
+    for result in results:
+        result["backend"] = backend
+    return results
+
+
+async def run() -> list[dict]:
+    class BenchmarkMemoryContext(MemoryCustomContext):
+        db_storage = RepositoryMemory(path="")
+
+    results = await _run_backend("memory", BenchmarkMemoryContext)
+
+    dsn = os.environ.get("TEST_POSTGRES_DSN")
+    if dsn:
+        config.POSTGRES_DSN = dsn
+        db.setup()
+        await db.init_pool()
+        try:
+            results += await _run_backend("postgres", CustomContext)
+        finally:
+            async with db.connection() as conn:
+                await conn.execute(f"TRUNCATE {TABLES} CASCADE")
+            await db.close_pool()
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(asyncio.run(run()), indent=2))
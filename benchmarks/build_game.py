@@ -0,0 +1,131 @@
+"""
+Сборка игры из строки запроса Repository.get при 10, 1 000 и 10 000 участников:
+прежний путь json_agg + json.loads против array_agg, который asyncpg декодирует из бинарного протокола.
+
+Без базы сравнивается только _build_game: текст json_agg против уже декодированных записей.
+Если задан TEST_POSTGRES_DSN, дополнительно измеряется запрос целиком - отдельная база, таблицы очищаются после прогона
+"""
+
+import asyncio
+import datetime
+import json
+import os
+import time
+import uuid
+
+os.environ.setdefault("BOT_TOKEN", "0:benchmark")
+os.environ.setdefault("DEV_MODE", "1")
+
+from telegram import User  # noqa: E402
+
+from src import db  # noqa: E402
+from src.core import config  # noqa: E402
+from src.domain.model import GameSanta, GameState, Player  # noqa: E402
+from src.repository import Repository  # noqa: E402
+
+SIZES = (10, 1000, 10000)
+REPEATS = 20
+TABLES = "games, players, notifications, bot_user_data, bot_conversations, game_reminders, games_archive"
+
+# the query and the decoding used before array_agg
+JSON_AGG_SQL = """
+    select
+        games.*,
+        COALESCE(json_agg(pl.*) FILTER (WHERE pl.id IS NOT NULL), '[]') as players
+    from games
+    left join players as pl
+        on games.uuid = pl.game_uuid
+    where games.uuid = $1
+    group by games.uuid;
+"""
+
+
+def _build_game_json(raw_game) -> GameSanta:
+    dict_game = dict(**raw_game)
+    dict_game["players"] = json.loads(dict_game["players"])
+
+    if dict_game["players"]:
+        players = {p["id"]: Player(**p) for p in dict_game["players"]}
+        for player in players.values():
+            player.recipient = players.get(player.recipient_id) if player.recipient_id else None
+        dict_game["players"] = list(players.values())
+
+    return GameSanta(**dict_game)
+
+
+def _best(call) -> float:
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def _rows(n: int) -> tuple[dict, dict]:
+    """Строка игры в виде json_agg и в виде декодированного array_agg"""
+    game_uuid = uuid.uuid4()
+    game = {"uuid": game_uuid, "state": GameState.ALLOCATED.value, "initiator_id": 1, "initiator_fullname": "Admin",
+            "title": "Game", "description": "Description", "date_finish": datetime.date(2026, 12, 31), "version": n}
+    players = [{"id": i, "telegram_id": 1000 + i, "fullname": f"Player {i}", "username": f"player{i}",
+                "recipient_id": i % n + 1, "game_uuid": str(game_uuid)} for i in range(1, n + 1)]
+    return {**game, "players": json.dumps(players)}, {**game, "players": players}
+
+
+async def _fetch(n: int) -> dict:
+    repository = Repository()
+    game = GameSanta.build_from_user(User(1, "Admin", False))
+    game.title, game.description, game.date_finish = "Game", "Description", datetime.date(2026, 12, 31)
+    await repository.save(game)
+    async with db.connection() as conn:
+        await conn.execute("""
+            INSERT INTO players (telegram_id, fullname, username, game_uuid)
+            SELECT p, 'Player ' || p, 'player' || p, $2::uuid FROM generate_series(1, $1) AS p
+        """, n, game.uuid)
+
+    async def best(call) -> float:
+        timings = []
+        for _ in range(REPEATS):
+            started = time.perf_counter()
+            await call()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
+
+    async def json_agg():
+        async with db.connection() as conn:
+            return _build_game_json(await conn.fetchrow(JSON_AGG_SQL, game.uuid))
+
+    return {"fetch_json_agg_ms": round(await best(json_agg) * 1000, 3),
+            "fetch_array_agg_ms": round(await best(lambda: repository.get(game.uuid)) * 1000, 3)}
+
+
+async def run() -> list[dict]:
+    results = []
+    for n in SIZES:
+        json_row, records_row = _rows(n)
+        json_time = _best(lambda: _build_game_json(json_row))
+        records_time = _best(lambda: Repository._build_game(records_row))
+        results.append({
+            "players": n,
+            "build_json_agg_ms": round(json_time * 1000, 3),
+            "build_array_agg_ms": round(records_time * 1000, 3),
+            "speedup": round(json_time / records_time, 2),
+        })
+
+    dsn = os.environ.get("TEST_POSTGRES_DSN")
+    if dsn:
+        config.POSTGRES_DSN = dsn
+        db.setup()
+        await db.init_pool()
+        try:
+            for result in results:
+                result.update(await _fetch(result["players"]))
+        finally:
+            async with db.connection() as conn:
+                await conn.execute(f"TRUNCATE {TABLES} CASCADE")
+            await db.close_pool()
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(asyncio.run(run()), indent=2))
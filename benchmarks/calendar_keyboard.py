@@ -0,0 +1,60 @@
+"""
+Нажатия листания месяцев календаря в секунду: разбор callback_data, handle и клавиатура месяца,
+как в handle_calendar. Клавиатуры из кэша _month_keyboard против построения месяца на каждое нажатие
+"""
+
+import json
+import os
+import time
+from datetime import date, timedelta
+from unittest import mock
+
+os.environ.setdefault("BOT_TOKEN", "0:benchmark")
+os.environ.setdefault("DEV_MODE", "1")
+
+from src.tg.utils import tg_calendar  # noqa: E402
+from src.tg.utils.tg_calendar import Action, CallbackBuilder, Locale, TgCalendarKeyboard  # noqa: E402
+
+CALLBACKS = 20000
+REPEATS = 3
+
+
+def _month_callbacks() -> list[str]:
+    """Листание вперед по всем месяцам диапазона по умолчанию (90 дней) и обратно"""
+    start = date.today() + timedelta(days=1)
+    months = []
+    for day in range(0, 91, 28):
+        month = start + timedelta(days=day)
+        if (month.year, month.month) not in months:
+            months.append((month.year, month.month))
+    path = months + months[-2:0:-1]
+    return [CallbackBuilder(Action.CHANGE_MONTH, [year, month]).build() for year, month in path]
+
+
+def _callbacks_per_second(callbacks: list[str]) -> float:
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        for i in range(CALLBACKS):
+            calendar = TgCalendarKeyboard(locale=Locale.ru)
+            calendar.handle(callbacks[i % len(callbacks)])
+            assert calendar.keyboard.inline_keyboard
+        timings.append(time.perf_counter() - started)
+    return round(CALLBACKS / min(timings))
+
+
+def run() -> dict:
+    callbacks = _month_callbacks()
+    cached = _callbacks_per_second(callbacks)
+    with mock.patch.object(tg_calendar, "_month_keyboard", tg_calendar._month_keyboard.__wrapped__):
+        uncached = _callbacks_per_second(callbacks)
+    return {
+        "months": len(set(callbacks)),
+        "cached_callbacks_per_second": cached,
+        "uncached_callbacks_per_second": uncached,
+        "speedup": round(cached / uncached, 2),
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
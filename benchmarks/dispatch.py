@@ -0,0 +1,89 @@
+"""
+Стоимость выбора обработчика callback_query от числа действий: CallbackRouter разбирает callback_data
+один раз и ищет действие в словаре, прежняя цепочка CallbackQueryHandler проверяет регулярные выражения
+по очереди и затем разбирает callback_data еще раз. Нажатая кнопка - последнее действие цепочки
+"""
+
+import json
+import os
+import time
+import uuid
+
+os.environ.setdefault("BOT_TOKEN", "0:benchmark")
+os.environ.setdefault("DEV_MODE", "1")
+
+from telegram import Update  # noqa: E402
+from telegram.ext import CallbackQueryHandler  # noqa: E402
+
+from src.tg.elements.buttons import CallbackGame  # noqa: E402
+from src.tg.elements.data import RE_GAME_ID, CallbackData  # noqa: E402
+from src.tg.utils.callback_router import CallbackRouter  # noqa: E402
+
+ACTIONS = (10, 50, 200)
+DISPATCHES = 20000
+REPEATS = 3
+
+
+async def _callback(update, context):
+    pass
+
+
+def _update(data: str) -> Update:
+    return Update.de_json({"update_id": 1, "callback_query": {
+        "id": "1", "chat_instance": "1", "data": data,
+        "from": {"id": 10, "is_bot": False, "first_name": "User"},
+    }}, None)
+
+
+def _router(actions: int) -> CallbackRouter:
+    # the other actions are represented by keys that are never pressed, only the size of the table matters
+    routes = {f"action_{i}": _callback for i in range(actions - 1)}
+    return CallbackRouter({**routes, CallbackData.VIEW_GAME: _callback}, fallback=_callback)
+
+
+def _regex_chain(actions: int) -> list[CallbackQueryHandler]:
+    chain = [CallbackQueryHandler(_callback, pattern=rf"^action_{i}={RE_GAME_ID}$") for i in range(actions - 1)]
+    chain.append(CallbackQueryHandler(_callback, pattern=rf"^{CallbackData.VIEW_GAME}={RE_GAME_ID}$"))
+    return chain
+
+
+def _per_dispatch_ns(dispatch) -> float:
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        for _ in range(DISPATCHES):
+            dispatch()
+        timings.append(time.perf_counter() - started)
+    return round(min(timings) / DISPATCHES * 1e9, 1)
+
+
+def run() -> list[dict]:
+    game_id = str(uuid.uuid4())
+    compact = _update(str(CallbackGame(CallbackData.VIEW_GAME, game_id)))
+    legacy = _update(f"{CallbackData.VIEW_GAME}={game_id}")
+
+    results = []
+    for actions in ACTIONS:
+        router, chain = _router(actions), _regex_chain(actions)
+
+        def route():
+            callback, callback_game = router.check_update(compact)
+            assert callback_game.game_id == game_id
+
+        def walk_chain():
+            for handler in chain:
+                if handler.check_update(legacy):
+                    break
+            # the handler parsed the data again
+            assert CallbackGame.from_callback_data(legacy.callback_query.data).game_id == game_id
+
+        results.append({
+            "actions": actions,
+            "router_ns": _per_dispatch_ns(route),
+            "regex_chain_ns": _per_dispatch_ns(walk_chain),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
@@ -0,0 +1,127 @@
+"""
+Память и задержки модели при 10, 1 000 и 10 000 участников:
+- байты на участника у GameSanta со slotted Player (так игра хранится в user_data диалогов и в RepositoryCache)
+  против прежнего Player с __dict__ и у записи игры в RepositoryMemory;
+- check_member по индексу telegram_id против прежнего перебора списка;
+- присваивание отслеживаемого поля игры
+"""
+
+import asyncio
+import dataclasses
+import datetime
+import gc
+import json
+import os
+import time
+import tracemalloc
+
+os.environ.setdefault("BOT_TOKEN", "0:benchmark")
+os.environ.setdefault("DEV_MODE", "1")
+
+from telegram import User  # noqa: E402
+
+from src.domain.model import GameSanta, Player  # noqa: E402
+from src.repository import RepositoryMemory  # noqa: E402
+
+SIZES = (10, 1000, 10000)
+LOOKUPS = 10000
+ASSIGNMENTS = 100000
+
+
+@dataclasses.dataclass
+class _DictPlayer:
+    """Player до __slots__"""
+    id: int
+    telegram_id: int
+    fullname: str
+    username: str
+    recipient_id: int
+    game_uuid: str | None
+    recipient: '_DictPlayer' = None
+
+
+def _allocated(build) -> tuple[int, object]:
+    """Байты, занятые результатом build"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = build()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return size, result
+
+
+def _players(cls, n: int) -> list:
+    # names and usernames are built inside, as they are when decoded from the database
+    return [cls(i, 1000 + i, f"Player {i}", f"player{i}", None, "game") for i in range(1, n + 1)]
+
+
+def _game(n: int) -> GameSanta:
+    game = GameSanta.build_from_user(User(1, "Admin", False))
+    game.uuid, game.title, game.description = "game", "Game", "Description"
+    for player in _players(Player, n):
+        game.add_saved_player(player)
+    return game
+
+
+async def _memory_record(n: int) -> int:
+    repository = RepositoryMemory(maxsize=0, path="")
+    game = GameSanta.build_from_user(User(1, "Admin", False))
+    game.title, game.description, game.date_finish = "Game", "Description", datetime.date(2026, 12, 31)
+    game = await repository.save(game)
+    before = len(repository.storage[game.uuid]["players"])
+    players = _players(Player, n)
+
+    async def join():
+        for player in players:
+            player.id = None
+            await repository.join_game(game.uuid, player)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        await join()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert len(repository.storage[game.uuid]["players"]) == before + n
+    return size
+
+
+def _per_call_ns(call, calls: int) -> float:
+    started = time.perf_counter()
+    for _ in range(calls):
+        call()
+    return round((time.perf_counter() - started) / calls * 1e9, 1)
+
+
+def run() -> list[dict]:
+    results = []
+    for n in SIZES:
+        slotted, _ = _allocated(lambda: _players(Player, n))
+        plain, _ = _allocated(lambda: _players(_DictPlayer, n))
+        game_size, game = _allocated(lambda: _game(n))
+        # RepositoryMemory keeps players as dict records, not Player objects
+        record_size = asyncio.run(_memory_record(n))
+
+        last = game.players[-1].telegram_id
+
+        def assign():
+            game.title = "Game"
+
+        results.append({
+            "players": n,
+            "player_slots_bytes": round(slotted / n),
+            "player_dict_bytes": round(plain / n),
+            "game_bytes_per_player": round(game_size / n),
+            "memory_record_bytes_per_player": round(record_size / n),
+            "check_member_index_ns": _per_call_ns(lambda: game.check_member(last), LOOKUPS),
+            "check_member_scan_ns": _per_call_ns(lambda: any(p.telegram_id == last for p in game.players), LOOKUPS),
+            "tracked_assignment_ns": _per_call_ns(assign, ASSIGNMENTS),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
@@ -0,0 +1,91 @@
+"""
+Время выгрузки CSV участников от размера игры до 100 000 участников: время на участника не должно расти.
+Прогон идет на RepositoryMemory и, если задан TEST_POSTGRES_DSN, на Postgres - отдельной базе,
+таблицы которой очищаются после прогона
+"""
+
+import asyncio
+import datetime
+import json
+import os
+import time
+
+os.environ.setdefault("BOT_TOKEN", "0:benchmark")
+os.environ.setdefault("DEV_MODE", "1")
+os.environ["MEMORY_STORAGE_PATH"] = ""
+
+from telegram import User  # noqa: E402
+
+from src import db  # noqa: E402
+from src.core import config  # noqa: E402
+from src.domain.model import GameSanta, Player  # noqa: E402
+from src.repository import AbstractRepository, Repository, RepositoryMemory  # noqa: E402
+
+SIZES = (1000, 10000, 100000)
+REPEATS = 3
+TABLES = "games, players, notifications, bot_user_data, bot_conversations, game_reminders, games_archive"
+
+
+def _new_game() -> GameSanta:
+    game = GameSanta.build_from_user(User(1, "Admin", False))
+    game.title, game.description, game.date_finish = "Game", "Description", datetime.date(2026, 12, 31)
+    return game
+
+
+async def _fill_memory(repository: RepositoryMemory, n: int) -> str:
+    game = await repository.save(_new_game())
+    for telegram_id in range(1, n + 1):
+        user = User(telegram_id, f'Player "{telegram_id}"; Jr', False, username=f"player{telegram_id}")
+        await repository.join_game(game.uuid, Player.build_from_user(user))
+    return game.uuid
+
+
+async def _fill_postgres(repository: Repository, n: int) -> str:
+    game = await repository.save(_new_game())
+    async with db.connection() as conn:
+        await conn.execute("""
+            INSERT INTO players (telegram_id, fullname, username, game_uuid)
+            SELECT p, 'Player "' || p || '"; Jr', 'player' || p, $2::uuid FROM generate_series(1, $1) AS p
+        """, n, game.uuid)
+    return game.uuid
+
+
+async def _measure(backend: str, repository: AbstractRepository, fill) -> list[dict]:
+    results = []
+    for n in SIZES:
+        game_uuid = await fill(repository, n)
+        timings, size = [], 0
+        for _ in range(REPEATS):
+            started = time.perf_counter()
+            with await repository.get_players_csv(game_uuid) as csv_file:
+                size = len(csv_file.read())
+            timings.append(time.perf_counter() - started)
+        results.append({
+            "backend": backend,
+            "players": n,
+            "bytes": size,
+            "best_ms": round(min(timings) * 1000, 2),
+            "per_player_us": round(min(timings) / n * 1e6, 3),
+        })
+    return results
+
+
+async def run() -> list[dict]:
+    results = await _measure("memory", RepositoryMemory(maxsize=0, path=""), _fill_memory)
+
+    dsn = os.environ.get("TEST_POSTGRES_DSN")
+    if dsn:
+        config.POSTGRES_DSN = dsn
+        db.setup()
+        await db.init_pool()
+        try:
+            results += await _measure("postgres", Repository(), _fill_postgres)
+        finally:
+            async with db.connection() as conn:
+                await conn.execute(f"TRUNCATE {TABLES} CASCADE")
+            await db.close_pool()
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(asyncio.run(run()), indent=2))
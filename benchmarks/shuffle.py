@@ -0,0 +1,69 @@
+"""
+Время распределения Сант от размера игры: без запретов, с парами (соседи не дарят друг другу),
+с запретом прошлогодних пар, с 10 запретами на игрока и с доказательством, что распределения нет
+"""
+
+import json
+import random
+import time
+
+from src.core.exception import ShuffleImpossibleError
+from src.domain.shuffle import derange
+
+SIZES = (1000, 10000, 30000)
+REPEATS = 3
+
+
+def _couples(n: int) -> dict[int, set[int]]:
+    forbidden = {}
+    for i in range(0, n - 1, 2):
+        forbidden[i] = {i + 1}
+        forbidden[i + 1] = {i}
+    return forbidden
+
+
+def _previous_year(n: int) -> dict[int, set[int]]:
+    previous = derange(n, rng=random.Random(0))
+    return {giver: {receiver} for giver, receiver in enumerate(previous)}
+
+
+def _dense(n: int) -> dict[int, set[int]]:
+    # every player excludes 10 random others: m = 10n
+    rng = random.Random(0)
+    return {giver: set(rng.sample(range(n), 10)) - {giver} for giver in range(n)}
+
+
+def _impossible(n: int) -> dict[int, set[int]]:
+    # nobody may give to the player 0: the search visits the whole graph before it proves that
+    return {giver: {0} for giver in range(1, n)}
+
+
+SCENARIOS = {"none": lambda n: {}, "couples": _couples, "previous_year": _previous_year, "dense": _dense,
+             "impossible": _impossible}
+
+
+def run() -> list[dict]:
+    results = []
+    for scenario, build in SCENARIOS.items():
+        for n in SIZES:
+            forbidden = build(n)
+            timings = []
+            for seed in range(REPEATS):
+                started = time.perf_counter()
+                try:
+                    derange(n, forbidden, random.Random(seed))
+                except ShuffleImpossibleError:
+                    pass
+                timings.append(time.perf_counter() - started)
+            results.append({
+                "scenario": scenario,
+                "players": n,
+                "exclusions": sum(len(r) for r in forbidden.values()),
+                "best_ms": round(min(timings) * 1000, 2),
+                "per_player_us": round(min(timings) / n * 1e6, 3),
+            })
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
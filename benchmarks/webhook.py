@@ -0,0 +1,124 @@
+"""
+Нагрузка на вебхук: клиенты держат keep-alive соединения, как Telegram (WEBHOOK_MAX_CONNECTIONS),
+и отправляют /start со ссылкой на игру от разных пользователей. Обновления проходят через WebhookServer,
+очередь Application и UserOrderedUpdateProcessor до настоящих обработчиков, Bot API - локальная заглушка.
+
+Печатаются p50/p99 ответа сервера, p50/p99 от отправки обновления до конца его обработки и пропускная способность
+"""
+
+import asyncio
+import json
+import statistics
+import time
+
+from telegram import User
+from telegram.ext import Application, ContextTypes
+
+from benchmarks.bot import StubBotApi, UpdateFactory  # sets the environment before src.core.config is read
+from src import tg
+from src.core import config
+from src.domain.model import GameSanta
+from src.repository import RepositoryMemory
+from src.tg.utils.context import MemoryCustomContext
+from src.tg.utils.update_processor import UserOrderedUpdateProcessor
+from src.tg.utils.webhook import SECRET_HEADER, WebhookServer
+
+UPDATES = 5000
+CONNECTIONS = config.WEBHOOK_MAX_CONNECTIONS
+PATH = "/telegram"
+SECRET = "benchmark"
+
+
+class _TimedUpdateProcessor(UserOrderedUpdateProcessor):
+    """Запоминает, когда закончилась обработка каждого обновления"""
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self.finished: dict[int, float] = {}
+        self.all_finished = asyncio.Event()
+
+    async def process_update(self, update, coroutine):
+        await super().process_update(update, coroutine)
+        self.finished[update.update_id] = time.perf_counter()
+        if len(self.finished) == UPDATES:
+            self.all_finished.set()
+
+
+def _percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * q))] * 1000, 2)
+
+
+async def _client(port: int, bodies: list[tuple[int, bytes]], sent: dict[int, float], responses: list[float]):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        for update_id, body in bodies:
+            started = time.perf_counter()
+            sent[update_id] = started
+            writer.write((f"POST {PATH} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                          f"{SECRET_HEADER}: {SECRET}\r\nContent-Length: {len(body)}\r\n\r\n").encode() + body)
+            await writer.drain()
+            status = await reader.readline()
+            assert status.split()[1] == b"200", status
+            while await reader.readline() not in (b"\r\n", b""):
+                pass  # the response has no body
+            responses.append(time.perf_counter() - started)
+    finally:
+        writer.close()
+
+
+async def run() -> dict:
+    class BenchmarkMemoryContext(MemoryCustomContext):
+        db_storage = RepositoryMemory(path="")
+
+    processor = _TimedUpdateProcessor(config.UPDATE_WORKERS)
+    app = (Application.builder()
+           .token(config.BOT_TOKEN)
+           .request(StubBotApi())
+           .get_updates_request(StubBotApi())
+           .context_types(ContextTypes(context=BenchmarkMemoryContext))
+           .concurrent_updates(processor)
+           .build())
+    await tg.setup(app)
+
+    game = GameSanta.build_from_user(User(1, "Admin", False))
+    game.title, game.description = "Game", "Description"
+    game = await BenchmarkMemoryContext.db_storage.save(game)
+
+    server = WebhookServer(app, "127.0.0.1", 0, PATH, SECRET)
+    async with app:
+        await app.start()
+        await server.start()
+        port = server._server.sockets[0].getsockname()[1]
+        try:
+            updates = UpdateFactory(app.bot)
+            bodies = []
+            for user_id in range(2, UPDATES + 2):
+                update = updates.command(user_id, "start", game.uuid)
+                bodies.append((update.update_id, json.dumps(update.to_dict()).encode()))
+
+            sent, responses = {}, []
+            started = time.perf_counter()
+            await asyncio.gather(*(_client(port, bodies[i::CONNECTIONS], sent, responses)
+                                   for i in range(CONNECTIONS)))
+            await processor.all_finished.wait()
+            elapsed = time.perf_counter() - started
+        finally:
+            await server.stop()
+            await app.stop()
+
+    handled = [processor.finished[update_id] - sent[update_id] for update_id in sent]
+    return {
+        "updates": UPDATES,
+        "connections": CONNECTIONS,
+        "response_p50_ms": _percentile(responses, 0.5),
+        "response_p99_ms": _percentile(responses, 0.99),
+        "handled_p50_ms": round(statistics.median(handled) * 1000, 2),
+        "handled_p99_ms": _percentile(handled, 0.99),
+        "updates_per_second": round(UPDATES / elapsed, 1),
+        "players": len((await BenchmarkMemoryContext.db_storage.get(game.uuid)).players),
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(asyncio.run(run()), indent=2))
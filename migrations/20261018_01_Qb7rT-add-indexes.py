@@ -0,0 +1,21 @@
+"""
+add_indexes
+"""
+
+from yoyo import step
+
+__depends__ = {"20240104_01_jaUzs-init-tables"}
+
+
+create = """
+CREATE INDEX IF NOT EXISTS games_initiator_id_idx ON games (initiator_id);
+CREATE INDEX IF NOT EXISTS players_game_uuid_idx ON players (game_uuid);
+CREATE INDEX IF NOT EXISTS players_telegram_id_game_uuid_idx ON players (telegram_id, game_uuid);
+"""
+delete = """
+DROP INDEX IF EXISTS games_initiator_id_idx;
+DROP INDEX IF EXISTS players_game_uuid_idx;
+DROP INDEX IF EXISTS players_telegram_id_game_uuid_idx;
+"""
+
+steps = [step(create, delete)]
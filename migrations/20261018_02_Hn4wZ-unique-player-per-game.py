@@ -0,0 +1,55 @@
+"""
+unique_player_per_game
+"""
+
+from yoyo import step
+
+__depends__ = {"20261018_01_Qb7rT-add-indexes"}
+
+
+create = """
+-- duplicates left by concurrent joins: the first row of a user in a game is kept.
+-- In a shuffled game the duplicate is cut out of the gift cycle: its giver gives to its recipient.
+-- Only when the kept row has no recipient does it take the place of the duplicate.
+-- Duplicates are handled one by one, the previous ones may have changed the cycle
+DO $$
+DECLARE
+    d record;
+    d_recipient integer;
+    keeper_recipient integer;
+BEGIN
+    FOR d IN
+        SELECT id, keeper_id, game_uuid
+        FROM (
+            SELECT id, game_uuid, min(id) OVER (PARTITION BY game_uuid, telegram_id) AS keeper_id
+            FROM players
+        ) AS p
+        WHERE id <> keeper_id
+        ORDER BY id
+    LOOP
+        SELECT recipient_id INTO d_recipient FROM players WHERE id = d.id;
+        SELECT recipient_id INTO keeper_recipient FROM players WHERE id = d.keeper_id;
+
+        IF keeper_recipient IS NULL AND d_recipient IS NOT NULL AND d_recipient <> d.keeper_id THEN
+            UPDATE players SET recipient_id = d_recipient WHERE id = d.keeper_id;
+            UPDATE players SET recipient_id = d.keeper_id WHERE game_uuid = d.game_uuid AND recipient_id = d.id;
+        ELSE
+            -- in a cycle of two the giver is left without a recipient rather than giving to itself
+            UPDATE players SET recipient_id = NULLIF(d_recipient, id)
+            WHERE game_uuid = d.game_uuid AND recipient_id = d.id;
+        END IF;
+
+        DELETE FROM players WHERE id = d.id;
+    END LOOP;
+END $$;
+
+ALTER TABLE players ADD CONSTRAINT players_game_uuid_telegram_id_key UNIQUE (game_uuid, telegram_id);
+-- covered by the unique index
+DROP INDEX IF EXISTS players_game_uuid_idx;
+"""
+delete = """
+CREATE INDEX IF NOT EXISTS players_game_uuid_idx ON players (game_uuid);
+ALTER TABLE players DROP CONSTRAINT IF EXISTS players_game_uuid_telegram_id_key;
+"""
+
+steps = [step(create, delete)]
@@ -0,0 +1,26 @@
+"""
+notifications_outbox
+"""
+
+from yoyo import step
+
+__depends__ = {"20261018_02_Hn4wZ-unique-player-per-game"}
+
+
+create = """
+CREATE TABLE notifications (
+    id BIGINT PRIMARY KEY GENERATED BY DEFAULT AS IDENTITY,
+    chat_id BIGINT NOT NULL,
+    text VARCHAR(4096) NOT NULL,  -- telegram size limit
+    parse_mode VARCHAR(16) NULL,
+    status SMALLINT NOT NULL,
+    attempts SMALLINT NOT NULL DEFAULT 0,
+    send_after TIMESTAMPTZ NOT NULL DEFAULT now(),
+    error TEXT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE INDEX notifications_pending_idx ON notifications (send_after) WHERE status = 21;
+"""
+delete = "DROP TABLE IF EXISTS notifications"
+
+steps = [step(create, delete)]
@@ -0,0 +1,95 @@
+"""
+shuffle_game_function
+"""
+
+from yoyo import step
+
+__depends__ = {"20261018_03_Tc9mV-notifications-outbox"}
+
+
+create = r"""
+-- mirrors telegram.helpers.escape_markdown(version=2) and mention_markdown(version=2)
+CREATE FUNCTION tg_escape_markdown_v2(value TEXT) RETURNS TEXT
+LANGUAGE SQL IMMUTABLE AS $$
+    SELECT regexp_replace(value, '([\\_*\[\]()~`>#+\-=|{}.!])', '\\\1', 'g')
+$$;
+
+CREATE FUNCTION tg_mention_markdown_v2(telegram_id BIGINT, fullname TEXT) RETURNS TEXT
+LANGUAGE SQL IMMUTABLE AS $$
+    SELECT '[' || tg_escape_markdown_v2(fullname) || '](tg://user?id=' || telegram_id || ')'
+$$;
+
+-- Assigns recipients of a game as one random cycle and queues the notifications, without loading players
+-- into the application. The game row is locked, so concurrent joins wait for the shuffle.
+CREATE FUNCTION shuffle_game(
+    p_game_uuid UUID,
+    p_working_states SMALLINT[],
+    p_allocated_state SMALLINT,
+    p_template TEXT,                -- placeholders {title}, {recipient}, {username}
+    p_parse_mode VARCHAR,
+    p_pending_status SMALLINT,
+    p_notify_channel TEXT,
+    p_notify_payload TEXT
+) RETURNS TABLE (shuffle_status TEXT, shuffled_players BIGINT)
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_state SMALLINT;
+    v_title TEXT;
+    v_players BIGINT;
+BEGIN
+    SELECT g.state, g.title INTO v_state, v_title FROM games AS g WHERE g.uuid = p_game_uuid FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN QUERY SELECT 'not_found'::TEXT, 0::BIGINT;
+        RETURN;
+    END IF;
+    IF NOT v_state = ANY (p_working_states) THEN
+        RETURN QUERY SELECT 'wrong_state'::TEXT, 0::BIGINT;
+        RETURN;
+    END IF;
+
+    SELECT count(*) INTO v_players FROM players AS pl WHERE pl.game_uuid = p_game_uuid;
+    IF v_players < 2 THEN
+        RETURN QUERY SELECT 'not_enough_players'::TEXT, v_players;
+        RETURN;
+    END IF;
+
+    -- everyone gives a gift to the next player in a random order
+    WITH ordered AS (
+        SELECT pl.id, row_number() OVER (ORDER BY random()) AS pos
+        FROM players AS pl
+        WHERE pl.game_uuid = p_game_uuid
+    )
+    UPDATE players AS target SET recipient_id = nxt.id
+    FROM ordered AS cur
+    JOIN ordered AS nxt ON nxt.pos = mod(cur.pos, v_players) + 1
+    WHERE target.id = cur.id;
+
+    UPDATE games AS g SET state = p_allocated_state WHERE g.uuid = p_game_uuid;
+
+    IF p_template IS NOT NULL THEN
+        INSERT INTO notifications (chat_id, text, parse_mode, status)
+        SELECT
+            pl.telegram_id,
+            replace(replace(replace(p_template,
+                '{title}', tg_escape_markdown_v2(v_title)),
+                '{recipient}', tg_mention_markdown_v2(r.telegram_id, r.fullname)),
+                '{username}', COALESCE(tg_escape_markdown_v2('@' || r.username), '')),
+            p_parse_mode,
+            p_pending_status
+        FROM players AS pl
+        JOIN players AS r ON r.id = pl.recipient_id
+        WHERE pl.game_uuid = p_game_uuid;
+    END IF;
+
+    PERFORM pg_notify(p_notify_channel, p_notify_payload);
+    RETURN QUERY SELECT 'shuffled'::TEXT, v_players;
+END
+$$;
+"""
+delete = """
+DROP FUNCTION IF EXISTS shuffle_game(UUID, SMALLINT[], SMALLINT, TEXT, VARCHAR, SMALLINT, TEXT, TEXT);
+DROP FUNCTION IF EXISTS tg_mention_markdown_v2(BIGINT, TEXT);
+DROP FUNCTION IF EXISTS tg_escape_markdown_v2(TEXT);
+"""
+
+steps = [step(create, delete)]
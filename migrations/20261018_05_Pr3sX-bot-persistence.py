@@ -0,0 +1,29 @@
+"""
+bot_persistence
+"""
+
+from yoyo import step
+
+__depends__ = {"20261018_04_Wd2kF-shuffle-game-function"}
+
+
+create = """
+CREATE TABLE bot_user_data (
+    user_id BIGINT PRIMARY KEY,
+    data JSONB NOT NULL,  -- compact drafts, not pickled objects
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE TABLE bot_conversations (
+    name VARCHAR(64) NOT NULL,
+    key TEXT NOT NULL,  -- json array of chat/user/message ids
+    state VARCHAR(64) NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (name, key)
+);
+"""
+delete = """
+DROP TABLE IF EXISTS bot_conversations;
+DROP TABLE IF EXISTS bot_user_data;
+"""
+
+steps = [step(create, delete)]
@@ -0,0 +1,16 @@
+"""
+game_version
+"""
+
+from yoyo import step
+
+__depends__ = {"20261018_05_Pr3sX-bot-persistence"}
+
+
+create = """
+-- bumped by every change of the game or its players
+ALTER TABLE games ADD COLUMN version INTEGER NOT NULL DEFAULT 0;
+"""
+delete = "ALTER TABLE games DROP COLUMN IF EXISTS version"
+
+steps = [step(create, delete)]
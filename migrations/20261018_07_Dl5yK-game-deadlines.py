@@ -0,0 +1,25 @@
+"""
+game_deadlines
+"""
+
+from yoyo import step
+
+__depends__ = {"20261018_06_Vr8nQ-game-version"}
+
+
+create = """
+-- the scheduler looks for due games of one state, so the state goes first
+CREATE INDEX IF NOT EXISTS games_state_date_finish_idx ON games (state, date_finish);
+
+-- date_finish the players were reminded of, a changed date is reminded again
+CREATE TABLE game_reminders (
+    game_uuid   UUID PRIMARY KEY REFERENCES games(uuid) ON DELETE CASCADE,
+    date_finish DATE NOT NULL
+);
+"""
+delete = """
+DROP TABLE IF EXISTS game_reminders;
+DROP INDEX IF EXISTS games_state_date_finish_idx;
+"""
+
+steps = [step(create, delete)]
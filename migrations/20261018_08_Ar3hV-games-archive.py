@@ -0,0 +1,30 @@
+"""
+games_archive
+"""
+
+from yoyo import step
+
+__depends__ = {"20261018_07_Dl5yK-game-deadlines"}
+
+
+create = """
+-- games older than the TTL with their players in one row, read only on request
+CREATE TABLE games_archive (
+    uuid UUID PRIMARY KEY NOT NULL,
+    state SMALLINT NOT NULL,
+    initiator_id BIGINT NOT NULL,
+    initiator_fullname VARCHAR(4096) NOT NULL,
+    title VARCHAR(4096) NOT NULL,
+    description VARCHAR(4096) NOT NULL,
+    date_finish DATE NOT NULL,
+    version INTEGER NOT NULL,
+    players JSONB NOT NULL,  -- [{id, telegram_id, fullname, username, recipient_id}]
+    member_ids BIGINT[] NOT NULL,  -- telegram_id of players, searched by the GIN index
+    archived_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE INDEX games_archive_initiator_id_idx ON games_archive (initiator_id);
+CREATE INDEX games_archive_member_ids_idx ON games_archive USING GIN (member_ids);
+"""
+delete = "DROP TABLE IF EXISTS games_archive"
+
+steps = [step(create, delete)]
@@ -0,0 +1,16 @@
+"""
+notifications_retention
+"""
+
+from yoyo import step
+
+__depends__ = {"20261018_08_Ar3hV-games-archive"}
+
+
+create = """
+-- the retention sweep deletes the oldest sent (22) and failed (23) notifications
+CREATE INDEX IF NOT EXISTS notifications_finished_idx ON notifications (created_at) WHERE status <> 21;
+"""
+delete = "DROP INDEX IF EXISTS notifications_finished_idx"
+
+steps = [step(create, delete)]
@@ -24,12 +24,53 @@ try:
     else:
         raise EnvRequiredError("POSTGRES_USER, POSTGRES_PASSWORD, POSTGRES_DB, POSTGRES_HOST, POSTGRES_PORT")
 
+    POSTGRES_POOL_MIN_SIZE = int(os.environ.get("POSTGRES_POOL_MIN_SIZE", 2))  # connections
+    POSTGRES_POOL_MAX_SIZE = int(os.environ.get("POSTGRES_POOL_MAX_SIZE", 10))  # connections
+    POSTGRES_POOL_ACQUIRE_TIMEOUT = float(os.environ.get("POSTGRES_POOL_ACQUIRE_TIMEOUT", 10))  # seconds
+    POSTGRES_POOL_MAX_INACTIVE = float(os.environ.get("POSTGRES_POOL_MAX_INACTIVE", 300))  # seconds, idle recycling
+
+    BOT_MODE = os.environ.get("BOT_MODE", "polling")  # polling | webhook
+    if BOT_MODE == "webhook":
+        WEBHOOK_URL = os.environ["WEBHOOK_URL"]  # public https url of WEBHOOK_PATH, e.g. https://example.com/telegram
+        WEBHOOK_SECRET_TOKEN = os.environ["WEBHOOK_SECRET_TOKEN"]  # 1-256 symbols A-Z, a-z, 0-9, _ and -
+    WEBHOOK_LISTEN = os.environ.get("WEBHOOK_LISTEN", "0.0.0.0")
+    WEBHOOK_PORT = int(os.environ.get("WEBHOOK_PORT", 8080))
+    WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "/telegram")
+    WEBHOOK_MAX_CONNECTIONS = int(os.environ.get("WEBHOOK_MAX_CONNECTIONS", 40))  # telegram side, 1-100
+
+    UPDATE_WORKERS = int(os.environ.get("UPDATE_WORKERS", 16))  # updates processed concurrently
+    PERSISTENCE_INTERVAL = float(os.environ.get("PERSISTENCE_INTERVAL", 5))  # seconds between dialog state writes
+
+    METRICS_PORT = int(os.environ["METRICS_PORT"]) if os.environ.get("METRICS_PORT") else None  # None - disabled
+    METRICS_LISTEN = os.environ.get("METRICS_LISTEN", "0.0.0.0")
+
     APP_MIGRATIONS_PATH = os.path.abspath("migrations")
 
-    LIMIT_TITLE_GAME = os.environ.get("LIMIT_TITLE_GAME", 40)  # symbols
-    LIMIT_DESCRIPTION_GAME = os.environ.get("LIMIT_DESCRIPTION_GAME", 100)  # symbols
-    LIMIT_CACHE_STORAGE = os.environ.get("LIMIT_CACHE_STORAGE", 60)  # seconds
-    LIMIT_STORAGE_GAME = os.environ.get("LIMIT_CACHE_STORAGE", 100)  # quantity game in storage
+    LIMIT_TITLE_GAME = int(os.environ.get("LIMIT_TITLE_GAME", 40))  # symbols
+    LIMIT_DESCRIPTION_GAME = int(os.environ.get("LIMIT_DESCRIPTION_GAME", 100))  # symbols
+    LIMIT_MY_GAMES_PAGE = int(os.environ.get("LIMIT_MY_GAMES_PAGE", 10))  # games on one page of "my games"
+    LIMIT_CACHE_STORAGE = int(os.environ.get("LIMIT_CACHE_STORAGE", 60))  # seconds
+    LIMIT_STORAGE_GAME = int(os.environ.get("LIMIT_STORAGE_GAME", 100))  # quantity game in storage
+    MEMORY_STORAGE_PATH = os.environ.get("MEMORY_STORAGE_PATH")  # file of games without postgres, empty - RAM only
+
+    NOTIFY_RATE = float(os.environ.get("NOTIFY_RATE", 25))  # messages per second for the whole bot
+    NOTIFY_CHAT_INTERVAL = float(os.environ.get("NOTIFY_CHAT_INTERVAL", 1))  # seconds between messages to one chat
+    NOTIFY_MAX_ATTEMPTS = int(os.environ.get("NOTIFY_MAX_ATTEMPTS", 5))
+    NOTIFY_POLL_INTERVAL = float(os.environ.get("NOTIFY_POLL_INTERVAL", 1))  # seconds
+    NOTIFY_RETENTION_DAYS = int(os.environ.get("NOTIFY_RETENTION_DAYS", 30))  # days to keep sent/failed, 0 - forever
+    NOTIFY_PRUNE_BATCH_SIZE = int(os.environ.get("NOTIFY_PRUNE_BATCH_SIZE", 1000))  # notifications per transaction
+
+    DEADLINE_SWEEP_INTERVAL = float(os.environ.get("DEADLINE_SWEEP_INTERVAL", 600))  # seconds
+    DEADLINE_BATCH_SIZE = int(os.environ.get("DEADLINE_BATCH_SIZE", 500))  # games per transaction
+    DEADLINE_REMIND_DAYS = int(os.environ.get("DEADLINE_REMIND_DAYS", 1))  # days before date_finish, 0 - disabled
+    DEADLINE_AUTO_SHUFFLE = os.environ.get("DEADLINE_AUTO_SHUFFLE", "").lower() in ("1", "true", "yes")
+
+    # 1 - shuffle avoids the pairs of the initiator's previous game, big games are then loaded whole
+    SHUFFLE_AVOID_REPEATS = os.environ.get("SHUFFLE_AVOID_REPEATS", "").lower() in ("1", "true", "yes")
+
+    ARCHIVE_TTL_DAYS = int(os.environ.get("ARCHIVE_TTL_DAYS", 180))  # days after date_finish, 0 - disabled
+    ARCHIVE_INTERVAL = float(os.environ.get("ARCHIVE_INTERVAL", 3600))  # seconds between archiving passes
+    ARCHIVE_BATCH_SIZE = int(os.environ.get("ARCHIVE_BATCH_SIZE", 200))  # games per transaction
 
     CSV_SPLITTER = os.environ.get("CSV_SPLITTER", ";")
 except KeyError as err:
@@ -7,3 +7,15 @@ class AppError(Exception):
 class EnvRequiredError(AppError):
     def __init__(self, var_name: str):
         self.add_note(f"Environment variable <{var_name}> is required!")
+
+
+class StaleGameError(AppError):
+    def __init__(self, game_uuid: str, version: int):
+        self.game_uuid = game_uuid
+        self.version = version
+        self.add_note(f"Game <{game_uuid}> has been changed or deleted since version {version} was read!")
+
+
+class ShuffleImpossibleError(AppError):
+    def __init__(self, players: int):
+        self.add_note(f"No valid assignment of recipients exists for {players} players with these restrictions!")
@@ -1,14 +1,158 @@
+import asyncio
+import logging
+import uuid
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable
+
 import asyncpg
-from asyncpg import Connection
+from asyncpg import Connection, Pool
+from asyncpg.connection import LoggedQuery
 
 from yoyo import read_migrations
 from yoyo import get_backend
 
+from src import metrics
 from src.core import config
+from src.core.exception import AppError
+
+
+CHANNEL_GAMES = "games_changed"
+# Отличает уведомления своего процесса от уведомлений других реплик
+PROCESS_TOKEN = uuid.uuid4().hex
+LISTENER_RECONNECT_DELAY = 5  # seconds
+
+logger = logging.getLogger(__name__)
+
+_pool: Pool | None = None
+_listener: Connection | None = None
+_subscribers: dict[str, list[Callable[[str | None], None]]] = defaultdict(list)
+# round-trips of the pool connections, e.g. to compare handlers in load runs
+query_stats = {"queries": 0, "errors": 0, "seconds": 0.0}
+
+
+class PoolNotInitializedError(AppError):
+    def __init__(self):
+        self.add_note("Connection pool is not initialized, call <db.init_pool> first!")
+
+
+async def init_pool() -> Pool:
+    """Создает общий пул соединений, вызывается один раз при старте приложения"""
+    global _pool
+    if _pool is None:
+        _pool = await asyncpg.create_pool(
+            config.POSTGRES_DSN,
+            min_size=config.POSTGRES_POOL_MIN_SIZE,
+            max_size=config.POSTGRES_POOL_MAX_SIZE,
+            max_inactive_connection_lifetime=config.POSTGRES_POOL_MAX_INACTIVE,
+            init=_init_connection,
+        )
+        await _start_listener()
+    return _pool
+
+
+async def close_pool():
+    global _pool, _listener
+    if _listener is not None:
+        listener, _listener = _listener, None
+        await listener.close()
+    if _pool is not None:
+        pool, _pool = _pool, None
+        await pool.close()
+
+
+async def _init_connection(conn: Connection):
+    conn.add_query_logger(_log_query)
+
+
+def _log_query(query: LoggedQuery):
+    query_stats["queries"] += 1
+    query_stats["seconds"] += query.elapsed
+    if query.exception is not None:
+        query_stats["errors"] += 1
+    metrics.count_query(query)
+
+
+def get_pool() -> Pool:
+    if _pool is None:
+        raise PoolNotInitializedError()
+    return _pool
+
+
+@asynccontextmanager
+async def connection() -> AsyncIterator[Connection]:
+    """Берет соединение из пула и возвращает его обратно по выходу из контекста"""
+    async with get_pool().acquire(timeout=config.POSTGRES_POOL_ACQUIRE_TIMEOUT) as conn:
+        yield conn
+
+
+def subscribe(channel: str, callback: Callable[[str | None], None]):
+    """
+    Подписка на уведомления NOTIFY других процессов.
+    callback получает payload, либо None если соединение слушателя обрывалось и уведомления могли потеряться
+    """
+    _subscribers[channel].append(callback)
+
+
+def notify_payload(payload: str) -> str:
+    return f"{PROCESS_TOKEN}:{payload}"
+
+
+def _dispatch(conn: Connection, pid: int, channel: str, payload: str):
+    token, _, data = payload.partition(":")
+    if token == PROCESS_TOKEN:
+        return
+    for callback in _subscribers[channel]:
+        callback(data)
+
+
+async def _start_listener():
+    global _listener
+    if not _subscribers:
+        return
+
+    listener = await asyncpg.connect(config.POSTGRES_DSN)
+    for channel in _subscribers:
+        await listener.add_listener(channel, _dispatch)
+    listener.add_termination_listener(_on_listener_terminated)
+    _listener = listener
+
+
+def _on_listener_terminated(conn: Connection):
+    global _listener
+    if conn is not _listener:
+        return  # closed by close_pool
+
+    _listener = None
+    logger.warning("LISTEN connection is lost, reconnecting")
+    for callbacks in _subscribers.values():
+        for callback in callbacks:
+            callback(None)
+    asyncio.get_running_loop().create_task(_reconnect_listener())
+
+
+async def _reconnect_listener():
+    while _pool is not None and _listener is None:
+        try:
+            await _start_listener()
+        except (OSError, asyncpg.PostgresError) as err:
+            logger.warning(f"LISTEN connection failed: {err}")
+            await asyncio.sleep(LISTENER_RECONNECT_DELAY)
+
 
+def pool_stats() -> dict[str, int]:
+    """Состояние пула для мониторинга"""
+    if _pool is None:
+        return {"size": 0, "idle": 0, "used": 0, "min_size": 0, "max_size": 0}
 
-async def connection() -> Connection:
-    return await asyncpg.connect(config.POSTGRES_DSN)
+    size, idle = _pool.get_size(), _pool.get_idle_size()
+    return {
+        "size": size,
+        "idle": idle,
+        "used": size - idle,
+        "min_size": _pool.get_min_size(),
+        "max_size": _pool.get_max_size(),
+    }
 
 
 def setup():
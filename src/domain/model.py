@@ -1,13 +1,16 @@
 import datetime
 import random
-from dataclasses import dataclass
+from collections import defaultdict
+from dataclasses import dataclass, replace
 from enum import Enum
-from typing import overload
+from typing import Iterable
 from uuid import UUID
 
 from telegram import User
 from telegram.helpers import escape_markdown, mention_markdown
 
+from src.domain.shuffle import derange
+
 
 class GameState(Enum):
     REGISTRATION_OPEN = 11
@@ -22,18 +25,57 @@ class GameState(Enum):
         return self.value
 
 
+class NotificationStatus(Enum):
+    PENDING = 21
+    SENT = 22
+    FAILED = 23
+
+    def __int__(self):
+        return self.value
+
+
+@dataclass
+class Notification:
+    """
+    Уведомление игрока, отправляется через outbox
+    """
+    chat_id: int
+    text: str
+    parse_mode: str | None = None
+    id: int = None
+    status: NotificationStatus = NotificationStatus.PENDING
+    attempts: int = 0
+    send_after: datetime.datetime = None
+    error: str | None = None
+
+
 class _Meta:
     """
     Используется для отслеживания изменений в repository
     """
 
+    __slots__ = ("changed_fields", "new_players", "shuffled_players", "notifications")
+
     def __init__(self):
-        self.changed_fields = set()
-        self.new_players = set()
+        self.changed_fields: set[str] = set()
+        self.new_players: list[Player] = []
         self.shuffled_players = False
+        self.notifications: list[Notification] = []
 
+    @property
+    def changed(self) -> bool:
+        """Есть несохраненные изменения самой игры, уведомления не считаются"""
+        return bool(self.changed_fields or self.new_players or self.shuffled_players)
 
-@dataclass
+    def clear(self):
+        """Вызывается repository после успешного сохранения"""
+        self.changed_fields.clear()
+        self.new_players.clear()
+        self.shuffled_players = False
+        self.notifications.clear()
+
+
+@dataclass(slots=True)
 class Player:
     id: int
     telegram_id: int
@@ -58,7 +100,84 @@ class Player:
         )
 
 
+class JoinStatus(Enum):
+    JOINED = "joined"
+    ALREADY_JOINED = "already_joined"
+    REGISTRATION_CLOSED = "registration_closed"
+    NOT_FOUND = "not_found"
+
+
+@dataclass
+class JoinResult:
+    """
+    С JOINED game - игра для ответа игроку без повторного чтения. Если задан players_count,
+    игроки не загружались: в players только присоединившийся, всего игроков - players_count
+    """
+    status: JoinStatus
+    title: str | None = None
+    game: 'GameSanta | None' = None
+    players_count: int | None = None
+
+
+class ShuffleStatus(Enum):
+    SHUFFLED = "shuffled"
+    WRONG_STATE = "wrong_state"
+    NOT_ENOUGH_PLAYERS = "not_enough_players"
+    NOT_FOUND = "not_found"
+
+
+@dataclass
+class ShuffleResult:
+    status: ShuffleStatus
+    players: int = 0
+
+
+@dataclass
+class GameSummary:
+    """
+    Краткое представление игры для списка "Мои игры"
+    """
+    uuid: str
+    title: str
+    is_owner: bool
+    is_member: bool
+    players_count: int
+
+
+@dataclass
+class GamesPage:
+    """
+    Страница списка игр с курсорами для keyset пагинации (курсор - uuid крайней игры на странице)
+    """
+    items: list[GameSummary]
+    prev_cursor: str | None = None
+    next_cursor: str | None = None
+
+    @classmethod
+    def build(cls, rows: list[GameSummary], limit: int, cursor: str | None, backward: bool) -> 'GamesPage':
+        """
+        :param rows: до limit + 1 игр, отсортированных по uuid в направлении обхода
+        """
+        has_more = len(rows) > limit
+        items = rows[:limit]
+
+        if backward:
+            items.reverse()
+            prev_cursor = items[0].uuid if has_more and items else None
+            next_cursor = items[-1].uuid if cursor and items else None
+        else:
+            prev_cursor = items[0].uuid if cursor and items else None
+            next_cursor = items[-1].uuid if has_more and items else None
+        return cls(items=items, prev_cursor=prev_cursor, next_cursor=next_cursor)
+
+
 class GameSanta:
+    __slots__ = ("meta", "uuid", "state", "players", "initiator_id", "initiator_fullname", "title", "description",
+                 "date_finish", "version", "_players_index")
+
+    # columns of the games table, their changes are saved by repository
+    _TRACKED_FIELDS = frozenset(("state", "initiator_id", "initiator_fullname", "title", "description", "date_finish"))
+
     def __init__(self,
                  uuid: str | UUID,
                  state: GameState,
@@ -67,26 +186,66 @@ class GameSanta:
                  initiator_fullname: str,
                  title: str,
                  description: str,
-                 date_finish: datetime.date
+                 date_finish: datetime.date,
+                 version: int = 0
                  ):
-        self.meta = _Meta()
-        self.uuid = str(uuid) if uuid else None
+        # initial values are not changes
+        init = super().__setattr__
+        init("meta", _Meta())
+        init("uuid", str(uuid) if uuid else None)
 
-        self.state = GameState(state)
-        self.players = players or []
+        init("state", GameState(state))
+        init("players", players or [])
+        init("_players_index", {p.telegram_id: p for p in self.players})
 
-        self.initiator_id = initiator_id
-        self.initiator_fullname = initiator_fullname
+        init("initiator_id", initiator_id)
+        init("initiator_fullname", initiator_fullname)
 
-        self.title = title
-        self.description = description
-        self.date_finish = date_finish
+        init("title", title)
+        init("description", description)
+        init("date_finish", date_finish)
+        # increased by repository on every saved change, e.g. to cache rendered messages
+        init("version", version)
 
     def __setattr__(self, key, value):
-        if key in self.__dict__:
+        if key in self._TRACKED_FIELDS:
             self.meta.changed_fields.add(key)
         super().__setattr__(key, value)
 
+    def copy(self) -> 'GameSanta':
+        """
+        Независимая копия сохраненной игры за O(players) без рекурсии: игроки копируются плоско
+        и связываются с получателями по позиции. Несохраненные изменения (meta) не копируются
+        """
+        positions = {id(p): i for i, p in enumerate(self.players)}
+        players = [Player(p.id, p.telegram_id, p.fullname, p.username, p.recipient_id, p.game_uuid)
+                   for p in self.players]
+        for player, original in zip(players, self.players):
+            if original.recipient is not None:
+                player.recipient = players[positions[id(original.recipient)]]
+        return GameSanta(self.uuid, self.state, players, self.initiator_id, self.initiator_fullname, self.title,
+                         self.description, self.date_finish, self.version)
+
+    def __deepcopy__(self, memo: dict) -> 'GameSanta':
+        """
+        copy.deepcopy обходил бы цепочку получателей рекурсивно и падал на больших распределенных играх,
+        PTB копирует так user_data перед сохранением диалогов. Несохраненные изменения копируются
+        """
+        game = self.copy()
+        positions = {id(p): i for i, p in enumerate(self.players)}
+        game.meta.changed_fields.update(self.meta.changed_fields)
+        game.meta.new_players.extend(game.players[positions[id(p)]] for p in self.meta.new_players)
+        game.meta.shuffled_players = self.meta.shuffled_players
+        game.meta.notifications.extend(replace(n) for n in self.meta.notifications)
+        memo[id(self)] = game
+        return game
+
+    def __setstate__(self, state):
+        # unpickling restores the fields as they were, including meta
+        _, slots = state
+        for key, value in slots.items():
+            super().__setattr__(key, value)
+
     @classmethod
     def build_from_user(cls, user: User):
         game = cls(
@@ -109,23 +268,57 @@ class GameSanta:
             case GameState.REGISTRATION_CLOSE:
                 self.state = GameState.REGISTRATION_OPEN
 
-    def shuffle(self):
-        copy_users = self.players.copy()
-        random.shuffle(copy_users)
+    def shuffle(self, exclusions: Iterable[tuple[int, int]] = (), seed: int = None):
+        """
+        :param exclusions: пары (telegram_id дарящего, telegram_id получателя), которые нельзя назначать,
+            например пары или прошлогодние распределения
+        :param seed: для воспроизводимого распределения
+        :raise ShuffleImpossibleError: допустимого распределения не существует
+        """
+        positions = {p.telegram_id: i for i, p in enumerate(self.players)}
+        forbidden = defaultdict(set)
+        for giver, receiver in exclusions:
+            if giver in positions and receiver in positions:
+                forbidden[positions[giver]].add(positions[receiver])
 
-        for i in range(len(copy_users)):
-            copy_users[i - 1].recipient = copy_users[i]
+        receivers = derange(len(self.players), forbidden, random.Random(seed))
+        for player, receiver in zip(self.players, receivers):
+            player.recipient = self.players[receiver]
         self.state = GameState.ALLOCATED
         self.meta.shuffled_players = True
 
     def add_player(self, player: Player):
         assert self.uuid, "Save the game to the storage to get the id"
+        self.add_saved_player(player)
+        self.meta.new_players.append(player)
+
+    def add_saved_player(self, player: Player):
+        """Добавляет игрока, который уже сохранен в storage, без отслеживания изменений"""
         player.game_uuid = self.uuid
         self.players.append(player)
-        self.meta.new_players.add(player)
+        self._players_index[player.telegram_id] = player
 
-    def check_member(self, telegram_id: int):
+    def get_player(self, telegram_id: int) -> Player | None:
+        return self._players_index.get(telegram_id)
+
+    def notify(self, players: list[Player], text: str, parse_mode: str = None):
+        """Уведомления сохраняются в outbox вместе с изменениями игры"""
+        self.meta.notifications.extend(Notification(p.telegram_id, text, parse_mode) for p in players)
+
+    def notify_recipients(self, template: str, parse_mode: str = None):
+        """
+        Уведомляет каждого игрока о его получателе
+
+        :param template: текст с подстановками {title}, {recipient} и {username} в MarkdownV2
+        """
+        title = escape_markdown(self.title, version=2)
         for player in self.players:
-            if player.telegram_id == telegram_id:
-                return True
-        return False
+            recipient = player.recipient
+            username = escape_markdown("@" + recipient.username, version=2) if recipient.username else ""
+            text = (template.replace("{title}", title)
+                    .replace("{recipient}", mention_markdown(recipient.telegram_id, recipient.fullname, 2))
+                    .replace("{username}", username))
+            self.notify([player], text, parse_mode)
+
+    def check_member(self, telegram_id: int):
+        return telegram_id in self._players_index
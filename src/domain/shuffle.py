@@ -0,0 +1,107 @@
+import random
+from collections import deque
+from typing import Mapping, Collection
+
+from src.core.exception import ShuffleImpossibleError
+
+
+def derange(n: int, forbidden: Mapping[int, Collection[int]] = None, rng: random.Random = None) -> list[int]:
+    """
+    Назначает каждому из n участников получателя: никто не дарит сам себе и запрещенным получателям.
+
+    Без запретов - один случайный цикл за O(n). С запретами нарушившие пары из случайного цикла
+    переназначаются через увеличивающие пути (паросочетание в дополнении графа запретов),
+    каждый путь ищется за O(n + m), где m - количество запретов.
+
+    :param forbidden: участник -> запрещенные для него получатели
+    :param rng: генератор случайных чисел, с seed распределение воспроизводимо
+    :return: receivers[i] - получатель участника i
+    :raise ShuffleImpossibleError: допустимого распределения не существует
+    """
+    if n == 1:
+        raise ShuffleImpossibleError(n)
+
+    rng = rng or random.Random()
+    order = list(range(n))
+    rng.shuffle(order)
+
+    receivers = [0] * n
+    for i in range(n):
+        receivers[order[i - 1]] = order[i]
+    if not forbidden:
+        return receivers
+
+    return _Matching(n, forbidden, receivers).solve()
+
+
+class _Matching:
+    def __init__(self, n: int, forbidden: Mapping[int, Collection[int]], receivers: list[int]):
+        self.n = n
+        self.forbidden = forbidden
+        # giver -> receiver and receiver -> giver, None - not matched
+        self.receivers: list[int | None] = receivers
+        self.givers: list[int | None] = [None] * n
+        self.free_receivers: set[int] = set()
+
+    def allowed(self, giver: int, receiver: int) -> bool:
+        return giver != receiver and receiver not in self.forbidden.get(giver, ())
+
+    def solve(self) -> list[int]:
+        free_givers = []
+        for giver, receiver in enumerate(self.receivers):
+            if self.allowed(giver, receiver):
+                self.givers[receiver] = giver
+            else:
+                self.receivers[giver] = None
+                free_givers.append(giver)
+                self.free_receivers.add(receiver)
+
+        for giver in free_givers:
+            # a vertex without an augmenting path stays unmatched in every maximum matching
+            if not self._augment(giver):
+                raise ShuffleImpossibleError(self.n)
+        return self.receivers
+
+    def _augment(self, start: int) -> bool:
+        for receiver in self.free_receivers:
+            if self.allowed(start, receiver):
+                self._assign(start, receiver)
+                return True
+
+        # BFS over the complement of the forbidden graph. A visited receiver is swap-removed from unvisited,
+        # a skipped one is forbidden for the giver, so the search costs O(n + m)
+        unvisited = list(range(self.n))
+        parent: dict[int, int] = {}
+        queue = deque([start])
+        while queue:
+            giver = queue.popleft()
+            i = 0
+            while i < len(unvisited):
+                receiver = unvisited[i]
+                if not self.allowed(giver, receiver):
+                    i += 1
+                    continue
+                unvisited[i] = unvisited[-1]
+                unvisited.pop()
+
+                parent[receiver] = giver
+                if receiver in self.free_receivers:
+                    self._flip(parent, receiver)
+                    return True
+                queue.append(self.givers[receiver])
+        return False
+
+    def _assign(self, giver: int, receiver: int):
+        self.free_receivers.discard(receiver)
+        self.receivers[giver] = receiver
+        self.givers[receiver] = giver
+
+    def _flip(self, parent: dict[int, int], receiver: int):
+        """Перекладывает пары вдоль найденного пути от свободного получателя к start"""
+        self.free_receivers.discard(receiver)
+        while receiver is not None:
+            giver = parent[receiver]
+            previous = self.receivers[giver]
+            self.receivers[giver] = receiver
+            self.givers[receiver] = giver
+            receiver = previous
@@ -7,7 +7,15 @@ from telegram.ext import Application, ContextTypes
 from src.core import config
 from src import tg
 from src import db
+from src import metrics
 from src.tg.utils.context import CustomContext, MemoryCustomContext
+from src.tg.utils.deadlines import DeadlineScheduler
+from src.tg.handlers.common import CreateGameStates
+from src.tg.utils.outbox import OutboxDispatcher
+from src.tg.utils.persistence import PostgresPersistence
+from src.tg.utils.retention import GameArchiver, NotificationPruner
+from src.tg.utils.update_processor import UserOrderedUpdateProcessor
+from src.tg.utils.webhook import WebhookServer
 
 
 logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
@@ -15,23 +23,92 @@ logging.getLogger("httpx").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
 
+async def run_webhook(app: Application) -> None:
+    server = WebhookServer(app, config.WEBHOOK_LISTEN, config.WEBHOOK_PORT, config.WEBHOOK_PATH,
+                           config.WEBHOOK_SECRET_TOKEN)
+    await server.start()
+    try:
+        await app.bot.set_webhook(config.WEBHOOK_URL, allowed_updates=Update.ALL_TYPES,
+                                  secret_token=config.WEBHOOK_SECRET_TOKEN,
+                                  max_connections=config.WEBHOOK_MAX_CONNECTIONS)
+        await asyncio.Future()  # endless waiting
+    finally:
+        await server.stop()
+
+
+def register_metrics(app: Application, outbox: OutboxDispatcher, deadlines: DeadlineScheduler,
+                     archiver: GameArchiver, pruner: NotificationPruner):
+    """Состояние компонентов снимается при каждом запросе /metrics"""
+    metrics.Gauge("santa_db_pool_connections", "Connections of the pool", db.pool_stats, "state")
+    metrics.Gauge("santa_db_queries", "Database queries, errors and seconds spent", lambda: db.query_stats,
+                  "kind", kind="counter")
+    metrics.Gauge("santa_updates", "Updates being processed and waiting for their user's previous update",
+                  lambda: {k: v for k, v in app.update_processor.stats.items() if k != "processed"}, "state")
+    metrics.Gauge("santa_updates_processed_total", "Processed updates",
+                  lambda: app.update_processor.stats["processed"], kind="counter")
+    metrics.Gauge("santa_outbox_notifications_total", "Notifications sent, retried and failed",
+                  lambda: {k: v for k, v in outbox.stats.items() if k != "in_flight"}, "result", kind="counter")
+    metrics.Gauge("santa_outbox_in_flight", "Notifications being sent", lambda: outbox.stats["in_flight"])
+    metrics.Gauge("santa_deadline_games_total", "Games closed and reminded by the deadline scheduler",
+                  lambda: deadlines.stats, "action", kind="counter")
+    metrics.Gauge("santa_archive_games_total", "Games moved to the archive", lambda: archiver.stats["archived"],
+                  kind="counter")
+    metrics.Gauge("santa_archive_batches_total", "Archiving transactions", lambda: archiver.stats["batches"],
+                  kind="counter")
+    metrics.Gauge("santa_archive_running", "1 while an archiving pass is in progress",
+                  lambda: archiver.stats["running"])
+    metrics.Gauge("santa_outbox_pruned_total", "Sent and failed notifications deleted from the outbox",
+                  lambda: pruner.stats["pruned"], kind="counter")
+
+
 async def main() -> None:
     """Start the bot."""
 
     if config.POSTGRES_DSN:
         db.setup()
-        context_types = ContextTypes(context=CustomContext)
+        await db.init_pool()
+        context_class = CustomContext
     else:
-        context_types = ContextTypes(context=MemoryCustomContext)
+        context_class = MemoryCustomContext
         logger.warning("The <MemoryCustomContext> is used for development only. Games are stored in RAM!")
-    app = Application.builder().token(config.BOT_TOKEN).context_types(context_types).build()
+    context_types = ContextTypes(context=context_class)
+    builder = (Application.builder()
+               .token(config.BOT_TOKEN)
+               .context_types(context_types)
+               .concurrent_updates(UserOrderedUpdateProcessor(config.UPDATE_WORKERS)))
+    if config.POSTGRES_DSN:
+        builder.persistence(PostgresPersistence(context_class.db_storage, CreateGameStates,
+                                                config.PERSISTENCE_INTERVAL))
+    app = builder.build()
+    outbox = OutboxDispatcher(app.bot, context_class.db_storage)
+    deadlines = DeadlineScheduler(context_class.db_storage)
+    archiver = GameArchiver(context_class.db_storage)
+    pruner = NotificationPruner(context_class.db_storage)
+    metrics_server = metrics.MetricsServer(config.METRICS_LISTEN, config.METRICS_PORT)
+    if metrics.enabled:
+        register_metrics(app, outbox, deadlines, archiver, pruner)
+        await metrics_server.start()
 
     await tg.setup(app)
+    deadlines.start(app.job_queue)
+    archiver.start(app.job_queue)
+    pruner.start(app.job_queue)
 
-    async with app:  # Calls `initialize` and `shutdown`
-        await app.start()
-        await app.updater.start_polling(allowed_updates=Update.ALL_TYPES)
-        await asyncio.Future()  # endless waiting
+    try:
+        async with app:  # Calls `initialize` and `shutdown`
+            await app.start()
+            await outbox.start()
+            try:
+                if config.BOT_MODE == "webhook":
+                    await run_webhook(app)
+                else:
+                    await app.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+                    await asyncio.Future()  # endless waiting
+            finally:
+                await outbox.stop()
+    finally:
+        await metrics_server.stop()
+        await db.close_pool()
 
 
 if __name__ == "__main__":
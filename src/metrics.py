@@ -0,0 +1,210 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import time
+from bisect import bisect_left
+from typing import Callable, Iterator
+
+from asyncpg.connection import LoggedQuery
+
+from src.core import config
+
+logger = logging.getLogger(__name__)
+
+# without METRICS_PORT nothing is wrapped, only plain counters are incremented
+enabled = config.METRICS_PORT is not None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # seconds
+ROUND_TRIP_BUCKETS = (0, 1, 2, 3, 5, 10, 20)
+BATCH_BUCKETS = (0, 1, 5, 10, 25, 50, 100)
+
+
+def _labels(label: str | None, value: str, extra: str = "") -> str:
+    pairs = [f'{label}="{value}"'] if label else []
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, description: str, label: str = None):
+        self.name = name
+        self.description = description
+        self.label = label
+        self._values: dict[str, float] = {}
+        REGISTRY.append(self)
+
+    def inc(self, label_value: str = "", amount: float = 1):
+        self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} counter"
+        for label_value, value in self._values.items():
+            yield f"{self.name}{_labels(self.label, label_value)} {value}"
+
+
+class Gauge:
+    """
+    Значения снимаются при каждом запросе метрик: collect возвращает число или {значение метки: число}.
+    kind="counter" - для счетчиков, которые ведет сам компонент (stats пула, outbox и т.п.)
+    """
+
+    def __init__(self, name: str, description: str, collect: Callable[[], float | dict[str, float]],
+                 label: str = None, kind: str = "gauge"):
+        self.name = name
+        self.description = description
+        self.collect = collect
+        self.label = label
+        self.kind = kind
+        REGISTRY.append(self)
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} {self.kind}"
+        values = self.collect()
+        if not isinstance(values, dict):
+            values = {"": values}
+        for label_value, value in values.items():
+            yield f"{self.name}{_labels(self.label, label_value)} {value}"
+
+
+class Histogram:
+    def __init__(self, name: str, description: str, buckets: tuple[float, ...], label: str = None):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.label = label
+        # label value -> [count per bucket..., count above the last bucket, sum]
+        self._series: dict[str, list[float]] = {}
+        REGISTRY.append(self)
+
+    def observe(self, label_value: str, value: float):
+        series = self._series.get(label_value)
+        if series is None:
+            series = self._series[label_value] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} histogram"
+        for label_value, series in self._series.items():
+            total = 0
+            for bound, count in zip((*self.buckets, "+Inf"), series):
+                total += count
+                le = f'le="{bound}"'
+                yield f"{self.name}_bucket{_labels(self.label, label_value, le)} {total}"
+            yield f"{self.name}_sum{_labels(self.label, label_value)} {series[-1]}"
+            yield f"{self.name}_count{_labels(self.label, label_value)} {total}"
+
+
+REGISTRY: list[Counter | Gauge | Histogram] = []
+
+HANDLER_LATENCY = Histogram("santa_handler_seconds", "Handler latency by command or callback",
+                            LATENCY_BUCKETS, "handler")
+HANDLER_ERRORS = Counter("santa_handler_errors_total", "Exceptions raised by handlers", "error")
+REPOSITORY_LATENCY = Histogram("santa_repository_seconds", "Repository method latency", LATENCY_BUCKETS, "method")
+REPOSITORY_ROUND_TRIPS = Histogram("santa_repository_round_trips", "Database queries per repository call",
+                                   ROUND_TRIP_BUCKETS, "method")
+NOTIFICATIONS_STAGED = Counter("santa_notifications_staged_total", "Notifications put into the outbox")
+OUTBOX_BATCH = Histogram("santa_outbox_batch_size", "Notifications claimed from the outbox per poll",
+                         BATCH_BUCKETS)
+TELEGRAM_ERRORS = Counter("santa_telegram_errors_total", "Bot API errors while sending notifications", "error")
+
+_round_trips: contextvars.ContextVar[list[int] | None] = contextvars.ContextVar("round_trips", default=None)
+
+
+def count_query(query: LoggedQuery):
+    """Query logger соединений пула: засчитывает запрос текущему вызову repository"""
+    round_trips = _round_trips.get()
+    if round_trips is not None:
+        round_trips[0] += 1
+
+
+def timed_handler(callback: Callable, label: str) -> Callable:
+    if not enabled:
+        return callback
+
+    @functools.wraps(callback)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await callback(*args, **kwargs)
+        except Exception as err:
+            HANDLER_ERRORS.inc(type(err).__name__)
+            raise
+        finally:
+            HANDLER_LATENCY.observe(label, time.perf_counter() - start)
+
+    return wrapper
+
+
+def timed_repository_call(method: Callable) -> Callable:
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        round_trips = [0]
+        token = _round_trips.set(round_trips)
+        start = time.perf_counter()
+        try:
+            return await method(*args, **kwargs)
+        finally:
+            REPOSITORY_LATENCY.observe(method.__name__, time.perf_counter() - start)
+            _round_trips.reset(token)
+            # query loggers are called with call_soon, so they run before this callback
+            name = method.__name__
+            asyncio.get_running_loop().call_soon(lambda: REPOSITORY_ROUND_TRIPS.observe(name, round_trips[0]))
+
+    return wrapper
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        try:
+            lines.extend(metric.render())
+        except Exception as err:
+            logger.error(f"Ошибка сбора метрики {metric.name}: {err}", exc_info=True)
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """HTTP сервер для Prometheus: GET /metrics в текстовом формате, соединение закрывается после ответа"""
+
+    def __init__(self, listen: str, port: int):
+        self.listen = listen
+        self.port = port
+        self._server: asyncio.Server | None = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.listen, self.port)
+        logger.info(f"Metrics are served on {self.listen}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._server is not None:
+            server, self._server = self._server, None
+            server.close()
+            await server.wait_closed()
+
+    @staticmethod
+    async def _handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 10)
+            while await asyncio.wait_for(reader.readline(), 10) not in (b"\r\n", b"\n", b""):
+                pass  # headers are not needed
+
+            method, target, *_ = request_line.decode("latin-1").split() or ("", "")
+            if method == "GET" and target.split("?")[0] == "/metrics":
+                status, body = "200 OK", render().encode()
+            else:
+                status, body = "404 Not Found", b""
+            writer.write((f"HTTP/1.1 {status}\r\n"
+                          f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                          f"Content-Length: {len(body)}\r\n"
+                          f"Connection: close\r\n\r\n").encode("latin-1") + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
@@ -1,13 +1,34 @@
-import json
+import datetime
 import io
+import json
+import os
+import tempfile
+import time
 import uuid
 from abc import ABC, abstractmethod
+from collections import OrderedDict, defaultdict
+from typing import Iterable, Iterator, Sequence, BinaryIO
 
 import asyncpg
+from telegram.helpers import escape_markdown
 
-from src import db
+from src import db, metrics
 from src.core import config
-from src.domain.model import GameSanta, Player
+from src.core.exception import StaleGameError
+from src.domain.model import GameSanta, Player, GameSummary, GamesPage, GameState, JoinResult, JoinStatus
+from src.domain.model import Notification, NotificationStatus, ShuffleResult, ShuffleStatus
+
+PLAYERS_CSV_COLUMNS = ("id", "telegram_id", "fullname", "username", "recipient_id", "game_uuid")
+CSV_SPOOL_MAX_SIZE = 1024 * 1024  # bytes, bigger files are spooled to disk
+MEMORY_LOG_COMPACT_OPS = 1000  # operations in the log of RepositoryMemory above the snapshot size
+DEADLINES_LOCK_KEY = 0x5A17A0D1  # pg advisory lock of the deadline sweep, one replica at a time
+ARCHIVE_LOCK_KEY = 0x5A17A0D2  # pg advisory lock of the archiving, one replica at a time
+
+
+def _check_csv_columns(columns: Sequence[str]):
+    unknown = set(columns) - set(PLAYERS_CSV_COLUMNS)
+    if not columns or unknown:
+        raise ValueError(f"Недопустимые колонки для выгрузки <{unknown or columns}>")
 
 
 class AbstractRepository(ABC):
@@ -15,12 +36,97 @@ class AbstractRepository(ABC):
     async def get(self, game_uuid: str) -> GameSanta:
         ...
 
+    @abstractmethod
+    async def get_many(self, game_uuids: Iterable[str]) -> dict[str, GameSanta]:
+        """Игры по uuid одним запросом, удаленных игр нет в результате"""
+        ...
+
     @abstractmethod
     async def get_list(self, telegram_id: int) -> list[GameSanta]:
         ...
 
+    @abstractmethod
+    async def get_summaries(self, telegram_id: int, limit: int, cursor: str = None,
+                            backward: bool = False) -> GamesPage:
+        """
+        Страница кратких представлений игр пользователя, упорядоченных по uuid
+
+        :param cursor: uuid игры, после (или до, если backward) которой начинается страница
+        """
+        ...
+
     @abstractmethod
     async def save(self, game: GameSanta) -> GameSanta:
+        """
+        Изменения сохраненной игры записываются, только если ее версия не менялась с чтения
+
+        :raise StaleGameError: игру успели изменить или удалить, ничего не записано
+        """
+        ...
+
+    @abstractmethod
+    async def join_game(self, game_uuid: str, player: Player) -> JoinResult:
+        """
+        Добавляет игрока в игру без загрузки всей игры,
+        только если открыта регистрация и пользователь еще не участвует
+        """
+        ...
+
+    @abstractmethod
+    async def shuffle_game(self, game_uuid: str, template: str = None, parse_mode: str = None) -> ShuffleResult:
+        """
+        Распределяет получателей одним случайным циклом без загрузки игроков и ставит уведомления в outbox
+
+        :param template: текст уведомления с подстановками {title}, {recipient} и {username} в MarkdownV2
+        """
+        ...
+
+    @abstractmethod
+    async def close_due_games(self, today: datetime.date, limit: int, template: str = None,
+                              parse_mode: str = None) -> list[str]:
+        """
+        Закрывает регистрацию не больше limit игр с наступившим дедлайном.
+        С template игры сразу распределяются, как в shuffle_game.
+        Пустой список - закрывать больше нечего или по дедлайнам уже проходит другая реплика
+
+        :return: uuid измененных игр
+        """
+        ...
+
+    @abstractmethod
+    async def queue_reminders(self, today: datetime.date, until: datetime.date, limit: int, template: str,
+                              parse_mode: str = None) -> int:
+        """
+        Ставит в outbox напоминания игрокам не больше limit игр с дедлайном от today до until.
+        О каждой дате игры напоминается один раз, при переносе даты - еще раз
+
+        :param template: текст уведомления с подстановками {title} и {date} в MarkdownV2
+        :return: количество игр, 0 - напоминать больше некому или по дедлайнам уже проходит другая реплика
+        """
+        ...
+
+    @abstractmethod
+    async def archive_games(self, before: datetime.date, limit: int) -> list[str]:
+        """
+        Переносит в архив не больше limit игр с дедлайном раньше before вместе с игроками.
+        Архивные игры не видны остальным методам, кроме get_archived.
+        Пустой список - переносить больше нечего или архивирует другая реплика
+
+        :return: uuid перенесенных игр
+        """
+        ...
+
+    @abstractmethod
+    async def get_archived(self, telegram_id: int) -> list[GameSanta]:
+        """Архивные игры, которые пользователь создал или в которых участвовал"""
+        ...
+
+    @abstractmethod
+    async def get_previous_pairs(self, game_uuid: str) -> list[tuple[int, int]]:
+        """
+        Пары (telegram_id дарящего, telegram_id получателя) последней по дате другой распределенной игры
+        того же создателя, в том числе архивной. Пустой список - такой игры нет
+        """
         ...
 
     @abstractmethod
@@ -28,7 +134,32 @@ class AbstractRepository(ABC):
         ...
 
     @abstractmethod
-    async def get_players_csv(self, game_uuid: str) -> io.BytesIO:
+    async def get_players_csv(self, game_uuid: str, columns: Sequence[str] = PLAYERS_CSV_COLUMNS) -> BinaryIO:
+        """
+        CSV со списком игроков (разделитель CSV_SPLITTER, первая строка - заголовок), None если игроков нет
+        """
+        ...
+
+    @abstractmethod
+    async def claim_notifications(self, limit: int, lease: float) -> list[Notification]:
+        """
+        Забирает ожидающие отправки уведомления. Захваченные уведомления не выдаются повторно lease секунд,
+        после этого снова доступны - например, если процесс упал во время отправки
+        """
+        ...
+
+    @abstractmethod
+    async def update_notifications(self, notifications: list[Notification]):
+        """Сохраняет результат отправки: status, send_after, error"""
+        ...
+
+    @abstractmethod
+    async def prune_notifications(self, before: datetime.datetime, limit: int) -> int:
+        """
+        Удаляет не больше limit отправленных и окончательно неотправленных уведомлений, созданных раньше before
+
+        :return: количество удаленных
+        """
         ...
 
 
@@ -36,11 +167,13 @@ class Repository(AbstractRepository):
     @staticmethod
     def _build_game(raw_game: asyncpg.Record) -> GameSanta:
         dict_game = dict(**raw_game)
-        # json -> array[dict]
-        dict_game["players"] = json.loads(dict_game["players"])
+        game_uuid = dict_game["uuid"] = str(dict_game["uuid"])
 
+        # players[] is decoded by asyncpg from the binary protocol into records, no json on either side
         if dict_game["players"]:
-            players = {p["id"]: Player(**p) for p in dict_game["players"]}
+            players = {p["id"]: Player(id=p["id"], telegram_id=p["telegram_id"], fullname=p["fullname"],
+                                       username=p["username"], recipient_id=p["recipient_id"], game_uuid=game_uuid)
+                       for p in dict_game["players"]}
             for player in players.values():
                 player.recipient = players.get(player.recipient_id) if player.recipient_id else None
             dict_game["players"] = list(players.values())
@@ -48,118 +181,1129 @@ class Repository(AbstractRepository):
         return GameSanta(**dict_game)
 
     async def get(self, game_uuid: str) -> GameSanta:
-        conn = await db.connection()
-
         sql = """
-            select 
-                games.*, 
-                COALESCE(json_agg(pl.*) FILTER (WHERE pl.id IS NOT NULL), '[]') as players  -- COALESCE filtered [null]
-            from games 
+            select
+                games.*,
+                COALESCE(array_agg(pl.*) FILTER (WHERE pl.id IS NOT NULL), '{}') as players  -- COALESCE filtered {null}
+            from games
             left join players as pl
-                on games.uuid = pl.game_uuid 
+                on games.uuid = pl.game_uuid
             where games.uuid = $1
             group by games.uuid;
         """
 
-        raw_game: asyncpg.Record = await conn.fetchrow(sql, game_uuid)
+        async with db.connection() as conn:
+            raw_game: asyncpg.Record = await conn.fetchrow(sql, game_uuid)
 
         if raw_game:
             return self._build_game(raw_game)
 
-    async def get_list(self, telegram_id: int) -> list[GameSanta]:
-        conn = await db.connection()
+    async def get_many(self, game_uuids: Iterable[str]) -> dict[str, GameSanta]:
+        sql = """
+            select
+                games.*,
+                COALESCE(array_agg(pl.*) FILTER (WHERE pl.id IS NOT NULL), '{}') as players  -- COALESCE filtered {null}
+            from games
+            left join players as pl
+                on games.uuid = pl.game_uuid
+            where games.uuid = any($1::uuid[])
+            group by games.uuid;
+        """
 
+        async with db.connection() as conn:
+            raw_games = await conn.fetch(sql, list(game_uuids))
+        return {game.uuid: game for game in map(self._build_game, raw_games)}
+
+    async def get_list(self, telegram_id: int) -> list[GameSanta]:
+        # UNION вместо OR в where: каждая ветка идет по своему индексу, игроки агрегируются после фильтрации
         sql = """
-            select 
-                games.*, 
-                COALESCE(json_agg(pl.*) FILTER (WHERE pl.id IS NOT NULL), '[]') as players  -- COALESCE filtered [null]
-            from games 
+            with user_games as (
+                select uuid from games where initiator_id = $1
+                union
+                select game_uuid from players where telegram_id = $1
+            )
+            select
+                games.*,
+                COALESCE(array_agg(pl.*) FILTER (WHERE pl.id IS NOT NULL), '{}') as players  -- COALESCE filtered {null}
+            from user_games
+            join games
+                on games.uuid = user_games.uuid
             left join players as pl
-                on games.uuid = pl.game_uuid 
-            where games.initiator_id = $1 or pl.telegram_id = $1
+                on games.uuid = pl.game_uuid
             group by games.uuid;
             """
 
-        raw_games: asyncpg.Record = await conn.fetch(sql, telegram_id)
+        async with db.connection() as conn:
+            raw_games: asyncpg.Record = await conn.fetch(sql, telegram_id)
         return [self._build_game(record) for record in raw_games or []]
 
+    async def get_summaries(self, telegram_id: int, limit: int, cursor: str = None,
+                            backward: bool = False) -> GamesPage:
+        sign, order = ("<", "desc") if backward else (">", "asc")
+        sql = f"""
+            with user_games as (
+                select uuid from games where initiator_id = $1
+                union
+                select game_uuid from players where telegram_id = $1
+            ), page as (
+                select games.uuid, games.title, games.initiator_id
+                from user_games
+                join games
+                    on games.uuid = user_games.uuid
+                where $2::uuid is null or games.uuid {sign} $2::uuid
+                order by games.uuid {order}
+                limit $3
+            )
+            select
+                page.uuid,
+                page.title,
+                page.initiator_id = $1 as is_owner,
+                exists(select 1 from players as pl where pl.game_uuid = page.uuid and pl.telegram_id = $1) as is_member,
+                (select count(*) from players as pl where pl.game_uuid = page.uuid) as players_count
+            from page
+            order by page.uuid {order};
+            """
+
+        async with db.connection() as conn:
+            raw_rows = await conn.fetch(sql, telegram_id, cursor, limit + 1)
+
+        rows = [GameSummary(**{**row, "uuid": str(row["uuid"])}) for row in raw_rows]
+        return GamesPage.build(rows, limit, cursor, backward)
+
     async def save(self, game: GameSanta) -> GameSanta:
-        conn = await db.connection()
-
-        # Change
-        if game.uuid:
-            # changed fields
-            if game.meta.changed_fields:
-                data = [getattr(game, f) for f in game.meta.changed_fields]
-                data.append(game.uuid)
-                uuid_index = len(data)
-                sql_fields = ",".join(f"{f}=${i}" for i, f in enumerate(game.meta.changed_fields, 1))
-                sql = f"UPDATE games SET {sql_fields} WHERE uuid=${uuid_index};"
-                await conn.execute(sql, *data)
-            # joined new players
-            if game.meta.new_players:
-                data = [(p.telegram_id, p.fullname, p.username, p.game_uuid) for p in game.meta.new_players]
-                sql = "INSERT INTO players (telegram_id, fullname, username, game_uuid) VALUES ($1, $2, $3, $4);"
-                await conn.executemany(sql, data)
-            # finish game, shuffled players
-            if game.meta.shuffled_players:
-                data = [(p.id, p.recipient.id) for p in game.players]
-                sql = "UPDATE players SET recipient_id=$2 where id=$1;"
-                await conn.executemany(sql, data)
-        # Create
-        else:
-            data = [getattr(game, f) for f in game.meta.changed_fields]
-            sql_fields = ",".join(game.meta.changed_fields)
-            sql_values = ",".join(f"${i}" for i in range(1, len(game.meta.changed_fields)+1))
-            sql = f"INSERT INTO games ({sql_fields}) VALUES ({sql_values}) RETURNING uuid;"
-            result: asyncpg.Record = await conn.fetchrow(sql, *data)
-            game.uuid = str(result[0])
+        """
+        Сохраняет изменения игры одной транзакцией, каждый вид изменений - одним запросом
+        """
+        async with db.connection() as conn, conn.transaction():
+            # Change
+            if game.uuid:
+                # changed fields, the version is bumped by any change and checked instead of locking the row
+                if game.meta.changed:
+                    fields = sorted(game.meta.changed_fields)
+                    data = [getattr(game, f) for f in fields]
+                    data.extend((game.uuid, game.version))
+                    sql_fields = "".join(f"{f}=${i}," for i, f in enumerate(fields, 1))
+                    sql = (f"UPDATE games SET {sql_fields}version=version+1 "
+                           f"WHERE uuid=${len(data) - 1} AND version=${len(data)} RETURNING version;")
+                    version = await conn.fetchval(sql, *data)
+                    if version is None:
+                        raise StaleGameError(game.uuid, game.version)
+                    game.version = version
+                # joined new players
+                if game.meta.new_players:
+                    await self._insert_players(conn, game.meta.new_players)
+                # finish game, shuffled players
+                if game.meta.shuffled_players:
+                    sql = """
+                        UPDATE players SET recipient_id = data.recipient_id
+                        FROM unnest($1::integer[], $2::integer[]) AS data (id, recipient_id)
+                        WHERE players.id = data.id AND players.game_uuid = $3;
+                    """
+                    ids, recipient_ids = [], []
+                    for p in game.players:
+                        ids.append(p.id)
+                        recipient_ids.append(p.recipient.id)
+                    await conn.execute(sql, ids, recipient_ids, game.uuid)
+                # the notification is delivered to other processes on commit
+                await conn.execute("SELECT pg_notify($1, $2);", db.CHANNEL_GAMES, db.notify_payload(game.uuid))
+            # Create
+            else:
+                fields = sorted(game.meta.changed_fields)
+                data = [getattr(game, f) for f in fields]
+                sql_fields = ",".join(fields)
+                sql_values = ",".join(f"${i}" for i in range(1, len(fields)+1))
+                sql = f"INSERT INTO games ({sql_fields}) VALUES ({sql_values}) RETURNING uuid, version;"
+                result: asyncpg.Record = await conn.fetchrow(sql, *data)
+                game.uuid = str(result[0])
+                game.version = result[1]
 
+            if game.meta.notifications:
+                await self._insert_notifications(conn, game.meta.notifications)
+
+        game.meta.clear()
         return game
 
+    async def join_game(self, game_uuid: str, player: Player) -> JoinResult:
+        sql = """
+            with game as (
+                -- the version is bumped below, so joins of one game wait for each other
+                select * from games where uuid = $1 for no key update
+            ), existing as (
+                select 1 from players where game_uuid = $1 and telegram_id = $2
+            ), inserted as (
+                insert into players (telegram_id, fullname, username, game_uuid)
+                select $2, $3, $4, game.uuid
+                from game
+                where game.state = $5 and not exists (select 1 from existing)
+                on conflict (game_uuid, telegram_id) do nothing
+                returning id
+            ), bumped as (
+                update games set version = version + 1
+                where uuid = $1 and exists (select 1 from inserted)
+            )
+            select
+                game.*,
+                exists(select 1 from existing) as already_joined,
+                (select id from inserted) as player_id,
+                (select count(*) from players where game_uuid = $1) as players_count,
+                (select pg_notify($6, $7) from inserted) as notified
+            from game;
+        """
+        async with db.connection() as conn:
+            row = await conn.fetchrow(sql, game_uuid, player.telegram_id, player.fullname, player.username,
+                                      int(GameState.REGISTRATION_OPEN), db.CHANNEL_GAMES, db.notify_payload(game_uuid))
+
+        if row is None:
+            return JoinResult(JoinStatus.NOT_FOUND)
+        if row["player_id"] is not None:
+            player.id = row["player_id"]
+            player.game_uuid = game_uuid
+            # the statement does not see its own insert and bump
+            game = GameSanta(row["uuid"], row["state"], [player], row["initiator_id"], row["initiator_fullname"],
+                             row["title"], row["description"], row["date_finish"], row["version"] + 1)
+            return JoinResult(JoinStatus.JOINED, row["title"], game, row["players_count"] + 1)
+        # the insert also loses to a concurrent join of the same user via on conflict
+        if row["already_joined"] or row["state"] == int(GameState.REGISTRATION_OPEN):
+            return JoinResult(JoinStatus.ALREADY_JOINED, row["title"])
+        return JoinResult(JoinStatus.REGISTRATION_CLOSED, row["title"])
+
+    async def shuffle_game(self, game_uuid: str, template: str = None, parse_mode: str = None) -> ShuffleResult:
+        sql = "select * from shuffle_game($1, $2, $3, $4, $5, $6, $7, $8);"
+        working_states = [int(s) for s in GameState if s.state_is_working]
+        async with db.connection() as conn, conn.transaction():
+            row = await conn.fetchrow(sql, game_uuid, working_states, int(GameState.ALLOCATED), template, parse_mode,
+                                      int(NotificationStatus.PENDING), db.CHANNEL_GAMES, db.notify_payload(game_uuid))
+            if row["shuffle_status"] == ShuffleStatus.SHUFFLED.value:
+                # the game row is already locked by the function
+                await conn.execute("UPDATE games SET version = version + 1 WHERE uuid = $1;", game_uuid)
+        return ShuffleResult(ShuffleStatus(row["shuffle_status"]), row["shuffled_players"])
+
+    async def close_due_games(self, today: datetime.date, limit: int, template: str = None,
+                              parse_mode: str = None) -> list[str]:
+        # the index on (state, date_finish) gives the batch, closed games leave it for the next one
+        sql = """
+            with due as (
+                select uuid from games
+                where state = $2 and date_finish <= $1
+                order by date_finish
+                limit $3
+                for no key update skip locked
+            )
+            update games set state = $4, version = version + 1
+            from due
+            where games.uuid = due.uuid
+            returning games.uuid;
+        """
+        shuffle_sql = """
+            select g.uuid, s.shuffle_status
+            from unnest($1::uuid[]) as g(uuid),
+                shuffle_game(g.uuid, $2, $3, $4, $5, $6, $7, $8 || g.uuid::text) as s;
+        """
+        async with db.connection() as conn, conn.transaction():
+            if not await conn.fetchval("SELECT pg_try_advisory_xact_lock($1);", DEADLINES_LOCK_KEY):
+                return []
+            rows = await conn.fetch(sql, today, int(GameState.REGISTRATION_OPEN), limit,
+                                    int(GameState.REGISTRATION_CLOSE))
+            closed = [row["uuid"] for row in rows]
+            if closed and template:
+                working_states = [int(s) for s in GameState if s.state_is_working]
+                rows = await conn.fetch(shuffle_sql, closed, working_states, int(GameState.ALLOCATED), template,
+                                        parse_mode, int(NotificationStatus.PENDING), db.CHANNEL_GAMES,
+                                        db.notify_payload(""))
+                shuffled = [row["uuid"] for row in rows if row["shuffle_status"] == ShuffleStatus.SHUFFLED.value]
+                await conn.execute("UPDATE games SET version = version + 1 WHERE uuid = ANY($1::uuid[]);", shuffled)
+            if closed:
+                await conn.execute("SELECT pg_notify($1, $2 || uuid::text) FROM unnest($3::uuid[]) AS uuid;",
+                                   db.CHANNEL_GAMES, db.notify_payload(""), closed)
+        return [str(game_uuid) for game_uuid in closed]
+
+    async def queue_reminders(self, today: datetime.date, until: datetime.date, limit: int, template: str,
+                              parse_mode: str = None) -> int:
+        sql = """
+            with due as (
+                select games.uuid, games.title, games.date_finish
+                from games
+                left join game_reminders as r
+                    on r.game_uuid = games.uuid
+                where games.state = any($1) and games.date_finish between $2 and $3
+                    and r.date_finish is distinct from games.date_finish
+                order by games.date_finish
+                limit $4
+                for no key update of games skip locked
+            ), reminded as (
+                insert into game_reminders (game_uuid, date_finish)
+                select uuid, date_finish from due
+                on conflict (game_uuid) do update set date_finish = excluded.date_finish
+            ), queued as (
+                insert into notifications (chat_id, text, parse_mode, status)
+                select
+                    pl.telegram_id,
+                    replace(replace($5,
+                        '{title}', tg_escape_markdown_v2(due.title)),
+                        '{date}', tg_escape_markdown_v2(due.date_finish::text)),
+                    $6,
+                    $7
+                from due
+                join players as pl
+                    on pl.game_uuid = due.uuid
+            )
+            select count(*) from due;
+        """
+        working_states = [int(s) for s in GameState if s.state_is_working]
+        async with db.connection() as conn, conn.transaction():
+            if not await conn.fetchval("SELECT pg_try_advisory_xact_lock($1);", DEADLINES_LOCK_KEY):
+                return 0
+            return await conn.fetchval(sql, working_states, today, until, limit, template, parse_mode,
+                                       int(NotificationStatus.PENDING))
+
+    async def archive_games(self, before: datetime.date, limit: int) -> list[str]:
+        # one short statement per batch, locked rows are skipped instead of waiting for the handlers
+        sql = """
+            with batch as (
+                select uuid from games
+                where state = any($1) and date_finish < $2
+                order by date_finish
+                limit $3
+                for update skip locked
+            ), moved as (
+                delete from games
+                using batch
+                where games.uuid = batch.uuid
+                returning games.*
+            )
+            insert into games_archive (uuid, state, initiator_id, initiator_fullname, title, description,
+                                       date_finish, version, players, member_ids)
+            select
+                moved.uuid, moved.state, moved.initiator_id, moved.initiator_fullname, moved.title,
+                moved.description, moved.date_finish, moved.version,
+                COALESCE(pl.players, '[]'),
+                COALESCE(pl.member_ids, '{}')
+            from moved
+            left join lateral (
+                -- the statement sees the players as they were before the cascade delete
+                select
+                    jsonb_agg(jsonb_build_object('id', p.id, 'telegram_id', p.telegram_id, 'fullname', p.fullname,
+                                                 'username', p.username, 'recipient_id', p.recipient_id)
+                              order by p.id) as players,
+                    array_agg(p.telegram_id order by p.id) as member_ids
+                from players as p
+                where p.game_uuid = moved.uuid
+            ) as pl on true
+            returning uuid;
+        """
+        # finished and abandoned games alike, the index on (state, date_finish) is scanned per state
+        states = [int(s) for s in GameState]
+        async with db.connection() as conn, conn.transaction():
+            if not await conn.fetchval("SELECT pg_try_advisory_xact_lock($1);", ARCHIVE_LOCK_KEY):
+                return []
+            archived = [row["uuid"] for row in await conn.fetch(sql, states, before, limit)]
+            if archived:
+                await conn.execute("SELECT pg_notify($1, $2 || uuid::text) FROM unnest($3::uuid[]) AS uuid;",
+                                   db.CHANNEL_GAMES, db.notify_payload(""), archived)
+        return [str(game_uuid) for game_uuid in archived]
+
+    async def get_archived(self, telegram_id: int) -> list[GameSanta]:
+        sql = """
+            select uuid, state, initiator_id, initiator_fullname, title, description, date_finish, version, players
+            from games_archive
+            where initiator_id = $1 or member_ids @> array[$1::bigint];
+        """
+        async with db.connection() as conn:
+            rows = await conn.fetch(sql, telegram_id)
+        return [self._build_game({**row, "players": json.loads(row["players"])}) for row in rows]
+
+    async def get_previous_pairs(self, game_uuid: str) -> list[tuple[int, int]]:
+        sql = """
+            with game as (
+                select uuid, initiator_id from games where uuid = $1
+            ), previous as (
+                select g.uuid, g.date_finish, null::jsonb as players
+                from games as g, game
+                where g.initiator_id = game.initiator_id and g.uuid <> game.uuid and g.state = $2
+                union all
+                select a.uuid, a.date_finish, a.players
+                from games_archive as a, game
+                where a.initiator_id = game.initiator_id and a.state = $2
+                order by date_finish desc
+                limit 1
+            ), previous_players as (
+                select p.id, p.telegram_id, p.recipient_id
+                from previous
+                join players as p
+                    on p.game_uuid = previous.uuid
+                where previous.players is null
+                union all
+                select p.id, p.telegram_id, p.recipient_id
+                from previous, jsonb_to_recordset(previous.players) as p(id integer, telegram_id bigint,
+                                                                           recipient_id integer)
+            )
+            select giver.telegram_id as giver_id, receiver.telegram_id as receiver_id
+            from previous_players as giver
+            join previous_players as receiver
+                on receiver.id = giver.recipient_id;
+        """
+        async with db.connection() as conn:
+            rows = await conn.fetch(sql, game_uuid, int(GameState.ALLOCATED))
+        return [(row["giver_id"], row["receiver_id"]) for row in rows]
+
+    @staticmethod
+    async def _insert_players(conn: asyncpg.Connection, new_players: Iterable[Player]):
+        """Вставляет всех новых игроков одним запросом и проставляет им id"""
+        new_players = list(new_players)
+        sql = """
+            INSERT INTO players (telegram_id, fullname, username, game_uuid)
+            SELECT * FROM unnest($1::bigint[], $2::varchar[], $3::varchar[], $4::uuid[])
+            RETURNING id, telegram_id;
+        """
+        data = ([p.telegram_id for p in new_players], [p.fullname for p in new_players],
+                [p.username for p in new_players], [p.game_uuid for p in new_players])
+        rows = await conn.fetch(sql, *data)
+
+        ids = {row["telegram_id"]: row["id"] for row in rows}
+        for player in new_players:
+            player.id = ids[player.telegram_id]
+
+    @staticmethod
+    async def _insert_notifications(conn: asyncpg.Connection, notifications: list[Notification]):
+        sql = """
+            INSERT INTO notifications (chat_id, text, parse_mode, status)
+            SELECT *, $4::smallint FROM unnest($1::bigint[], $2::varchar[], $3::varchar[]);
+        """
+        data = ([n.chat_id for n in notifications], [n.text for n in notifications],
+                [n.parse_mode for n in notifications])
+        await conn.execute(sql, *data, int(NotificationStatus.PENDING))
+
     async def delete(self, game: GameSanta):
-        conn = await db.connection()
         sql = "delete from games where uuid=$1"
-        await conn.execute(sql, game.uuid)
+        async with db.connection() as conn, conn.transaction():
+            await conn.execute(sql, game.uuid)
+            await conn.execute("SELECT pg_notify($1, $2);", db.CHANNEL_GAMES, db.notify_payload(game.uuid))
+            if game.meta.notifications:
+                await self._insert_notifications(conn, game.meta.notifications)
+        game.meta.clear()
+
+    async def get_players_csv(self, game_uuid: str, columns: Sequence[str] = PLAYERS_CSV_COLUMNS) -> BinaryIO:
+        _check_csv_columns(columns)
+        sql = f"select {','.join(columns)} from players where game_uuid=$1 order by id"
+        buffer = tempfile.SpooledTemporaryFile(max_size=CSV_SPOOL_MAX_SIZE)
+
+        async def write(data: bytes):
+            buffer.write(data)
+
+        # rows are streamed by the server in CSV format straight into the buffer
+        async with db.connection() as conn:
+            status = await conn.copy_from_query(sql, game_uuid, output=write, format="csv", header=True,
+                                                delimiter=config.CSV_SPLITTER)
+
+        if status == "COPY 0":
+            buffer.close()
+            return None
+        buffer.seek(0)
+        return buffer
+
+    async def claim_notifications(self, limit: int, lease: float) -> list[Notification]:
+        sql = """
+            UPDATE notifications
+            SET attempts = attempts + 1, send_after = now() + make_interval(secs => $2)
+            WHERE id IN (
+                SELECT id FROM notifications
+                WHERE status = $3 AND send_after <= now()
+                ORDER BY send_after
+                LIMIT $1
+                FOR UPDATE SKIP LOCKED  -- other replicas take the next rows
+            )
+            RETURNING id, chat_id, text, parse_mode, attempts;
+        """
+        async with db.connection() as conn:
+            rows = await conn.fetch(sql, limit, lease, int(NotificationStatus.PENDING))
+        return [Notification(**row) for row in rows]
+
+    async def update_notifications(self, notifications: list[Notification]):
+        sql = """
+            UPDATE notifications
+            SET status = data.status, send_after = COALESCE(data.send_after, notifications.send_after),
+                error = data.error
+            FROM unnest($1::bigint[], $2::smallint[], $3::timestamptz[], $4::text[])
+                AS data (id, status, send_after, error)
+            WHERE notifications.id = data.id;
+        """
+        data = ([n.id for n in notifications], [int(n.status) for n in notifications],
+                [n.send_after for n in notifications], [n.error for n in notifications])
+        async with db.connection() as conn:
+            await conn.execute(sql, *data)
+
+    async def prune_notifications(self, before: datetime.datetime, limit: int) -> int:
+        # rows claimed by a dispatcher are pending, so the batch never waits for it
+        sql = """
+            with batch as (
+                select id from notifications
+                where status <> $1 and created_at < $2
+                order by created_at
+                limit $3
+                for update skip locked
+            ), deleted as (
+                delete from notifications
+                using batch
+                where notifications.id = batch.id
+                returning 1
+            )
+            select count(*) from deleted;
+        """
+        async with db.connection() as conn:
+            return await conn.fetchval(sql, int(NotificationStatus.PENDING), before, limit)
+
+
+def _copy_csv_row(values: Iterable) -> str:
+    """Строка CSV как у COPY ... (FORMAT csv) в Postgres: NULL - пусто, пустая строка - в кавычках"""
+    fields = []
+    for value in values:
+        if value is None:
+            fields.append("")
+            continue
+        value = str(value)
+        if value in ("", "\\.") or any(c in value for c in (config.CSV_SPLITTER, '"', "\r", "\n")):
+            value = '"' + value.replace('"', '""') + '"'
+        fields.append(value)
+    return config.CSV_SPLITTER.join(fields) + "\n"
+
+
+def _discard_index(index: dict[int, set[str]], key: int, game_uuid: str):
+    games = index.get(key)
+    if games is not None:
+        games.discard(game_uuid)
+        if not games:
+            del index[key]
+
+
+def _parse_record(record: dict) -> dict:
+    """Запись игры из журнала RepositoryMemory: даты записаны строками, старые записи без новых полей"""
+    record.setdefault("version", 0)
+    record.setdefault("reminded_for", None)
+    for field in ("date_finish", "reminded_for"):
+        if record[field]:
+            record[field] = datetime.date.fromisoformat(record[field])
+    return record
+
+
+class _StorageLog:
+    """
+    Журнал изменений RepositoryMemory в локальном файле: одна json-операция на строку.
+    Компакция переписывает файл снимком текущих игр, замена файла атомарна
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.ops = 0
+        self._file = None
 
-    async def get_players_csv(self, game_uuid: str) -> io.BytesIO:
-        conn = await db.connection()
-        sql = "select * from players where game_uuid=$1"
-        result = await conn.fetch(sql, game_uuid)
-        if result:
-            data = (config.CSV_SPLITTER.join(result[0].keys())+"\n").encode()
+    def read(self) -> Iterator[dict]:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as file:
+            for line in file:
+                if not line.endswith("\n"):
+                    break  # the last write was interrupted
+                yield json.loads(line)
 
-            for row in result:
-                data += (config.CSV_SPLITTER.join(map(str, row))+"\n").encode()
-            return io.BytesIO(data)
+    def append(self, op: dict):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps(op, ensure_ascii=False, default=str) + "\n")
+        self._file.flush()
+        self.ops += 1
+
+    def load(self, uuids: set[str]) -> dict[str, dict]:
+        """Последние состояния игр uuids по журналу, удаленные и архивные игры пропускаются"""
+        records = {}
+        for op in self.read():
+            match op["op"]:
+                case "put" if op["game"]["uuid"] in uuids:
+                    records[op["game"]["uuid"]] = _parse_record(op["game"])
+                case "player" if op["uuid"] in records:
+                    records[op["uuid"]]["players"].append(op["player"])
+                    records[op["uuid"]]["version"] += 1
+                case "delete":
+                    records.pop(op["uuid"], None)
+                case "archive":
+                    records.pop(op["game"]["uuid"], None)
+        return records
+
+    def compact(self, records: Iterable[dict], archived: Iterable[dict] = ()):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+        tmp_path = self.path + ".tmp"
+        self.ops = 0
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            for record in records:
+                file.write(json.dumps({"op": "put", "game": record}, ensure_ascii=False, default=str) + "\n")
+                self.ops += 1
+            for record in archived:
+                file.write(json.dumps({"op": "archive", "game": record}, ensure_ascii=False, default=str) + "\n")
+                self.ops += 1
+        os.replace(tmp_path, self.path)
 
 
 class RepositoryMemory(AbstractRepository):
-    def __init__(self):
-        self.storage: dict[str, GameSanta] = {}
+    """
+    Хранилище в памяти для разработки и одного процесса. Игры лежат записями, как строки таблиц,
+    и на каждый get собирается новый GameSanta, поэтому поведение совпадает с Repository.
+    Игры пользователя ищутся по индексам создателя и участников, сверх maxsize давно не использованные
+    вытесняются из памяти. С path изменения пишутся в журнал и восстанавливаются при рестарте,
+    вытесненная игра остается в журнале и загружается из него при обращении по uuid, но не видна
+    в списках игр пользователя. Без path вытесненные игры теряются
+    """
+
+    def __init__(self, maxsize: int = config.LIMIT_STORAGE_GAME, path: str = config.MEMORY_STORAGE_PATH):
+        self.maxsize = maxsize
+        self.storage: OrderedDict[str, dict] = OrderedDict()
+        self._by_initiator: defaultdict[int, set[str]] = defaultdict(set)
+        self._by_member: defaultdict[int, set[str]] = defaultdict(set)
+        self._player_id = 0
+        # archived records keep "players" but leave the indexes
+        self.archive: OrderedDict[str, dict] = OrderedDict()
+
+        self.notifications: dict[int, Notification] = {}
+        self._notification_id = 0
+
+        # uuids of the games evicted from memory but kept in the log
+        self._evicted: set[str] = set()
+        self._spill = bool(path)
+        self._log = _StorageLog(path) if path else None
+        if self._log:
+            self._replay()
+
+    # engine
+
+    def _replay(self):
+        log, self._log = self._log, None  # replayed operations are not written again
+        for op in log.read():
+            match op["op"]:
+                case "put":
+                    self._put(_parse_record(op["game"]))
+                case "player" if op["uuid"] in self.storage:
+                    self._add_player(self.storage[op["uuid"]], op["player"])
+                case "delete":
+                    self._remove(op["uuid"])
+                case "archive":
+                    self._put_archive(_parse_record(op["game"]))
+        self._log = log
+        self._compact()
+
+    def _write(self, op: dict):
+        if self._log is None:
+            return
+        self._log.append(op)
+        if self._log.ops > MEMORY_LOG_COMPACT_OPS + 2 * (len(self.storage) + len(self.archive) + len(self._evicted)):
+            self._compact()
+
+    def _compact(self):
+        # the snapshot keeps the evicted games, they are read back from the old log
+        evicted = self._log.load(self._evicted) if self._evicted else {}
+        self._evicted.intersection_update(evicted)
+        self._log.compact([*self.storage.values(), *evicted.values()], self.archive.values())
+
+    def _touch(self, game_uuid: str) -> dict | None:
+        record = self.storage.get(game_uuid)
+        if record is not None:
+            self.storage.move_to_end(game_uuid)
+        elif game_uuid in self._evicted:
+            record = self._log.load({game_uuid}).get(game_uuid)
+            self._evicted.discard(game_uuid)
+            if record is not None:
+                self._put(record)
+        return record
+
+    def _put(self, record: dict):
+        self._remove(record["uuid"], log=False)
+        self.storage[record["uuid"]] = record
+        self._by_initiator[record["initiator_id"]].add(record["uuid"])
+        for player in record["players"]:
+            self._player_id = max(self._player_id, player["id"])
+            self._by_member[player["telegram_id"]].add(record["uuid"])
+
+        while 0 < self.maxsize < len(self.storage):
+            self._evict(next(iter(self.storage)))
+
+    def _add_player(self, record: dict, player: dict):
+        self._player_id = max(self._player_id, player["id"])
+        record["players"].append(player)
+        record["version"] += 1
+        self._by_member[player["telegram_id"]].add(record["uuid"])
+
+    def _put_archive(self, record: dict):
+        self._remove(record["uuid"], log=False)
+        # maxsize bounds the live games only, archived games are never dropped
+        self.archive[record["uuid"]] = record
+
+    def _evict(self, game_uuid: str):
+        """Вытесняет игру только из памяти, в журнале она остается"""
+        self._remove(game_uuid, log=False)
+        if self._spill:
+            self._evicted.add(game_uuid)
+
+    def _remove(self, game_uuid: str, log: bool = True):
+        self._evicted.discard(game_uuid)
+        record = self.storage.pop(game_uuid, None)
+        if record is None:
+            return
+        _discard_index(self._by_initiator, record["initiator_id"], game_uuid)
+        for player in record["players"]:
+            _discard_index(self._by_member, player["telegram_id"], game_uuid)
+        if log:
+            self._write({"op": "delete", "uuid": game_uuid})
+
+    def _user_games(self, telegram_id: int) -> set[str]:
+        return self._by_initiator.get(telegram_id, set()) | self._by_member.get(telegram_id, set())
+
+    def _new_player(self, player: Player, game_uuid: str) -> dict:
+        self._player_id += 1
+        player.id = self._player_id
+        player.game_uuid = game_uuid
+        return {"id": player.id, "telegram_id": player.telegram_id, "fullname": player.fullname,
+                "username": player.username, "recipient_id": None}
+
+    @staticmethod
+    def _build_game(record: dict) -> GameSanta:
+        # reminded_for is kept apart from the games table in postgres
+        record = {k: v for k, v in record.items() if k != "reminded_for"}
+        return Repository._build_game({**record, "players": [dict(p) for p in record["players"]]})
+
+    def _add_notifications(self, game: GameSanta):
+        for notification in game.meta.notifications:
+            self._notification_id += 1
+            notification.id = self._notification_id
+            self.notifications[notification.id] = notification
+
+    # repository
 
     async def get(self, game_uuid: str) -> GameSanta:
-        return self.storage.get(game_uuid, None)
+        record = self._touch(game_uuid)
+        if record is not None:
+            return self._build_game(record)
+
+    async def get_many(self, game_uuids: Iterable[str]) -> dict[str, GameSanta]:
+        return {game_uuid: self._build_game(record) for game_uuid in game_uuids
+                if (record := self._touch(game_uuid)) is not None}
 
     async def get_list(self, telegram_id: int) -> list[GameSanta]:
-        return [g for g in self.storage.values() if g.initiator_id == telegram_id or g.check_member(telegram_id)]
+        return [self._build_game(self.storage[game_uuid]) for game_uuid in self._user_games(telegram_id)]
+
+    async def get_summaries(self, telegram_id: int, limit: int, cursor: str = None,
+                            backward: bool = False) -> GamesPage:
+        uuids = sorted(self._user_games(telegram_id), reverse=backward)
+        if cursor:
+            uuids = [u for u in uuids if (u < cursor if backward else u > cursor)]
+
+        rows = []
+        for game_uuid in uuids[:limit + 1]:
+            record = self.storage[game_uuid]
+            rows.append(GameSummary(uuid=game_uuid, title=record["title"],
+                                    is_owner=record["initiator_id"] == telegram_id,
+                                    is_member=game_uuid in self._by_member.get(telegram_id, ()),
+                                    players_count=len(record["players"])))
+        return GamesPage.build(rows, limit, cursor, backward)
 
     async def save(self, game: GameSanta) -> GameSanta:
-        if not game.uuid:
+        created = not game.uuid
+        if created:
             game.uuid = str(uuid.uuid4())
-        self.storage[game.uuid] = game
+            record = {"uuid": game.uuid, "state": None, "initiator_id": None, "initiator_fullname": None,
+                      "title": None, "description": None, "date_finish": None, "version": 0, "reminded_for": None,
+                      "players": []}
+        else:
+            record = self._touch(game.uuid)
+            if game.meta.changed and (record is None or record["version"] != game.version):
+                raise StaleGameError(game.uuid, game.version)
+
+        if record is not None and (created or game.meta.changed):
+            record = {**record, "players": [dict(p) for p in record["players"]]}
+            record["version"] += 0 if created else 1
+            game.version = record["version"]
+            for field in game.meta.changed_fields:
+                value = getattr(game, field)
+                record[field] = value.value if isinstance(value, GameState) else value
+            for player in game.meta.new_players:
+                record["players"].append(self._new_player(player, game.uuid))
+            if game.meta.shuffled_players:
+                recipients = {p.id: p.recipient.id for p in game.players}
+                for player in record["players"]:
+                    player["recipient_id"] = recipients.get(player["id"], player["recipient_id"])
+            self._put(record)
+            self._write({"op": "put", "game": record})
+
+        self._add_notifications(game)
+        game.meta.clear()
+        return game
+
+    async def join_game(self, game_uuid: str, player: Player) -> JoinResult:
+        record = self._touch(game_uuid)
+
+        if record is None:
+            return JoinResult(JoinStatus.NOT_FOUND)
+        if game_uuid in self._by_member.get(player.telegram_id, ()):
+            return JoinResult(JoinStatus.ALREADY_JOINED, record["title"])
+        if record["state"] != GameState.REGISTRATION_OPEN.value:
+            return JoinResult(JoinStatus.REGISTRATION_CLOSED, record["title"])
+
+        saved_player = self._new_player(player, game_uuid)
+        self._add_player(record, saved_player)
+        self._write({"op": "player", "uuid": game_uuid, "player": saved_player})
+        game = self._build_game({**record, "players": [saved_player]})
+        return JoinResult(JoinStatus.JOINED, record["title"], game, len(record["players"]))
+
+    async def shuffle_game(self, game_uuid: str, template: str = None, parse_mode: str = None) -> ShuffleResult:
+        record = self._touch(game_uuid)
+
+        if record is None:
+            return ShuffleResult(ShuffleStatus.NOT_FOUND)
+        game = self._build_game(record)
+        if not game.state.state_is_working:
+            return ShuffleResult(ShuffleStatus.WRONG_STATE)
+        if len(game.players) < 2:
+            return ShuffleResult(ShuffleStatus.NOT_ENOUGH_PLAYERS, len(game.players))
+
+        game.shuffle()
+        if template:
+            game.notify_recipients(template, parse_mode)
+        await self.save(game)
+        return ShuffleResult(ShuffleStatus.SHUFFLED, len(game.players))
+
+    async def close_due_games(self, today: datetime.date, limit: int, template: str = None,
+                              parse_mode: str = None) -> list[str]:
+        due = [r for r in self.storage.values()
+               if r["state"] == GameState.REGISTRATION_OPEN.value and r["date_finish"] and r["date_finish"] <= today]
+        due.sort(key=lambda r: r["date_finish"])
+
+        closed = []
+        for record in due[:limit]:
+            record = {**record, "state": GameState.REGISTRATION_CLOSE.value, "version": record["version"] + 1}
+            self._put(record)
+            self._write({"op": "put", "game": record})
+            if template:
+                await self.shuffle_game(record["uuid"], template, parse_mode)
+            closed.append(record["uuid"])
+        return closed
+
+    async def queue_reminders(self, today: datetime.date, until: datetime.date, limit: int, template: str,
+                              parse_mode: str = None) -> int:
+        working_states = {s.value for s in GameState if s.state_is_working}
+        due = [r for r in self.storage.values()
+               if r["state"] in working_states and r["date_finish"] and today <= r["date_finish"] <= until
+               and r["reminded_for"] != r["date_finish"]]
+        due.sort(key=lambda r: r["date_finish"])
+
+        for record in due[:limit]:
+            game = self._build_game(record)
+            game.notify(game.players, (template.replace("{title}", escape_markdown(game.title, version=2))
+                                       .replace("{date}", escape_markdown(str(game.date_finish), version=2))),
+                        parse_mode)
+            self._add_notifications(game)
+            record = {**record, "reminded_for": record["date_finish"]}
+            self._put(record)
+            self._write({"op": "put", "game": record})
+        return len(due[:limit])
+
+    async def archive_games(self, before: datetime.date, limit: int) -> list[str]:
+        due = [r for r in self.storage.values() if r["date_finish"] and r["date_finish"] < before]
+        due.sort(key=lambda r: r["date_finish"])
+
+        archived = []
+        for record in due[:limit]:
+            self._put_archive(record)
+            self._write({"op": "archive", "game": record})
+            archived.append(record["uuid"])
+        return archived
+
+    async def get_archived(self, telegram_id: int) -> list[GameSanta]:
+        return [self._build_game(record) for record in self.archive.values()
+                if record["initiator_id"] == telegram_id or any(p["telegram_id"] == telegram_id
+                                                                for p in record["players"])]
+
+    async def get_previous_pairs(self, game_uuid: str) -> list[tuple[int, int]]:
+        game = self._touch(game_uuid)
+        if game is None:
+            return []
+        previous = [r for r in (*self.storage.values(), *self.archive.values())
+                    if r["initiator_id"] == game["initiator_id"] and r["uuid"] != game_uuid
+                    and r["state"] == GameState.ALLOCATED.value]
+        if not previous:
+            return []
+
+        players = max(previous, key=lambda r: r["date_finish"])["players"]
+        telegram_ids = {p["id"]: p["telegram_id"] for p in players}
+        return [(p["telegram_id"], telegram_ids[p["recipient_id"]]) for p in players if p["recipient_id"]]
 
     async def delete(self, game: GameSanta):
-        self.storage.pop(game.uuid, None)
+        self._remove(game.uuid)
+        self._add_notifications(game)
+        game.meta.clear()
 
-    async def get_players_csv(self, game_uuid: str) -> io.BytesIO:
-        game = self.storage.get(game_uuid, None)
+    async def get_players_csv(self, game_uuid: str, columns: Sequence[str] = PLAYERS_CSV_COLUMNS) -> BinaryIO:
+        _check_csv_columns(columns)
+        record = self._touch(game_uuid)
 
+        if record and record["players"]:
+            buffer = tempfile.SpooledTemporaryFile(max_size=CSV_SPOOL_MAX_SIZE)
+            text = io.TextIOWrapper(buffer, encoding="utf-8", newline="")
+
+            text.write(_copy_csv_row(columns))
+            for player in sorted(record["players"], key=lambda p: p["id"]):
+                player = {**player, "game_uuid": game_uuid}
+                text.write(_copy_csv_row([player[k] for k in columns]))
+
+            text.detach()  # flushes without closing the buffer
+            buffer.seek(0)
+            return buffer
+
+    async def claim_notifications(self, limit: int, lease: float) -> list[Notification]:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        claimed = []
+        for notification in self.notifications.values():
+            if len(claimed) == limit:
+                break
+            if notification.send_after is None or notification.send_after <= now:
+                notification.attempts += 1
+                notification.send_after = now + datetime.timedelta(seconds=lease)
+                claimed.append(notification)
+        return claimed
+
+    async def update_notifications(self, notifications: list[Notification]):
+        # delivered and failed notifications are not kept in memory
+        for notification in notifications:
+            if notification.status != NotificationStatus.PENDING:
+                self.notifications.pop(notification.id, None)
+
+    async def prune_notifications(self, before: datetime.datetime, limit: int) -> int:
+        return 0
+
+
+class RepositoryCache(AbstractRepository):
+    """
+    Read-through кэш игр поверх другого repository: LRU + TTL, запись насквозь при save/delete.
+    Изменения игр другими процессами приходят через LISTEN/NOTIFY и сбрасывают запись в кэше.
+    Обработчики получают свои копии игр, поэтому параллельные изменения одной игры ловит проверка версии в save
+    """
+
+    def __init__(self, repository: AbstractRepository,
+                 maxsize: int = config.LIMIT_STORAGE_GAME,
+                 ttl: float = config.LIMIT_CACHE_STORAGE):
+        self.repository = repository
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._games: OrderedDict[str, tuple[float, GameSanta]] = OrderedDict()
+        db.subscribe(db.CHANNEL_GAMES, self.invalidate)
+
+    def _get_cached(self, game_uuid: str) -> GameSanta | None:
+        item = self._games.get(game_uuid)
+        if item is None:
+            return None
+
+        expires_at, game = item
+        if expires_at < time.monotonic():
+            del self._games[game_uuid]
+            return None
+        self._games.move_to_end(game_uuid)
+        return game
+
+    def _put(self, game: GameSanta):
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        cached = self._games.get(game.uuid)
+        if cached is not None and cached[1].version > game.version:
+            return  # a slow read must not replace a newer version
+        self._games[game.uuid] = (time.monotonic() + self.ttl, game.copy())
+        self._games.move_to_end(game.uuid)
+        while len(self._games) > self.maxsize:
+            self._games.popitem(last=False)
+
+    def invalidate(self, game_uuid: str = None):
+        """Сбрасывает игру из кэша, без game_uuid - весь кэш"""
+        if game_uuid is None:
+            self._games.clear()
+        else:
+            self._games.pop(game_uuid, None)
+
+    async def get(self, game_uuid: str) -> GameSanta:
+        game = self._get_cached(game_uuid)
+        if game is not None:
+            return game.copy()
+
+        game = await self.repository.get(game_uuid)
         if game:
-            columns = ['id', 'telegram_id', 'fullname', 'username', 'recipient_id', 'game_uuid']
-            data = config.CSV_SPLITTER.join(columns).encode()
+            self._put(game)
+        return game
+
+    async def get_many(self, game_uuids: Iterable[str]) -> dict[str, GameSanta]:
+        games, missed = {}, []
+        for game_uuid in game_uuids:
+            game = self._get_cached(game_uuid)
+            if game is None:
+                missed.append(game_uuid)
+            else:
+                games[game_uuid] = game.copy()
+        if missed:
+            loaded = await self.repository.get_many(missed)
+            for game in loaded.values():
+                self._put(game)
+            games.update(loaded)
+        return games
+
+    async def get_list(self, telegram_id: int) -> list[GameSanta]:
+        return await self.repository.get_list(telegram_id)
+
+    async def get_summaries(self, telegram_id: int, limit: int, cursor: str = None,
+                            backward: bool = False) -> GamesPage:
+        return await self.repository.get_summaries(telegram_id, limit, cursor, backward)
+
+    async def save(self, game: GameSanta) -> GameSanta:
+        try:
+            await self.repository.save(game)
+        except Exception:
+            self.invalidate(game.uuid)
+            raise
+        self._put(game)
+        return game
+
+    async def join_game(self, game_uuid: str, player: Player) -> JoinResult:
+        result = await self.repository.join_game(game_uuid, player)
+        if result.status == JoinStatus.JOINED:
+            # keep the cached game instead of reloading every player on the next view
+            game = self._get_cached(game_uuid)
+            if game:
+                game.add_saved_player(Player(player.id, player.telegram_id, player.fullname, player.username,
+                                             None, game_uuid))
+                game.version += 1
+        return result
+
+    async def shuffle_game(self, game_uuid: str, template: str = None, parse_mode: str = None) -> ShuffleResult:
+        # our own NOTIFY is skipped, and a concurrent get may cache the game while the shuffle is written
+        self.invalidate(game_uuid)
+        try:
+            return await self.repository.shuffle_game(game_uuid, template, parse_mode)
+        finally:
+            self.invalidate(game_uuid)
+
+    async def close_due_games(self, today: datetime.date, limit: int, template: str = None,
+                              parse_mode: str = None) -> list[str]:
+        closed = await self.repository.close_due_games(today, limit, template, parse_mode)
+        for game_uuid in closed:
+            self.invalidate(game_uuid)
+        return closed
+
+    async def queue_reminders(self, today: datetime.date, until: datetime.date, limit: int, template: str,
+                              parse_mode: str = None) -> int:
+        return await self.repository.queue_reminders(today, until, limit, template, parse_mode)
+
+    async def archive_games(self, before: datetime.date, limit: int) -> list[str]:
+        archived = await self.repository.archive_games(before, limit)
+        for game_uuid in archived:
+            self.invalidate(game_uuid)
+        return archived
+
+    async def get_archived(self, telegram_id: int) -> list[GameSanta]:
+        return await self.repository.get_archived(telegram_id)
+
+    async def get_previous_pairs(self, game_uuid: str) -> list[tuple[int, int]]:
+        return await self.repository.get_previous_pairs(game_uuid)
+
+    async def delete(self, game: GameSanta):
+        self.invalidate(game.uuid)
+        try:
+            await self.repository.delete(game)
+        finally:
+            self.invalidate(game.uuid)
+
+    async def get_players_csv(self, game_uuid: str, columns: Sequence[str] = PLAYERS_CSV_COLUMNS) -> BinaryIO:
+        return await self.repository.get_players_csv(game_uuid, columns)
+
+    async def claim_notifications(self, limit: int, lease: float) -> list[Notification]:
+        return await self.repository.claim_notifications(limit, lease)
+
+    async def update_notifications(self, notifications: list[Notification]):
+        await self.repository.update_notifications(notifications)
+
+    async def prune_notifications(self, before: datetime.datetime, limit: int) -> int:
+        return await self.repository.prune_notifications(before, limit)
+
+
+class RepositoryMetrics(AbstractRepository):
+    """
+    Замеряет время и количество запросов к БД каждого метода другого repository.
+    Оборачивает repository только при включенных метриках
+    """
+
+    def __init__(self, repository: AbstractRepository):
+        self.repository = repository
+
+    @metrics.timed_repository_call
+    async def get(self, game_uuid: str) -> GameSanta:
+        return await self.repository.get(game_uuid)
+
+    @metrics.timed_repository_call
+    async def get_many(self, game_uuids: Iterable[str]) -> dict[str, GameSanta]:
+        return await self.repository.get_many(game_uuids)
+
+    @metrics.timed_repository_call
+    async def get_list(self, telegram_id: int) -> list[GameSanta]:
+        return await self.repository.get_list(telegram_id)
+
+    @metrics.timed_repository_call
+    async def get_summaries(self, telegram_id: int, limit: int, cursor: str = None,
+                            backward: bool = False) -> GamesPage:
+        return await self.repository.get_summaries(telegram_id, limit, cursor, backward)
+
+    @metrics.timed_repository_call
+    async def save(self, game: GameSanta) -> GameSanta:
+        return await self.repository.save(game)
+
+    @metrics.timed_repository_call
+    async def join_game(self, game_uuid: str, player: Player) -> JoinResult:
+        return await self.repository.join_game(game_uuid, player)
+
+    @metrics.timed_repository_call
+    async def shuffle_game(self, game_uuid: str, template: str = None, parse_mode: str = None) -> ShuffleResult:
+        return await self.repository.shuffle_game(game_uuid, template, parse_mode)
+
+    @metrics.timed_repository_call
+    async def close_due_games(self, today: datetime.date, limit: int, template: str = None,
+                              parse_mode: str = None) -> list[str]:
+        return await self.repository.close_due_games(today, limit, template, parse_mode)
+
+    @metrics.timed_repository_call
+    async def queue_reminders(self, today: datetime.date, until: datetime.date, limit: int, template: str,
+                              parse_mode: str = None) -> int:
+        return await self.repository.queue_reminders(today, until, limit, template, parse_mode)
+
+    @metrics.timed_repository_call
+    async def archive_games(self, before: datetime.date, limit: int) -> list[str]:
+        return await self.repository.archive_games(before, limit)
+
+    @metrics.timed_repository_call
+    async def get_archived(self, telegram_id: int) -> list[GameSanta]:
+        return await self.repository.get_archived(telegram_id)
+
+    @metrics.timed_repository_call
+    async def get_previous_pairs(self, game_uuid: str) -> list[tuple[int, int]]:
+        return await self.repository.get_previous_pairs(game_uuid)
+
+    @metrics.timed_repository_call
+    async def delete(self, game: GameSanta):
+        await self.repository.delete(game)
+
+    @metrics.timed_repository_call
+    async def get_players_csv(self, game_uuid: str, columns: Sequence[str] = PLAYERS_CSV_COLUMNS) -> BinaryIO:
+        return await self.repository.get_players_csv(game_uuid, columns)
+
+    @metrics.timed_repository_call
+    async def claim_notifications(self, limit: int, lease: float) -> list[Notification]:
+        return await self.repository.claim_notifications(limit, lease)
+
+    @metrics.timed_repository_call
+    async def update_notifications(self, notifications: list[Notification]):
+        await self.repository.update_notifications(notifications)
 
-            for player in game.players:
-                values = [str(getattr(player, k)) for k in columns]
-                data += config.CSV_SPLITTER.join(values).encode()
-            return io.BytesIO(data)
\ No newline at end of file
+    @metrics.timed_repository_call
+    async def prune_notifications(self, before: datetime.datetime, limit: int) -> int:
+        return await self.repository.prune_notifications(before, limit)
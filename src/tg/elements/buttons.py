@@ -1,38 +1,87 @@
+import re
+
 from telegram import InlineKeyboardButton
 
 from src.tg.elements.base import BaseCallbackConstructor
-from src.tg.elements.data import CallbackData
-from src.domain.model import GameSanta, GameState
+from src.tg.elements.data import CallbackData, RE_GAME_ID
+from src.tg.utils import callback_codec
+from src.domain.model import GameSanta, GameState, GameSummary
 
 
 class CallbackGame(BaseCallbackConstructor):
     __slots__ = ["game_id", "callback"]
     splitter = "="
+    _game_id_pattern = re.compile(RE_GAME_ID)
 
-    def __init__(self, callback: CallbackData, game_id: str):
+    def __init__(self, callback: CallbackData, game_id: str | None):
         self.callback = callback
         self.game_id = game_id
 
     @property
     def callback_data(self):
-        return self.callback + self.splitter + self.game_id
+        if self.callback.with_game_id:
+            return callback_codec.encode(self.callback.code, self.game_id)
+        return callback_codec.encode(self.callback.code)
+
+    @classmethod
+    def from_callback_data(cls, callback_data: str) -> 'CallbackGame | None':
+        """
+        Разбирает компактную callback_data, либо action=game_id кнопок, отправленных до нее
+
+        :return: None - неизвестное действие или id игры не подходит действию
+        """
+        if callback_codec.is_compact(callback_data):
+            return cls._from_compact(callback_data)
+
+        action, _, game_id = callback_data.partition(cls.splitter)
+        try:
+            callback = CallbackData(action)
+        except ValueError:
+            return None
+        if callback is CallbackData.UNKNOWN:
+            return None
+        if callback.with_game_id:
+            if not cls._game_id_pattern.fullmatch(game_id):
+                return None
+        elif game_id:
+            return None
+        return cls(callback, game_id or None)
 
     @classmethod
-    def from_callback_data(cls, callback_data: str):
-        return cls(*callback_data.split(cls.splitter))
+    def _from_compact(cls, callback_data: str) -> 'CallbackGame | None':
+        try:
+            payload = callback_codec.decode(callback_data)
+            callback = CallbackData.from_code(payload.code)
+            if callback is None:
+                return None
+            game_id = payload.uuid() if callback.with_game_id else None
+        except ValueError:
+            return None
+        return cls(callback, game_id) if payload.exhausted else None
 
 
 class ViewGameButton(InlineKeyboardButton):
-    def __init__(self, game: GameSanta, user_id: int = None, prev_emoji: bool = False):
+    def __init__(self, game: GameSanta, prev_emoji: bool = False):
         text_btn = game.title
-        if user_id:
-            text_btn = ("\U0001F511 " if game.initiator_id == user_id else "") + text_btn
-            text_btn = ("\U0001F385 " if game.check_member(user_id) else "") + text_btn
         if prev_emoji:
             text_btn = "\U000021A9 " + text_btn
         super().__init__(text_btn, callback_data=str(CallbackGame(CallbackData.VIEW_GAME, game.uuid)))
 
 
+class MyGameButton(InlineKeyboardButton):
+    def __init__(self, game: GameSummary):
+        text_btn = game.title
+        text_btn = ("\U0001F511 " if game.is_owner else "") + text_btn
+        text_btn = ("\U0001F385 " if game.is_member else "") + text_btn
+        super().__init__(text_btn, callback_data=str(CallbackGame(CallbackData.VIEW_GAME, game.uuid)))
+
+
+class MyGamesPageButton(InlineKeyboardButton):
+    def __init__(self, cursor: str, backward: bool = False):
+        callback = CallbackData.MY_GAMES_PREV if backward else CallbackData.MY_GAMES_NEXT
+        super().__init__("<<<" if backward else ">>>", callback_data=str(CallbackGame(callback, cursor)))
+
+
 class ShufflePlayersButton(InlineKeyboardButton):
     def __init__(self, game_id: str):
         super().__init__("Распределить Тайных Сант",
@@ -78,4 +127,4 @@ class DeleteGameButton(InlineKeyboardButton):
 class MyGamesButton(InlineKeyboardButton):
     def __init__(self, prev_emoji: bool = False):
         text = "\U000021A9 Мои игры" if prev_emoji else "Мои игры"
-        super().__init__(text, callback_data=CallbackData.MY_GAMES)
+        super().__init__(text, callback_data=str(CallbackGame(CallbackData.MY_GAMES, None)))
@@ -8,6 +8,7 @@ class CommandData(str, enum.Enum):
     HELP = "help"
     CREATE_GAME = "create_game"
     MY_GAMES = "my_games"
+    ARCHIVE = "archive"
 
     def __str__(self):
         return self.value
@@ -23,10 +24,14 @@ class CommandData(str, enum.Enum):
                 return "Создать новую игру Тайный Санта"
             case self.MY_GAMES:
                 return "Мои игры"
+            case self.ARCHIVE:
+                return "Архив прошедших игр"
 
 
 class CallbackData(str, enum.Enum):
     MY_GAMES = CommandData.MY_GAMES
+    MY_GAMES_NEXT = "my_games_next"
+    MY_GAMES_PREV = "my_games_prev"
     VIEW_GAME = "view_game"
     SHUFFLE_PLAYERS = "shuffle_players"
     CHANGE_REGISTRATION = "change_registration"
@@ -41,15 +46,36 @@ class CallbackData(str, enum.Enum):
         return self.value
 
     @property
-    def regex(self):
-        r"""
-
-        :return: VIEW_GAME: view_game=(\w+-\w+-\w+-\w+-\w+)
-        """
+    def with_game_id(self) -> bool:
         match self:
             case self.VIEW_GAME | self.SHUFFLE_PLAYERS | self.CHANGE_REGISTRATION | self.CHANGE_DESCRIPTION | \
-                 self.CHANGE_DATE | self.UPLOAD_LIST_PLAYERS | self.DELETE_GAME:
-                reg = self + f"=({RE_GAME_ID})"
-            case _:
-                reg = self
-        return "^" + reg + "$"
+                 self.CHANGE_DATE | self.UPLOAD_LIST_PLAYERS | self.DELETE_GAME | \
+                 self.MY_GAMES_NEXT | self.MY_GAMES_PREV:
+                return True
+        return False
+
+    @property
+    def code(self) -> str:
+        """Код в компактной callback_data, менять нельзя - перестанут работать уже отправленные кнопки"""
+        return _CALLBACK_CODES[self]
+
+    @classmethod
+    def from_code(cls, code: str) -> 'CallbackData | None':
+        return _CALLBACK_BY_CODE.get(code)
+
+
+# game actions use lowercase codes, the calendar uses uppercase ones
+_CALLBACK_CODES = {
+    CallbackData.MY_GAMES: "m",
+    CallbackData.MY_GAMES_NEXT: "n",
+    CallbackData.MY_GAMES_PREV: "p",
+    CallbackData.VIEW_GAME: "v",
+    CallbackData.SHUFFLE_PLAYERS: "s",
+    CallbackData.CHANGE_REGISTRATION: "r",
+    CallbackData.CHANGE_DESCRIPTION: "d",
+    CallbackData.CHANGE_DATE: "t",
+    CallbackData.UPLOAD_LIST_PLAYERS: "u",
+    CallbackData.DELETE_GAME: "x",
+    CallbackData.IGNORE: "i",
+}
+_CALLBACK_BY_CODE = {code: callback for callback, code in _CALLBACK_CODES.items()}
@@ -1,15 +1,16 @@
 from telegram import InlineKeyboardMarkup
 
-from src.domain.model import GameSanta, GameState
+from src.domain.model import GameSanta, GameState, GamesPage
 from src.tg.elements import buttons
 
 
 class ViewGameKeyboard(InlineKeyboardMarkup):
-    def __init__(self, game: GameSanta, user_id: int):
+    def __init__(self, game: GameSanta, user_id: int, players_count: int = None):
         keyboard = []
+        players_count = len(game.players) if players_count is None else players_count
 
         if game.initiator_id == user_id:
-            if len(game.players) > 1 and game.state != GameState.ALLOCATED:
+            if players_count > 1 and game.state != GameState.ALLOCATED:
                 keyboard.append([buttons.ShufflePlayersButton(game.uuid)])
             if game.state.state_is_working:
                 keyboard.append([buttons.ChangeStateButton(game)])
@@ -23,8 +24,16 @@ class ViewGameKeyboard(InlineKeyboardMarkup):
 
 
 class MyGamesKeyboard(InlineKeyboardMarkup):
-    def __init__(self, games: list[GameSanta], user_id: int):
-        keyboard = [[buttons.ViewGameButton(game, user_id)] for game in games]
+    def __init__(self, page: GamesPage):
+        keyboard = [[buttons.MyGameButton(game)] for game in page.items]
+
+        navigation = []
+        if page.prev_cursor:
+            navigation.append(buttons.MyGamesPageButton(page.prev_cursor, backward=True))
+        if page.next_cursor:
+            navigation.append(buttons.MyGamesPageButton(page.next_cursor))
+        if navigation:
+            keyboard.append(navigation)
         super().__init__(keyboard)
 
 
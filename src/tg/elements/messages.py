@@ -1,15 +1,21 @@
+from collections import OrderedDict
 from functools import partial
 from datetime import date
 
+from telegram import InlineKeyboardMarkup
 from telegram.helpers import escape_markdown, mention_markdown
 
-from src.domain.model import GameSanta, Player
+from src.domain.model import GameSanta, GamesPage
 from src.domain.model import GameState
 from src.tg.elements import keyboards
 from src.tg.elements.base import BaseMessage
 
 escape_markdown_2 = partial(escape_markdown, version=2)
 
+VIEW_GAME_CACHE_SIZE = 1024
+# (uuid, version, is_owner, is_member, bot_link) -> text before and after the recipient line, keyboard
+_view_game_cache: OrderedDict[tuple, tuple[str, str, InlineKeyboardMarkup]] = OrderedDict()
+
 
 class StartMessage(BaseMessage):
     def __init__(self, fullname: str):
@@ -45,25 +51,50 @@ class AlreadyJoinedGameMessage(BaseMessage):
 
 
 class ViewGameMessage(BaseMessage):
-    def __init__(self, game: GameSanta, bot_link: str, user_id: int):
-        template = ("*{title}*\n"
-                    "_{description}_\n\n"
-                    "{recipient_gift}"
-                    "{status}\n"
+    """
+    Текст и клавиатура зависят только от версии игры и роли пользователя, поэтому кэшируются,
+    для каждого пользователя подставляется лишь строка с получателем подарка.
+    render_key совпадает, только если сообщение выглядит так же.
+    players_count задается для игры без загруженных игроков, такой рендер и рендер игры
+    с несохраненными изменениями в кэш не попадают и не берутся из него
+    """
+
+    def __init__(self, game: GameSanta, bot_link: str, user_id: int, players_count: int = None):
+        player = game.get_player(user_id)
+        if player and player.recipient:
+            rec_link = mention_markdown(player.recipient.telegram_id, player.recipient.fullname, 2)
+            recipient_gift = f"\U0001F381 Вы дарите подарок пользователю {rec_link}\n\n"
+        else:
+            recipient_gift = ""
+
+        key = (game.uuid, game.version, game.initiator_id == user_id, player is not None, bot_link)
+        # a game with unsaved changes has no version of its own
+        cacheable = game.uuid and not game.meta.changed and players_count is None
+        rendered = _view_game_cache.get(key) if cacheable else None
+        if rendered is None:
+            rendered = self._render(game, bot_link, user_id, players_count)
+            if cacheable:
+                _view_game_cache[key] = rendered
+                if len(_view_game_cache) > VIEW_GAME_CACHE_SIZE:
+                    _view_game_cache.popitem(last=False)
+        else:
+            _view_game_cache.move_to_end(key)
+
+        head, tail, self.reply_markup = rendered
+        self.text = head + recipient_gift + tail
+        self.render_key = key + (recipient_gift,) if cacheable else (game.uuid, self.text)
+
+    @staticmethod
+    def _render(game: GameSanta, bot_link: str, user_id: int,
+                players_count: int = None) -> tuple[str, str, InlineKeyboardMarkup]:
+        head = "*{title}*\n_{description}_\n\n"
+        template = ("{status}\n"
                     "\U000023F3 Дедлайн {date}\n"
                     "\U0001F451 Инициатор {initiator}\n"
                     "\U0001F385 Зарегистрировано {quantity} игроков \n\n"
                     "*Ссылка\\-приглашение*\n"
                     "{link}")
 
-        for player in game.players:
-            if player.telegram_id == user_id and player.recipient:
-                rec_link = mention_markdown(player.recipient.telegram_id, player.recipient.fullname, 2)
-                recipient_gift = f"\U0001F381 Вы дарите подарок пользователю {rec_link}\n\n"
-                break
-        else:
-            recipient_gift = ""
-
         status = "*Состояние*\n"
         match game.state:
             case GameState.REGISTRATION_OPEN:
@@ -78,17 +109,32 @@ class ViewGameMessage(BaseMessage):
         date = escape_markdown_2(str(game.date_finish))
         initiator = mention_markdown(game.initiator_id, game.initiator_fullname, 2)
         link = escape_markdown_2(f"{bot_link}?start={game.uuid}")
-        quantity = str(len(game.players))
+        players_count = len(game.players) if players_count is None else players_count
+        quantity = str(players_count)
 
-        self.text = template.format(title=title, description=description, recipient_gift=recipient_gift, status=status,
-                                    date=date, initiator=initiator, link=link, quantity=quantity)
-        self.reply_markup = keyboards.ViewGameKeyboard(game, user_id)
+        return (head.format(title=title, description=description),
+                template.format(status=status, date=date, initiator=initiator, link=link, quantity=quantity),
+                keyboards.ViewGameKeyboard(game, user_id, players_count))
 
 
 class MyGamesMessage(BaseMessage):
-    def __init__(self, games: list[GameSanta], user_id: int):
+    def __init__(self, page: GamesPage):
         self.text = "Ваши игры\n\U0001F511 - вы владелец\n\U0001F385 - вы участник"
-        self.reply_markup = keyboards.MyGamesKeyboard(games, user_id)
+        self.reply_markup = keyboards.MyGamesKeyboard(page)
+
+
+class ArchivedGamesMessage(BaseMessage):
+    def __init__(self, games: list[GameSanta], user_id: int):
+        lines = ["Ваши прошедшие игры"]
+        for game in games:
+            title = escape_markdown_2(game.title)
+            date = escape_markdown_2(str(game.date_finish))
+            line = f"\U0001F4E6 {title}, {date}, игроков: {len(game.players)}"
+            player = game.get_player(user_id)
+            if player and player.recipient:
+                line += f", вы дарили {mention_markdown(player.recipient.telegram_id, player.recipient.fullname, 2)}"
+            lines.append(line)
+        self.text = "\n".join(lines)
 
 
 class RequestDescriptionGameMessage(BaseMessage):
@@ -141,23 +187,45 @@ class DescriptionGameChangedMessage(BaseMessage):
 
 
 class EventShufflePlayersGameMessage(BaseMessage):
-    def __init__(self, title: str, player: Player):
-        title = escape_markdown_2(title)
-        recipient = mention_markdown(player.recipient.telegram_id, player.recipient.fullname, 2)
-        rec_username = "@" + player.recipient.username if player.recipient.username else ""
-        self.text = (f"В игре {title} распределены Тайные Санты\\. "
-                     f"Вы дарите подарок пользователю {recipient} ") + rec_username
+    """
+    Шаблон рассылки: {title}, {recipient} и {username} подставляются в repository для каждого игрока
+    """
+
+    def __init__(self):
+        self.text = ("В игре {title} распределены Тайные Санты\\. "
+                     "Вы дарите подарок пользователю {recipient} {username}")
+
+
+class EventDeadlineReminderMessage(BaseMessage):
+    """
+    Шаблон рассылки: {title} и {date} подставляются в repository для каждой игры
+    """
+
+    def __init__(self):
+        self.text = ("Напоминание: подарки в игре {title} вручаются {date}\\. "
+                     "Самое время подготовить свой \U0001F381")
+
+
+class ShuffleImpossibleMessage(BaseMessage):
+    def __init__(self):
+        self.text = "Не получается распределить Тайных Сант, слишком мало игроков"
+
+
+class ShuffleExclusionsImpossibleMessage(BaseMessage):
+    def __init__(self):
+        self.text = "Не получилось не повторить пары прошлой игры, Тайные Санты распределены без этого ограничения"
 
 
 class HelpMessage(BaseMessage):
     def __init__(self):
-        text = (f"Игра Тайный Санта - это анонимный обмен подарками в группе играющих людей\n"
-                f"/create_game - создать новую игру\n"
-                f"/my_games - показать все игры которые вы создали и/или в которых участвуете\n\n"
-                f"\U00002705 Уведомляет игроков: распределены Тайные Санты, изменено описание или дата, удалена игра\n"
-                f"\U000026A0 Выгрузить список игроков может создатель который НЕ участвует в игре\n"
-                f"\U000026A0 Распределить Сант можно только если игроков больше одного\n"
-                f"\U000026D4 Нельзя: менять название, распределять Тайных Сант повторно")
+        text = ("Игра Тайный Санта - это анонимный обмен подарками в группе играющих людей\n"
+                "/create_game - создать новую игру\n"
+                "/my_games - показать все игры которые вы создали и/или в которых участвуете\n"
+                "/archive - показать прошедшие игры, перенесенные в архив\n\n"
+                "\U00002705 Уведомляет игроков: распределены Тайные Санты, изменено описание или дата, удалена игра\n"
+                "\U000026A0 Выгрузить список игроков может создатель который НЕ участвует в игре\n"
+                "\U000026A0 Распределить Сант можно только если игроков больше одного\n"
+                "\U000026D4 Нельзя: менять название, распределять Тайных Сант повторно")
         self.text = escape_markdown_2(text)
 
 
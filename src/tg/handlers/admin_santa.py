@@ -1,11 +1,16 @@
 import logging
+from collections import OrderedDict
 
 from telegram import Update
+from telegram.error import BadRequest
 from telegram.ext import ConversationHandler
 
-from src.core.config import LIMIT_DESCRIPTION_GAME
-from src.domain.model import GameSanta, Player, GameState
+from src.core import config
+from src.core.config import LIMIT_DESCRIPTION_GAME, LIMIT_MY_GAMES_PAGE
+from src.core.exception import ShuffleImpossibleError
+from src.domain.model import GameSanta, Player, JoinStatus, ShuffleStatus
 from src.tg.elements import messages
+from src.tg.elements.base import BaseMessage
 from src.tg.utils.context import CustomContext
 
 from src.tg.utils.tg_calendar import TgCalendarKeyboard
@@ -15,6 +20,10 @@ from src.tg.handlers.common import CreateGameStates
 
 logger = logging.getLogger(__name__)
 
+SHOWN_GAMES_SIZE = 1024
+# (chat_id, message_id) -> render_key of the game shown in the message
+_shown_games: OrderedDict[tuple[int, int], tuple] = OrderedDict()
+
 
 async def start(update: Update, context: CustomContext) -> None:
     msg = messages.StartMessage(update.effective_user.full_name)
@@ -22,41 +31,61 @@ async def start(update: Update, context: CustomContext) -> None:
 
     if len(context.args) == 1:
         game_id = context.args[0]
-        game = await context.db_storage.get(game_id)
+        player = Player.build_from_user(update.effective_user)
+        result = await context.db_storage.join_game(game_id, player)
 
-        if game:
-            if game.check_member(update.effective_user.id):
-                msg = messages.AlreadyJoinedGameMessage(game.title)
+        match result.status:
+            case JoinStatus.ALREADY_JOINED:
+                msg = messages.AlreadyJoinedGameMessage(result.title)
                 await update.effective_chat.send_message(msg.text, msg.parse_mode)
-            elif game.state == GameState.REGISTRATION_OPEN:
-                player = Player.build_from_user(update.effective_user)
-                game.add_player(player)
-                await context.db_storage.save(game)
-                msg = messages.JoinedGameMessage(game.title)
+            case JoinStatus.JOINED:
+                msg = messages.JoinedGameMessage(result.title)
                 await update.effective_chat.send_message(msg.text, msg.parse_mode)
-                await view_game(update, context, game)
-            else:
+                await view_game(update, context, result.game, result.players_count)
+            case JoinStatus.REGISTRATION_CLOSED:
                 msg = messages.RegistrationClosedMessage()
                 await update.effective_chat.send_message(msg.text, msg.parse_mode)
-        else:
-            msg = messages.BadLinkToGameMessage()
-            await update.effective_chat.send_message(msg.text, msg.parse_mode)
+            case _:
+                msg = messages.BadLinkToGameMessage()
+                await update.effective_chat.send_message(msg.text, msg.parse_mode)
 
 
-async def my_games(update: Update, context: CustomContext):
-    games = await context.db_storage.get_list(telegram_id=update.effective_user.id)
+async def my_games(update: Update, context: CustomContext, cursor: str = None, backward: bool = False):
+    page = await context.db_storage.get_summaries(telegram_id=update.effective_user.id, limit=LIMIT_MY_GAMES_PAGE,
+                                                  cursor=cursor, backward=backward)
 
-    if not games:
+    if not page.items:
         msg = messages.GameNotFoundMessage(many=True)
         await update.effective_chat.send_message(msg.text)
         return
 
-    msg = messages.MyGamesMessage(games, update.effective_user.id)
+    msg = messages.MyGamesMessage(page)
     send = update.effective_message.edit_text if update.callback_query else update.effective_chat.send_message
     await send(msg.text, reply_markup=msg.reply_markup)
 
 
-async def view_game(update: Update, context: CustomContext, game: GameSanta = None):
+async def archived_games(update: Update, context: CustomContext):
+    games = await context.db_storage.get_archived(update.effective_user.id)
+
+    if not games:
+        msg = messages.GameNotFoundMessage(many=True)
+        await update.effective_chat.send_message(msg.text)
+        return
+
+    games.sort(key=lambda g: g.date_finish, reverse=True)
+    msg = messages.ArchivedGamesMessage(games[:LIMIT_MY_GAMES_PAGE], update.effective_user.id)
+    await update.effective_chat.send_message(msg.text, msg.parse_mode)
+
+
+async def my_games_next(update: Update, context: CustomContext):
+    await my_games(update, context, cursor=context.game_id)
+
+
+async def my_games_prev(update: Update, context: CustomContext):
+    await my_games(update, context, cursor=context.game_id, backward=True)
+
+
+async def view_game(update: Update, context: CustomContext, game: GameSanta = None, players_count: int = None):
     if not game:
         game = await context.db_storage.get(context.game_id)
 
@@ -65,24 +94,90 @@ async def view_game(update: Update, context: CustomContext, game: GameSanta = No
             await update.callback_query.answer(msg.text)
             return await my_games(update, context)
 
-    msg = messages.ViewGameMessage(game, context.bot.link, update.effective_user.id)
-    send = update.effective_message.edit_text if update.callback_query else update.effective_chat.send_message
-    await send(msg.text, msg.parse_mode, reply_markup=msg.reply_markup)
+    msg = messages.ViewGameMessage(game, context.bot.link, update.effective_user.id, players_count)
+    if update.callback_query:
+        message = update.effective_message
+        shown_key = message.chat_id, message.message_id
+        # the keyboard tells whether another handler has replaced the game in the message since
+        if _shown_games.get(shown_key) == msg.render_key and message.reply_markup == msg.reply_markup:
+            await update.callback_query.answer()
+            return
+        try:
+            message = await message.edit_text(msg.text, msg.parse_mode, reply_markup=msg.reply_markup)
+        except BadRequest as err:
+            if "not modified" not in err.message:
+                raise
+            await update.callback_query.answer()
+    else:
+        message = await update.effective_chat.send_message(msg.text, msg.parse_mode, reply_markup=msg.reply_markup)
+
+    if message is not True:  # edit_text of an inline message returns True
+        shown_key = message.chat_id, message.message_id
+        _shown_games[shown_key] = msg.render_key
+        _shown_games.move_to_end(shown_key)
+        if len(_shown_games) > SHOWN_GAMES_SIZE:
+            _shown_games.popitem(last=False)
 
 
 async def shuffle_players(update: Update, context: CustomContext):
+    event = messages.EventShufflePlayersGameMessage()
+    repeated = False
+    if config.SHUFFLE_AVOID_REPEATS:
+        # pairs of the previous game of the initiator are not repeated when it is possible
+        exclusions = await context.db_storage.get_previous_pairs(context.game_id)
+        if exclusions:
+            if await shuffle_players_excluding(update, context, event, exclusions):
+                return
+            repeated = True
+
+    result = await context.db_storage.shuffle_game(context.game_id, event.text, event.parse_mode)
+
+    match result.status:
+        case ShuffleStatus.SHUFFLED | ShuffleStatus.WRONG_STATE:
+            if repeated and result.status == ShuffleStatus.SHUFFLED:
+                msg = messages.ShuffleExclusionsImpossibleMessage()
+                await update.callback_query.answer(msg.text)
+            await view_game(update, context)
+        case ShuffleStatus.NOT_ENOUGH_PLAYERS:
+            msg = messages.ShuffleImpossibleMessage()
+            await update.callback_query.answer(msg.text)
+        case _:
+            msg = messages.GameNotFoundMessage(many=False)
+            await update.callback_query.answer(msg.text)
+
+
+async def shuffle_players_excluding(update: Update, context: CustomContext, event: BaseMessage,
+                                    exclusions: list[tuple[int, int]]) -> bool:
+    """
+    Распределение с запретами не выражается одним запросом: игра загружается и сохраняется целиком
+
+    :return: False - распределить без запрещенных пар нельзя, игра не изменена
+    """
     game = await context.db_storage.get(context.game_id)
-    if game:
-        game.shuffle()
-        await context.db_storage.save(game)
-        await view_game(update, context, game)
 
-        for player in game.players:
-            msg = messages.EventShufflePlayersGameMessage(game.title, player)
-            context.send_event(msg, [player])
+    if game and len(game.players) < 2 and game.state.state_is_working:
+        msg = messages.ShuffleImpossibleMessage()
+        await update.callback_query.answer(msg.text)
+        return True
+
+    def change(fresh: GameSanta) -> bool:
+        if not fresh.state.state_is_working:
+            return False
+        fresh.shuffle(exclusions)
+        fresh.notify_recipients(event.text, event.parse_mode)
+        return True
+
+    try:
+        game = game and await context.save_game(game, change)
+    except ShuffleImpossibleError:
+        return False
+
+    if game:
+        await view_game(update, context)
     else:
         msg = messages.GameNotFoundMessage(many=False)
         await update.callback_query.answer(msg.text)
+    return True
 
 
 async def request_description(update: Update, context: CustomContext):
@@ -99,11 +194,21 @@ async def request_description(update: Update, context: CustomContext):
 
 
 async def change_description(update: Update, context: CustomContext):
-    context.game.description = update.effective_message.text[:LIMIT_DESCRIPTION_GAME]
-    await context.db_storage.save(context.game)
-    await view_game(update, context, game=context.game)
-    event = messages.DescriptionGameChangedMessage(context.game.title, context.game.description)
-    context.send_event(event, context.game.players)
+    description = update.effective_message.text[:LIMIT_DESCRIPTION_GAME]
+
+    def change(game: GameSanta) -> bool:
+        game.description = description
+        event = messages.DescriptionGameChangedMessage(game.title, description)
+        context.send_event(game, event, game.players)
+        return True
+
+    game = await context.save_game(context.game, change)
+    del context.game
+    if game:
+        await view_game(update, context, game=game)
+    else:
+        msg = messages.GameNotFoundMessage(many=False)
+        await update.effective_chat.send_message(msg.text)
     return ConversationHandler.END
 
 
@@ -116,8 +221,17 @@ async def proxy_view_game(update: Update, context: CustomContext):
 async def change_registration(update: Update, context: CustomContext):
     game = await context.db_storage.get(context.game_id)
     if game:
-        game.change_registration()
-        await context.db_storage.save(game)
+        seen_state = game.state
+
+        def change(fresh: GameSanta) -> bool:
+            # joins are retried, a state switched by someone else is shown instead of switching it back
+            if fresh.state != seen_state:
+                return False
+            fresh.change_registration()
+            return True
+
+        game = await context.save_game(game, change)
+    if game:
         await view_game(update, context, game)
     else:
         msg = messages.GameNotFoundMessage(many=False)
@@ -142,18 +256,20 @@ async def request_date(update: Update, context: CustomContext):
 async def delete_game(update: Update, context: CustomContext):
     game = await context.db_storage.get(context.game_id)
     if game:
+        msg_player = messages.DeleteGamePlayerMessage(game.title, game.initiator_id, game.initiator_fullname)
+        context.send_event(game, msg_player, game.players)
         await context.db_storage.delete(game)
         msg_initiator = messages.DeleteGameInitiatorMessage(game.title)
         await update.callback_query.edit_message_text(msg_initiator.text)
-        msg_player = messages.DeleteGamePlayerMessage(game.title, game.initiator_id, game.initiator_fullname)
-        context.send_event(msg_player, game.players)
     else:
         msg = messages.GameNotFoundMessage(many=False)
         await update.callback_query.answer(msg.text)
 
 
 async def get_list_players(update: Update, context: CustomContext):
-    bytes_io = await context.db_storage.get_players_csv(context.game_id)
-    if bytes_io:
-        await update.effective_chat.send_document(bytes_io, filename="players.csv")
+    csv_file = await context.db_storage.get_players_csv(context.game_id)
+    if csv_file:
+        with csv_file:
+            # the spooled buffer has no file name until it moves to disk, PTB reads the file whole anyway
+            await update.effective_chat.send_document(csv_file.read(), filename="players.csv")
     await update.callback_query.answer()
@@ -46,5 +46,11 @@ async def unknown_callback(update: Update, *args):
     return ConversationHandler.END
 
 
+async def cancel_dialog(update: Update, context: CustomContext):
+    """Неизвестная кнопка посреди диалога: диалог завершается вместе с черновиком игры"""
+    del context.game
+    return await unknown_callback(update, context)
+
+
 async def ignore_callback(update: Update, *args):
     await update.callback_query.answer()
@@ -49,12 +49,18 @@ async def handle_calendar(update: Update, context: CustomContext):
     changed = tg_calendar.handle(update.callback_query.data)
     if changed:
         if tg_calendar.selected_date:
-            context.game.date_finish = tg_calendar.selected_date
-            await context.db_storage.save(context.game)
+            def change(game: GameSanta) -> bool:
+                game.date_finish = tg_calendar.selected_date
+                event = messages.DateGameChangedMessage(game.title, game.date_finish)
+                context.send_event(game, event, game.players)
+                return True
 
-            await view_game(update, context, game=context.game)
-            event = messages.DateGameChangedMessage(context.game.title, context.game.date_finish)
-            context.send_event(event, context.game.players)
+            game = await context.save_game(context.game, change)
             del context.game
+            if game:
+                await view_game(update, context, game=game)
+            else:
+                msg = messages.GameNotFoundMessage(many=False)
+                await update.effective_chat.send_message(msg.text)
             return ConversationHandler.END
         await update.callback_query.message.edit_reply_markup(tg_calendar.keyboard)
@@ -1,4 +1,5 @@
 import warnings
+from itertools import chain
 
 from telegram import BotCommand
 from telegram.ext import (ConversationHandler,
@@ -10,23 +11,25 @@ from telegram.ext import (ConversationHandler,
                           Application)
 from telegram.warnings import PTBUserWarning
 
+from src import metrics
 from src.tg.elements.data import CallbackData
 from src.tg.elements.data import CommandData
 from src.tg.handlers.common import timeout_handle, ignore_callback
 from src.tg.handlers.common import help_command
-from src.tg.handlers.common import unknown_callback
+from src.tg.handlers.common import unknown_callback, cancel_dialog
 from src.tg.handlers.create_santa import CreateGameStates, change_title
 from src.tg.handlers.create_santa import request_title
 from src.tg.handlers.create_santa import handle_calendar
 from src.tg.handlers import create_santa, admin_santa
+from src.tg.utils.callback_router import CallbackRouter, CallbackActionHandler
 from src.tg.utils.tg_calendar import CallbackBuilder
 
 
-def build_handlers() -> list[BaseHandler]:
-    unknown_handlers = [CallbackQueryHandler(unknown_callback, pattern=CallbackData.UNKNOWN.regex)]
+def build_handlers(persistent: bool = False) -> list[BaseHandler]:
+    unknown_handlers = [CallbackQueryHandler(cancel_dialog)]
     timeout_handlers = [CallbackQueryHandler(timeout_handle), MessageHandler(filters.ALL, timeout_handle)]
-    calendar_handler = CallbackQueryHandler(handle_calendar, CallbackBuilder.base_cb)
-    proxy_view_game = CallbackQueryHandler(admin_santa.proxy_view_game, pattern=CallbackData.VIEW_GAME.regex)
+    calendar_handler = CallbackQueryHandler(handle_calendar, CallbackBuilder.match)
+    proxy_view_game = CallbackActionHandler(admin_santa.proxy_view_game, CallbackData.VIEW_GAME)
 
     with warnings.catch_warnings():
         # PTBUserWarning: If 'per_message=False', 'CallbackQueryHandler' will not be tracked for every message.
@@ -44,19 +47,22 @@ def build_handlers() -> list[BaseHandler]:
             },
             fallbacks=unknown_handlers,
             conversation_timeout=300,
-            per_message=False
+            per_message=False,
+            name="create_game",
+            persistent=persistent
         )
 
         request_description_handler = ConversationHandler(
-            entry_points=[CallbackQueryHandler(admin_santa.request_description,
-                                               pattern=CallbackData.CHANGE_DESCRIPTION.regex)],
+            entry_points=[CallbackActionHandler(admin_santa.request_description, CallbackData.CHANGE_DESCRIPTION)],
             states={
                 CreateGameStates.DESCRIPTION: [MessageHandler(filters.TEXT, admin_santa.change_description)],
                 ConversationHandler.TIMEOUT: timeout_handlers
             },
             fallbacks=[proxy_view_game, *unknown_handlers],
             conversation_timeout=300,
-            per_message=False
+            per_message=False,
+            name="change_description",
+            persistent=persistent
         )
 
     handlers = [
@@ -65,23 +71,30 @@ def build_handlers() -> list[BaseHandler]:
         create_game_handler,
         request_description_handler,
         ConversationHandler(
-            entry_points=[CallbackQueryHandler(admin_santa.request_date, CallbackData.CHANGE_DATE.regex)],
+            entry_points=[CallbackActionHandler(admin_santa.request_date, CallbackData.CHANGE_DATE)],
             states={
                 CreateGameStates.CALENDAR: [calendar_handler]
             },
             fallbacks=[proxy_view_game, *unknown_handlers],
             conversation_timeout=300,
-            per_message=True
+            per_message=True,
+            name="change_date",
+            persistent=persistent
         ),
         CommandHandler(CommandData.MY_GAMES, callback=admin_santa.my_games),
-        CallbackQueryHandler(admin_santa.my_games, pattern=CallbackData.MY_GAMES.regex),
-        CallbackQueryHandler(admin_santa.view_game, pattern=CallbackData.VIEW_GAME.regex),
-        CallbackQueryHandler(admin_santa.shuffle_players, pattern=CallbackData.SHUFFLE_PLAYERS.regex),
-        CallbackQueryHandler(admin_santa.change_registration, pattern=CallbackData.CHANGE_REGISTRATION.regex),
-        CallbackQueryHandler(admin_santa.delete_game, pattern=CallbackData.DELETE_GAME.regex),
-        CallbackQueryHandler(admin_santa.get_list_players, pattern=CallbackData.UPLOAD_LIST_PLAYERS.regex),
-        CallbackQueryHandler(ignore_callback, pattern=CallbackData.IGNORE.regex),
-        *unknown_handlers
+        CommandHandler(CommandData.ARCHIVE, callback=admin_santa.archived_games),
+        # callbacks outside the dialogs, CHANGE_DESCRIPTION and CHANGE_DATE start the dialogs above
+        CallbackRouter({
+            CallbackData.MY_GAMES: admin_santa.my_games,
+            CallbackData.MY_GAMES_NEXT: admin_santa.my_games_next,
+            CallbackData.MY_GAMES_PREV: admin_santa.my_games_prev,
+            CallbackData.VIEW_GAME: admin_santa.view_game,
+            CallbackData.SHUFFLE_PLAYERS: admin_santa.shuffle_players,
+            CallbackData.CHANGE_REGISTRATION: admin_santa.change_registration,
+            CallbackData.DELETE_GAME: admin_santa.delete_game,
+            CallbackData.UPLOAD_LIST_PLAYERS: admin_santa.get_list_players,
+            CallbackData.IGNORE: ignore_callback,
+        }, fallback=unknown_callback)
     ]
     return handlers
 
@@ -92,13 +105,43 @@ def build_commands() -> list[BotCommand]:
         BotCommand(CommandData.HELP, CommandData.HELP.description),
         BotCommand(CommandData.CREATE_GAME, CommandData.CREATE_GAME.description),
         BotCommand(CommandData.MY_GAMES, CommandData.MY_GAMES.description),
+        BotCommand(CommandData.ARCHIVE, CommandData.ARCHIVE.description),
     ]
     return commands
 
 
+def _handler_label(handler: BaseHandler) -> str:
+    if isinstance(handler, CommandHandler):
+        return "/" + min(handler.commands)
+    if isinstance(handler, CallbackActionHandler):
+        return handler.action.name
+    return handler.callback.__name__
+
+
+def instrument_handlers(handlers: list[BaseHandler], seen: set[int] = None):
+    """Оборачивает callback каждого обработчика замером времени, в том числе внутри ConversationHandler"""
+    seen = set() if seen is None else seen
+    for handler in handlers:
+        if id(handler) in seen:
+            continue  # the same handler is used in several conversations
+        seen.add(id(handler))
+        if isinstance(handler, CallbackRouter):
+            handler.routes = {action: metrics.timed_handler(callback, action.name)
+                              for action, callback in handler.routes.items()}
+            if handler.fallback is not None:
+                handler.fallback = metrics.timed_handler(handler.fallback, CallbackData.UNKNOWN.name)
+        elif isinstance(handler, ConversationHandler):
+            nested = chain(handler.entry_points, chain.from_iterable(handler.states.values()), handler.fallbacks)
+            instrument_handlers(list(nested), seen)
+        else:
+            handler.callback = metrics.timed_handler(handler.callback, _handler_label(handler))
+
+
 async def setup(app: Application):
-    handlers = build_handlers()
+    handlers = build_handlers(persistent=app.persistence is not None)
     commands = build_commands()
+    if metrics.enabled:
+        instrument_handlers(handlers)
 
     app.add_handlers(handlers)
     await app.bot.set_my_commands(commands)
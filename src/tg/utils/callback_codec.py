@@ -0,0 +1,91 @@
+"""
+Компактный формат callback_data (лимит Telegram - 64 байта):
+
+    <версия><код действия><base64url полезной нагрузки без '='>
+
+Нагрузка - uuid по 16 байт и целые числа в varint, порядок и типы полей знает действие.
+Старые кнопки начинаются с буквы (view_game=..., calendar/...), версия - цифра, поэтому
+старые callback_data в уже отправленных сообщениях отличаются от новых по первому символу
+"""
+
+import base64
+from uuid import UUID
+
+VERSION = "1"
+
+
+def is_compact(callback_data: str) -> bool:
+    return callback_data[:1] == VERSION
+
+
+def encode(code: str, *fields: str | int) -> str:
+    """
+    :param code: один символ, уникальный среди всех действий
+    :param fields: str - uuid, int - неотрицательное число
+    """
+    assert len(code) == 1, "The action code is one symbol"
+    payload = bytearray()
+    for field in fields:
+        if isinstance(field, int):
+            _write_varint(payload, field)
+        else:
+            payload += UUID(field).bytes
+    return VERSION + code + base64.urlsafe_b64encode(payload).rstrip(b"=").decode()
+
+
+def _write_varint(payload: bytearray, value: int):
+    if value < 0:
+        raise ValueError(f"Отрицательное число в callback_data <{value}>")
+    while value > 0x7F:
+        payload.append(value & 0x7F | 0x80)
+        value >>= 7
+    payload.append(value)
+
+
+class Payload:
+    """Чтение полей нагрузки в том же порядке, в котором они записаны в encode"""
+
+    __slots__ = ("code", "_data", "_offset")
+
+    def __init__(self, code: str, data: bytes):
+        self.code = code
+        self._data = data
+        self._offset = 0
+
+    @property
+    def exhausted(self) -> bool:
+        return self._offset == len(self._data)
+
+    def uuid(self) -> str:
+        end = self._offset + 16
+        if end > len(self._data):
+            raise ValueError("callback_data is too short for uuid")
+        value = UUID(bytes=self._data[self._offset:end])
+        self._offset = end
+        return str(value)
+
+    def int(self) -> int:
+        value, shift = 0, 0
+        while True:
+            if self._offset == len(self._data):
+                raise ValueError("callback_data is too short for int")
+            byte = self._data[self._offset]
+            self._offset += 1
+            value |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                return value
+            shift += 7
+
+
+def decode(callback_data: str) -> Payload:
+    """
+    :raise ValueError: не компактный формат или поврежденная нагрузка
+    """
+    if not is_compact(callback_data) or len(callback_data) < 2:
+        raise ValueError(f"Неизвестный формат callback_data <{callback_data}>")
+    raw = callback_data[2:]
+    try:
+        data = base64.urlsafe_b64decode(raw + "=" * (-len(raw) % 4))
+    except ValueError as err:
+        raise ValueError(f"Поврежденная callback_data <{callback_data}>") from err
+    return Payload(callback_data[1], data)
@@ -0,0 +1,73 @@
+from typing import Awaitable, Callable
+
+from telegram import Update
+from telegram.ext import Application, BaseHandler
+
+from src.tg.elements.buttons import CallbackGame
+from src.tg.elements.data import CallbackData
+from src.tg.utils.context import CustomContext
+
+HandlerCallback = Callable[[Update, CustomContext], Awaitable]
+
+
+class CallbackRouter(BaseHandler[Update, CustomContext]):
+    """
+    Один обработчик callback_query вместо цепочки CallbackQueryHandler с регулярными выражениями:
+    callback_data разбирается один раз, обработчик действия ищется в словаре,
+    разобранный CallbackGame доступен в context.callback_game
+    """
+
+    __slots__ = ("routes", "fallback")
+
+    def __init__(self, routes: dict[CallbackData, HandlerCallback], fallback: HandlerCallback = None):
+        super().__init__(self._not_routed)
+        self.routes = dict(routes)
+        self.fallback = fallback
+
+    @staticmethod
+    async def _not_routed(update: Update, context: CustomContext):
+        raise RuntimeError("CallbackRouter calls the callback of the action")
+
+    def check_update(self, update: object) -> tuple[HandlerCallback, CallbackGame | None] | None:
+        if not isinstance(update, Update) or update.callback_query is None:
+            return None
+        data = update.callback_query.data
+        callback_game = CallbackGame.from_callback_data(data) if isinstance(data, str) else None
+
+        callback = self.routes.get(callback_game.callback) if callback_game else None
+        if callback is not None:
+            return callback, callback_game
+        if self.fallback is not None:
+            return self.fallback, None
+        return None
+
+    async def handle_update(self, update: Update, application: Application,
+                            check_result: tuple[HandlerCallback, CallbackGame | None], context: CustomContext):
+        callback, context.callback_game = check_result
+        return await callback(update, context)
+
+
+class CallbackActionHandler(BaseHandler[Update, CustomContext]):
+    """
+    Обработчик одного действия для точек входа и fallbacks ConversationHandler,
+    которые должны сами проверять callback_query
+    """
+
+    __slots__ = ("action",)
+
+    def __init__(self, callback: HandlerCallback, action: CallbackData):
+        super().__init__(callback)
+        self.action = action
+
+    def check_update(self, update: object) -> CallbackGame | None:
+        if not isinstance(update, Update) or update.callback_query is None:
+            return None
+        data = update.callback_query.data
+        callback_game = CallbackGame.from_callback_data(data) if isinstance(data, str) else None
+        if callback_game is not None and callback_game.callback is self.action:
+            return callback_game
+        return None
+
+    def collect_additional_context(self, context: CustomContext, update: Update, application: Application,
+                                   check_result: CallbackGame):
+        context.callback_game = check_result
@@ -1,14 +1,22 @@
-import asyncio
 import logging
+from typing import Callable
 
-from telegram.constants import ParseMode
 from telegram.ext import CallbackContext, ExtBot
 
+from src import metrics
+from src.core.exception import StaleGameError
 from src.domain.model import GameSanta, Player
-from src.repository import AbstractRepository, Repository, RepositoryMemory
+from src.repository import AbstractRepository, Repository, RepositoryMemory, RepositoryCache, RepositoryMetrics
 from src.tg.elements.base import BaseMessage
+from src.tg.elements.buttons import CallbackGame
 
 KEY_STORAGE = "game"
+SAVE_ATTEMPTS = 3  # the game is re-read and the change applied again after a concurrent change
+
+
+def _with_metrics(repository: AbstractRepository) -> AbstractRepository:
+    return RepositoryMetrics(repository) if metrics.enabled else repository
+
 
 logger = logging.getLogger(__name__)
 
@@ -16,7 +24,9 @@ logger = logging.getLogger(__name__)
 class CustomContext(CallbackContext[ExtBot, dict, dict, dict]):
     """Custom class for context."""
 
-    db_storage: AbstractRepository = Repository()
+    db_storage: AbstractRepository = _with_metrics(RepositoryCache(Repository()))
+    # set by CallbackRouter
+    callback_game: CallbackGame | None = None
 
     @property
     def game(self) -> GameSanta:
@@ -32,18 +42,39 @@ class CustomContext(CallbackContext[ExtBot, dict, dict, dict]):
 
     @property
     def game_id(self):
-        return self.match.group(1)
+        return self.callback_game.game_id
 
-    def send_event(self, event: BaseMessage, players: list[Player]):
-        async def async_send_event(user_id: int, text: str, parse_mode: ParseMode):
-            try:
-                await self.bot.send_message(user_id, text, parse_mode)
-            except Exception as err:
-                logger.warning(f"Не удалось отправить сообщение ({text}) пользователю {user_id}: {err}", exc_info=True)
+    @staticmethod
+    def send_event(game: GameSanta, event: BaseMessage, players: list[Player]):
+        """
+        Ставит уведомление в outbox игры: оно запишется вместе с игрой при save/delete
+        и будет отправлено в фоне OutboxDispatcher
+        """
+        game.notify(players, event.text, event.parse_mode)
+        metrics.NOTIFICATIONS_STAGED.inc(amount=len(players))
+
+    async def save_game(self, game: GameSanta, change: Callable[[GameSanta], bool]) -> GameSanta | None:
+        """
+        Применяет change к игре и сохраняет ее. Если игру успели изменить, она перечитывается
+        и change применяется к свежей версии, не больше SAVE_ATTEMPTS раз.
+        change возвращает False, если на свежей версии изменение уже не нужно, тогда игра не сохраняется
 
-        for player in players:
-            asyncio.create_task(async_send_event(player.telegram_id, event.text, event.parse_mode))
+        :return: сохраненная или актуальная игра, None - игра удалена
+        :raise StaleGameError: игру меняли на каждой попытке
+        """
+        for attempt in range(1, SAVE_ATTEMPTS + 1):
+            if not change(game):
+                return game
+            try:
+                return await self.db_storage.save(game)
+            except StaleGameError as err:
+                if attempt == SAVE_ATTEMPTS:
+                    raise
+                logger.info(f"Game {err.game_uuid} has been changed concurrently, attempt {attempt + 1}")
+                game = await self.db_storage.get(game.uuid)
+                if game is None:
+                    return None
 
 
 class MemoryCustomContext(CustomContext):
-    db_storage: AbstractRepository = RepositoryMemory()
+    db_storage: AbstractRepository = _with_metrics(RepositoryMemory())
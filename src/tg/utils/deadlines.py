@@ -0,0 +1,69 @@
+import datetime
+import logging
+
+from telegram.ext import CallbackContext, JobQueue
+
+from src.core import config
+from src.repository import AbstractRepository
+from src.tg.elements import messages
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineScheduler:
+    """
+    Раз в interval секунд проходит по играм с наступившим или близким дедлайном пачками по batch_size:
+    закрывает регистрацию (с auto_shuffle - сразу распределяет Сант) и за remind_days дней ставит
+    напоминания игрокам в outbox. Каждая пачка - отдельная транзакция под advisory lock, обработанные игры
+    выпадают из выборки, поэтому повторный проход после рестарта или на другой реплике ничего не дублирует
+    """
+
+    def __init__(self, repository: AbstractRepository,
+                 interval: float = config.DEADLINE_SWEEP_INTERVAL,
+                 batch_size: int = config.DEADLINE_BATCH_SIZE,
+                 remind_days: int = config.DEADLINE_REMIND_DAYS,
+                 auto_shuffle: bool = config.DEADLINE_AUTO_SHUFFLE):
+        self.repository = repository
+        self.interval = interval
+        self.batch_size = batch_size
+        self.remind_days = remind_days
+        self.auto_shuffle = auto_shuffle
+        self.stats = {"closed": 0, "reminded": 0}
+
+    def start(self, job_queue: JobQueue):
+        job_queue.run_repeating(self._run, self.interval, first=0, name="deadlines")
+
+    async def _run(self, context: CallbackContext):
+        try:
+            await self.sweep()
+        except Exception as err:
+            # the next pass continues from the games left unprocessed
+            logger.error(f"Ошибка обработки дедлайнов игр: {err}", exc_info=True)
+
+    async def sweep(self, today: datetime.date = None):
+        today = today or datetime.date.today()
+
+        shuffle = messages.EventShufflePlayersGameMessage() if self.auto_shuffle else None
+        closed = 0
+        while True:
+            batch = await self.repository.close_due_games(today, self.batch_size,
+                                                          shuffle and shuffle.text, shuffle and shuffle.parse_mode)
+            closed += len(batch)
+            if len(batch) < self.batch_size:
+                break
+
+        reminded = 0
+        if self.remind_days > 0:
+            reminder = messages.EventDeadlineReminderMessage()
+            until = today + datetime.timedelta(days=self.remind_days)
+            while True:
+                count = await self.repository.queue_reminders(today, until, self.batch_size, reminder.text,
+                                                              reminder.parse_mode)
+                reminded += count
+                if count < self.batch_size:
+                    break
+
+        self.stats["closed"] += closed
+        self.stats["reminded"] += reminded
+        if closed or reminded:
+            logger.info(f"Deadlines: registration closed in {closed} games, {reminded} games reminded")
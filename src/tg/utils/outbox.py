@@ -0,0 +1,154 @@
+import asyncio
+import datetime
+import logging
+import time
+
+from telegram import Bot
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+
+from src import metrics
+from src.core import config
+from src.domain.model import Notification, NotificationStatus
+from src.repository import AbstractRepository
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Ограничитель частоты: rate токенов в секунду, не больше capacity подряд
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        """Telegram вернул flood control - не выдаем токены указанное время"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class OutboxDispatcher:
+    """
+    Фоновая отправка уведомлений из outbox с ограничением частоты: общий token bucket на бота
+    и не чаще одного сообщения в chat_interval секунд в один чат
+    """
+
+    def __init__(self, bot: Bot, repository: AbstractRepository,
+                 rate: float = config.NOTIFY_RATE,
+                 chat_interval: float = config.NOTIFY_CHAT_INTERVAL,
+                 max_attempts: int = config.NOTIFY_MAX_ATTEMPTS,
+                 poll_interval: float = config.NOTIFY_POLL_INTERVAL):
+        self.bot = bot
+        self.repository = repository
+        self.bucket = TokenBucket(rate)
+        self.chat_interval = chat_interval
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        # a batch is sent in about two seconds, the lease protects it from other replicas meanwhile
+        self.batch_size = max(1, int(rate * 2))
+        self.lease = 60 + self.batch_size * chat_interval
+
+        self.stats = {"sent": 0, "retried": 0, "failed": 0, "in_flight": 0}
+        self._chat_next: dict[int, float] = {}
+        self._task: asyncio.Task | None = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            task, self._task = self._task, None
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while True:
+            try:
+                batch = await self.repository.claim_notifications(self.batch_size, self.lease)
+                metrics.OUTBOX_BATCH.observe("", len(batch))
+                if not batch:
+                    await asyncio.sleep(self.poll_interval)
+                    continue
+
+                self.stats["in_flight"] = len(batch)
+                await asyncio.gather(*(self._send(n) for n in batch))
+                await self.repository.update_notifications(batch)
+                self.stats["in_flight"] = 0
+                self._forget_idle_chats()
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                # unsaved results are retried after the lease expires
+                logger.error(f"Ошибка отправки уведомлений из outbox: {err}", exc_info=True)
+                await asyncio.sleep(self.poll_interval)
+
+    async def _wait_chat(self, chat_id: int):
+        now = time.monotonic()
+        slot = max(now, self._chat_next.get(chat_id, now))
+        self._chat_next[chat_id] = slot + self.chat_interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def _forget_idle_chats(self):
+        now = time.monotonic()
+        self._chat_next = {chat_id: slot for chat_id, slot in self._chat_next.items() if slot > now}
+
+    def _retry(self, notification: Notification, delay: float, error: str):
+        if notification.attempts >= self.max_attempts:
+            self._fail(notification, error)
+            return
+        notification.send_after = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=delay)
+        notification.error = error
+        self.stats["retried"] += 1
+
+    def _fail(self, notification: Notification, error: str):
+        notification.status = NotificationStatus.FAILED
+        notification.error = error
+        self.stats["failed"] += 1
+        logger.warning(f"Не удалось отправить сообщение ({notification.text}) "
+                       f"пользователю {notification.chat_id}: {error}")
+
+    async def _send(self, notification: Notification):
+        await self._wait_chat(notification.chat_id)
+        await self.bucket.acquire()
+        try:
+            await self.bot.send_message(notification.chat_id, notification.text, notification.parse_mode)
+        except RetryAfter as err:
+            metrics.TELEGRAM_ERRORS.inc(type(err).__name__)
+            self.bucket.pause(err.retry_after)
+            self._retry(notification, err.retry_after, str(err))
+        except (Forbidden, BadRequest) as err:
+            # the user blocked the bot or the message is invalid, retrying will not help
+            metrics.TELEGRAM_ERRORS.inc(type(err).__name__)
+            self._fail(notification, str(err))
+        except TelegramError as err:
+            metrics.TELEGRAM_ERRORS.inc(type(err).__name__)
+            self._retry(notification, 2 ** notification.attempts, str(err))
+        else:
+            notification.status = NotificationStatus.SENT
+            notification.error = None
+            self.stats["sent"] += 1
@@ -0,0 +1,250 @@
+import asyncio
+import datetime
+import json
+import logging
+from enum import Enum
+from typing import Any
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from src import db
+from src.domain.model import GameSanta, GameState
+from src.repository import AbstractRepository
+from src.tg.utils.context import KEY_STORAGE
+
+logger = logging.getLogger(__name__)
+
+
+class PostgresPersistence(BasePersistence[dict, dict, dict]):
+    """
+    Хранит состояния ConversationHandler и user_data в Postgres, чтобы рестарт не обрывал диалоги.
+
+    Вместо pickle объектов GameSanta пишется компактный черновик: для новой игры - заполненные поля,
+    для сохраненной - только uuid, при старте игры всех диалогов загружаются из репозитория одним запросом.
+    Application вызывает update_* раз в update_interval секунд, изменения копятся и пишутся одним
+    запросом на таблицу, неизменившиеся user_data пропускаются
+    """
+
+    def __init__(self, repository: AbstractRepository, states: type[Enum], update_interval: float):
+        super().__init__(store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True,
+                                                     callback_data=False),
+                         update_interval=update_interval)
+        self.repository = repository
+        self.states = states
+
+        # None - delete the row
+        self._dirty_user_data: dict[int, str | None] = {}
+        self._dirty_conversations: dict[tuple[str, str], str | None] = {}
+        self._written_user_data: dict[int, str] = {}
+        self._write_task: asyncio.Task | None = None
+
+    # user_data
+
+    async def get_user_data(self) -> dict[int, dict]:
+        async with db.connection() as conn:
+            rows = await conn.fetch("SELECT user_id, data FROM bot_user_data")
+
+        user_data = {}
+        for row in rows:
+            data = json.loads(row["data"])
+            self._written_user_data[row["user_id"]] = _dumps(data)
+            user_data[row["user_id"]] = data
+
+        # the saved games of all dialogs are loaded by one query
+        drafts = [data[KEY_STORAGE] for data in user_data.values() if KEY_STORAGE in data]
+        games = await self.repository.get_many({d["uuid"] for d in drafts if "uuid" in d}) if drafts else {}
+        for data in user_data.values():
+            self._decode_user_data(data, games)
+        return user_data
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        if not data:
+            # the dialog is over, an empty row is not needed
+            return await self.drop_user_data(user_id)
+
+        encoded = self._encode_user_data(data)
+        if encoded == self._written_user_data.get(user_id):
+            self._dirty_user_data.pop(user_id, None)
+            return
+        self._dirty_user_data[user_id] = encoded
+        self._schedule_write()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        writing = self._write_task is not None and not self._write_task.done()
+        if user_id not in self._written_user_data and not writing:
+            self._dirty_user_data.pop(user_id, None)
+            return
+        self._dirty_user_data[user_id] = None
+        self._schedule_write()
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    # conversations
+
+    async def get_conversations(self, name: str) -> dict[tuple[int, ...], object]:
+        async with db.connection() as conn:
+            rows = await conn.fetch("SELECT key, state FROM bot_conversations WHERE name = $1", name)
+
+        conversations = {}
+        for row in rows:
+            try:
+                conversations[tuple(json.loads(row["key"]))] = self.states[row["state"]]
+            except KeyError:
+                logger.warning(f"Неизвестное состояние диалога {name}: {row['state']}, диалог сброшен")
+        return conversations
+
+    async def update_conversation(self, name: str, key: tuple[int, ...], new_state: object | None) -> None:
+        state = new_state.name if isinstance(new_state, self.states) else None
+        self._dirty_conversations[name, json.dumps(key)] = state
+        self._schedule_write()
+
+    # bot_data, chat_data and callback_data are not stored
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def get_chat_data(self) -> dict[int, dict]:
+        return {}
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def flush(self) -> None:
+        if self._write_task is not None:
+            await self._write_task
+        await self._write()
+
+    # batched write
+
+    def _schedule_write(self):
+        # Application calls update_* for all changed keys at once, so they are collected into one write
+        if self._write_task is None or self._write_task.done():
+            self._write_task = asyncio.create_task(self._write_later())
+
+    async def _write_later(self):
+        await asyncio.sleep(0)
+        try:
+            await self._write()
+        except Exception as err:
+            logger.error(f"Ошибка записи состояния бота: {err}", exc_info=True)
+
+    async def _write(self):
+        user_data, self._dirty_user_data = self._dirty_user_data, {}
+        conversations, self._dirty_conversations = self._dirty_conversations, {}
+        if not user_data and not conversations:
+            return
+
+        upsert_users = [(user_id, data) for user_id, data in user_data.items() if data is not None]
+        drop_users = [user_id for user_id, data in user_data.items() if data is None]
+        upsert_conversations = [(*key, state) for key, state in conversations.items() if state is not None]
+        drop_conversations = [key for key, state in conversations.items() if state is None]
+        try:
+            async with db.connection() as conn, conn.transaction():
+                if upsert_users:
+                    await conn.execute("""
+                        INSERT INTO bot_user_data (user_id, data)
+                        SELECT * FROM unnest($1::bigint[], $2::jsonb[])
+                        ON CONFLICT (user_id) DO UPDATE SET data = EXCLUDED.data, updated_at = now()
+                    """, *zip(*upsert_users))
+                if drop_users:
+                    await conn.execute("DELETE FROM bot_user_data WHERE user_id = ANY($1::bigint[])", drop_users)
+                if upsert_conversations:
+                    await conn.execute("""
+                        INSERT INTO bot_conversations (name, key, state)
+                        SELECT * FROM unnest($1::varchar[], $2::text[], $3::varchar[])
+                        ON CONFLICT (name, key) DO UPDATE SET state = EXCLUDED.state, updated_at = now()
+                    """, *zip(*upsert_conversations))
+                if drop_conversations:
+                    await conn.execute("""
+                        DELETE FROM bot_conversations c
+                        USING unnest($1::varchar[], $2::text[]) AS d(name, key)
+                        WHERE c.name = d.name AND c.key = d.key
+                    """, *zip(*drop_conversations))
+        except Exception:
+            # newer changes staged during the write win
+            self._dirty_user_data = user_data | self._dirty_user_data
+            self._dirty_conversations = conversations | self._dirty_conversations
+            raise
+
+        for user_id, data in user_data.items():
+            if data is None:
+                self._written_user_data.pop(user_id, None)
+            else:
+                self._written_user_data[user_id] = data
+
+    # draft codec
+
+    @staticmethod
+    def _encode_user_data(data: dict) -> str:
+        compact = {}
+        for key, value in data.items():
+            if key == KEY_STORAGE:
+                compact[key] = _encode_game(value)
+            else:
+                compact[key] = value
+        return _dumps(compact)
+
+    @staticmethod
+    def _decode_user_data(data: dict, games: dict[str, GameSanta]) -> dict:
+        if KEY_STORAGE in data:
+            game = _decode_game(data.pop(KEY_STORAGE), games)
+            if game is not None:
+                data[KEY_STORAGE] = game
+        return data
+
+
+def _dumps(data: dict) -> str:
+    return json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+
+def _encode_game(game: GameSanta) -> dict[str, Any]:
+    if game.uuid:
+        # the handlers change a saved game only at the last step of the dialog
+        return {"uuid": game.uuid}
+    return {
+        "state": game.state.value,
+        "initiator_id": game.initiator_id,
+        "initiator_fullname": game.initiator_fullname,
+        "title": game.title,
+        "description": game.description,
+        "date_finish": game.date_finish.isoformat() if game.date_finish else None,
+        "changed": sorted(game.meta.changed_fields),
+    }
+
+
+def _decode_game(draft: dict[str, Any], games: dict[str, GameSanta]) -> GameSanta | None:
+    if "uuid" in draft:
+        return games.get(draft["uuid"])
+
+    date_finish = draft["date_finish"]
+    game = GameSanta(
+        uuid=None,
+        state=GameState(draft["state"]),
+        players=[],
+        initiator_id=draft["initiator_id"],
+        initiator_fullname=draft["initiator_fullname"],
+        title=draft["title"],
+        description=draft["description"],
+        date_finish=datetime.date.fromisoformat(date_finish) if date_finish else None
+    )
+    game.meta.changed_fields.update(draft["changed"])
+    return game
@@ -0,0 +1,111 @@
+import asyncio
+import datetime
+import logging
+from typing import Awaitable, Callable
+
+from telegram.ext import CallbackContext, JobQueue
+
+from src.core import config
+from src.repository import AbstractRepository
+
+logger = logging.getLogger(__name__)
+
+BATCH_PAUSE = 0.5  # seconds between batches, the handlers get the connections and rows meanwhile
+
+
+async def _in_batches(batch: Callable[[int], Awaitable[int]], batch_size: int, stats: dict) -> int:
+    """Вызывает batch(batch_size), пока он обрабатывает полную пачку, и возвращает общее количество"""
+    total = 0
+    stats["running"] = 1
+    try:
+        while True:
+            count = await batch(batch_size)
+            total += count
+            stats["batches"] += 1
+            if count < batch_size:
+                break
+            await asyncio.sleep(BATCH_PAUSE)
+    finally:
+        stats["running"] = 0
+    return total
+
+
+class GameArchiver:
+    """
+    Раз в interval секунд переносит в архив игры, дедлайн которых прошел больше ttl_days дней назад:
+    завершенные и брошенные. Игры переносятся короткими транзакциями по batch_size,
+    занятые обработчиками строки пропускаются до следующего прохода
+    """
+
+    def __init__(self, repository: AbstractRepository,
+                 ttl_days: int = config.ARCHIVE_TTL_DAYS,
+                 interval: float = config.ARCHIVE_INTERVAL,
+                 batch_size: int = config.ARCHIVE_BATCH_SIZE):
+        self.repository = repository
+        self.ttl_days = ttl_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self.stats = {"archived": 0, "batches": 0, "running": 0}
+
+    def start(self, job_queue: JobQueue):
+        if self.ttl_days > 0:
+            job_queue.run_repeating(self._run, self.interval, first=self.interval, name="archive")
+
+    async def _run(self, context: CallbackContext):
+        try:
+            await self.archive()
+        except Exception as err:
+            logger.error(f"Ошибка архивирования игр: {err}", exc_info=True)
+
+    async def archive(self, today: datetime.date = None) -> int:
+        before = (today or datetime.date.today()) - datetime.timedelta(days=self.ttl_days)
+
+        async def batch(limit: int) -> int:
+            archived = len(await self.repository.archive_games(before, limit))
+            self.stats["archived"] += archived
+            return archived
+
+        archived = await _in_batches(batch, self.batch_size, self.stats)
+        if archived:
+            logger.info(f"Archived {archived} games finished before {before}")
+        return archived
+
+
+class NotificationPruner:
+    """
+    Раз в interval секунд удаляет из outbox отправленные и неотправленные окончательно уведомления
+    старше ttl_days дней, пачками по batch_size. Ожидающие отправки уведомления не удаляются
+    """
+
+    def __init__(self, repository: AbstractRepository,
+                 ttl_days: int = config.NOTIFY_RETENTION_DAYS,
+                 interval: float = config.ARCHIVE_INTERVAL,
+                 batch_size: int = config.NOTIFY_PRUNE_BATCH_SIZE):
+        self.repository = repository
+        self.ttl_days = ttl_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self.stats = {"pruned": 0, "batches": 0, "running": 0}
+
+    def start(self, job_queue: JobQueue):
+        if self.ttl_days > 0:
+            job_queue.run_repeating(self._run, self.interval, first=self.interval, name="prune_notifications")
+
+    async def _run(self, context: CallbackContext):
+        try:
+            await self.prune()
+        except Exception as err:
+            logger.error(f"Ошибка удаления старых уведомлений: {err}", exc_info=True)
+
+    async def prune(self, now: datetime.datetime = None) -> int:
+        before = (now or datetime.datetime.now(datetime.timezone.utc)) - datetime.timedelta(days=self.ttl_days)
+
+        async def batch(limit: int) -> int:
+            pruned = await self.repository.prune_notifications(before, limit)
+            self.stats["pruned"] += pruned
+            return pruned
+
+        pruned = await _in_batches(batch, self.batch_size, self.stats)
+        if pruned:
+            logger.info(f"Pruned {pruned} notifications created before {before}")
+        return pruned
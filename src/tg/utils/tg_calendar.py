@@ -1,10 +1,13 @@
 import calendar
+import functools
 from datetime import date, timedelta
 from enum import Enum
 
 from telegram import InlineKeyboardMarkup
 from telegram import InlineKeyboardButton
 
+from src.tg.utils import callback_codec
+
 
 class MonthDate:
     def __init__(self, year: int, month: int):
@@ -57,6 +60,20 @@ class Action(str, Enum):
     def __str__(self):
         return self.value
 
+    @property
+    def code(self) -> str:
+        """Код в компактной callback_data, в верхнем регистре - коды действий игр в нижнем"""
+        return self.value.upper()
+
+    @classmethod
+    def from_code(cls, code: str) -> 'Action | None':
+        if not code.isupper():
+            return None
+        try:
+            return cls(code.lower())
+        except ValueError:
+            return None
+
 
 class CallbackBuilder:
     """
@@ -75,12 +92,30 @@ class CallbackBuilder:
         self.data = data
 
     def build(self) -> str:
-        root = f"{self.base_cb}{self.SPLIT_ROOT}{self.action}"
-        data = f"{self.SPLIT_BLOCK}{self.SPLIT_DATA.join(self.data)}" if self.data else ""
-        return root + data
+        return callback_codec.encode(self.action.code, *map(int, self.data or ()))
+
+    @classmethod
+    def match(cls, callback_data: object) -> bool:
+        """Фильтр callback_data календаря для CallbackQueryHandler"""
+        if not isinstance(callback_data, str):
+            return False
+        if callback_codec.is_compact(callback_data):
+            return Action.from_code(callback_data[1:2]) is not None
+        return callback_data.startswith(cls.base_cb + cls.SPLIT_ROOT)
 
     @classmethod
     def parse(cls, callback_data: str):
+        """Разбирает компактную callback_data, либо base_cb/action?data1&data2 кнопок, отправленных до нее"""
+        if callback_codec.is_compact(callback_data):
+            payload = callback_codec.decode(callback_data)
+            action = Action.from_code(payload.code)
+            if action is None:
+                raise ValueError(f"Неизвестное действие календаря <{callback_data}>")
+            data = []
+            while not payload.exhausted:
+                data.append(str(payload.int()))
+            return cls(action=action, data=data or None)
+
         meta, r_data = callback_data.split(cls.SPLIT_BLOCK) if cls.SPLIT_BLOCK in callback_data else (callback_data, "")
         base_cb, raw_action = meta.split(cls.SPLIT_ROOT)
         action = Action(raw_action)
@@ -111,6 +146,60 @@ class ButtonFactory:
         return InlineKeyboardButton(text, callback_data=cb.build())
 
 
+_FACTORY = ButtonFactory()
+# buttons are immutable, the same objects are shared by all keyboards
+_IGNORE_BUTTON = _FACTORY.build_ignore()
+_WEEK_ROWS = {locale: tuple(_FACTORY.build_ignore(w) for w in _WEEK[locale]) for locale in Locale}
+KEYBOARD_CACHE_SIZE = 128  # month keyboards
+
+_cache_day: date | None = None
+
+
+def _rollover():
+    """В полночь min_date по умолчанию сдвигается, клавиатуры прошлого дня больше не нужны"""
+    global _cache_day
+    today = date.today()
+    if today != _cache_day:
+        _month_keyboard.cache_clear()
+        _cache_day = today
+
+
+@functools.lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def _month_keyboard(year: int, month: int, min_date: date, max_date: date, locale: Locale) -> InlineKeyboardMarkup:
+    selected_month = MonthDate(year, month)
+
+    # Шапка календаря
+    keyboard = [
+        [_FACTORY.build_title(year, month, locale)],  # 2023 12
+        _WEEK_ROWS[locale]                            # Пн, Вт, Ср..
+    ]
+
+    # Тело календаря
+    for week in calendar.monthcalendar(year, month):
+        week_keys = []
+        for day_key in week:
+            if day_key and (min_date < selected_month.build_day(day_key) <= max_date):
+                button = _FACTORY.build_date(year, month, day_key)
+            else:
+                button = _IGNORE_BUTTON
+            week_keys.append(button)
+        keyboard.append(week_keys)
+
+    # Подвал календаря
+    if selected_month > MonthDate(min_date.year, min_date.month):
+        prev_key = _FACTORY.build_month(selected_month.build_prev_month(), selected_month)
+    else:
+        prev_key = _IGNORE_BUTTON
+
+    if selected_month < MonthDate(max_date.year, max_date.month):
+        next_key = _FACTORY.build_month(selected_month.build_next_month(), selected_month)
+    else:
+        next_key = _IGNORE_BUTTON
+    keyboard.append([prev_key, next_key])
+
+    return InlineKeyboardMarkup(keyboard)
+
+
 class TgCalendarKeyboard:
     def __init__(self,
                  min_date: date = None,
@@ -133,42 +222,10 @@ class TgCalendarKeyboard:
 
     @property
     def keyboard(self) -> InlineKeyboardMarkup:
-        # Подготовка
-        factory_b = ButtonFactory()
-        month_list = calendar.monthcalendar(self._selected_month.year, self._selected_month.month)
-
-        # Шапка календаря
-        keyboard = [
-            [factory_b.build_title(self._selected_month.year, self._selected_month.month, self.locale)],  # 2023 12
-            [factory_b.build_ignore(w) for w in _WEEK[self.locale]]                                       # Пн, Вт, Ср..
-        ]
-
-        # Тело календаря
-        for week in month_list:
-            week_keys = []
-            for day_key in week:
-                if day_key and (self.min_date < self._selected_month.build_day(day_key) <= self.max_date):
-                    button = factory_b.build_date(self._selected_month.year, self._selected_month.month, day_key)
-                else:
-                    button = factory_b.build_ignore()
-                week_keys.append(button)
-            keyboard.append(week_keys)
-
-        # Подвал календаря
-        if self._selected_month > MonthDate(self.min_date.year, self.min_date.month):
-            new_month = self._selected_month.build_prev_month()
-            prev_key = factory_b.build_month(new_month, self._selected_month)
-        else:
-            prev_key = factory_b.build_ignore()
-
-        if self._selected_month < MonthDate(self.max_date.year, self.max_date.month):
-            new_month = self._selected_month.build_next_month()
-            next_key = factory_b.build_month(new_month, self._selected_month)
-        else:
-            next_key = factory_b.build_ignore()
-        keyboard.append([prev_key, next_key])
-
-        return InlineKeyboardMarkup(keyboard)
+        """Клавиатура месяца строится один раз на (месяц, min_date, max_date, locale) и берется из кэша"""
+        _rollover()
+        return _month_keyboard(self._selected_month.year, self._selected_month.month,
+                               self.min_date, self.max_date, self.locale)
 
     def handle(self, callback_data: str) -> bool:
         """
@@ -0,0 +1,74 @@
+import asyncio
+from typing import Any, Awaitable, Hashable
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class UserOrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Обрабатывает обновления разных пользователей параллельно (не больше max_concurrent_updates одновременно),
+    а обновления одного пользователя - строго по очереди, поэтому состояние ConversationHandler
+    и user_data не ломаются
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self._locks: dict[Hashable, asyncio.Lock] = {}
+        self._waiters: dict[Hashable, int] = {}
+        self._active = 0
+        self.processed = 0
+
+    @staticmethod
+    def _key(update: object) -> Hashable | None:
+        if isinstance(update, Update):
+            if update.effective_user:
+                return "user", update.effective_user.id
+            if update.effective_chat:
+                return "chat", update.effective_chat.id
+        return None
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """Состояние очереди для мониторинга"""
+        return {
+            "active": self._active,
+            "waiting": max(0, sum(self._waiters.values()) - self._active),
+            "users": len(self._locks),
+            "processed": self.processed,
+        }
+
+    async def process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = self._key(update)
+        if key is None:
+            return await self._process(update, coroutine)
+
+        # the Application creates tasks in the order of updates and asyncio.Lock wakes waiters in FIFO order
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            async with lock:
+                await self._process(update, coroutine)
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+                del self._locks[key]
+
+    async def _process(self, update: object, coroutine: Awaitable[Any]) -> None:
+        # the semaphore of the base class is taken only when the update is first in its user's queue
+        await super().process_update(update, coroutine)
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        self._active += 1
+        try:
+            await coroutine
+        finally:
+            self._active -= 1
+            self.processed += 1
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
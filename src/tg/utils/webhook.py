@@ -0,0 +1,116 @@
+import asyncio
+import hmac
+import json
+import logging
+from http import HTTPStatus
+
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+MAX_BODY_SIZE = 1024 * 1024  # bytes
+MAX_HEADERS = 100
+KEEP_ALIVE_TIMEOUT = 75  # seconds
+
+
+class _BadRequest(Exception):
+    def __init__(self, status: HTTPStatus):
+        self.status = status
+
+
+class WebhookServer:
+    """
+    Минимальный HTTP/1.1 сервер для приема обновлений от Telegram на asyncio без дополнительных зависимостей.
+    Проверяет секретный заголовок и кладет обновления в очередь Application
+    """
+
+    def __init__(self, app: Application, listen: str, port: int, path: str, secret_token: str):
+        self.app = app
+        self.listen = listen
+        self.port = port
+        self.path = path
+        self.secret_token = secret_token.encode()
+        self._server: asyncio.Server | None = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.listen, self.port)
+        logger.info(f"Webhook server is listening on {self.listen}:{self.port}{self.path}")
+
+    async def stop(self):
+        if self._server is not None:
+            server, self._server = self._server, None
+            server.close()
+            await server.wait_closed()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            keep_alive = True
+            while keep_alive:
+                request_line = await asyncio.wait_for(reader.readline(), KEEP_ALIVE_TIMEOUT)
+                if not request_line:
+                    break
+                try:
+                    keep_alive = await self._handle_request(request_line, reader)
+                    status = HTTPStatus.OK
+                except _BadRequest as err:
+                    keep_alive, status = False, err.status
+                self._write_response(writer, status, keep_alive)
+                await writer.drain()
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_request(self, request_line: bytes, reader: asyncio.StreamReader) -> bool:
+        """
+        :return: True - соединение можно использовать для следующего запроса
+        """
+        try:
+            method, target, version = request_line.decode("latin-1").split()
+        except ValueError:
+            raise _BadRequest(HTTPStatus.BAD_REQUEST)
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            if len(headers) >= MAX_HEADERS:
+                raise _BadRequest(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise _BadRequest(HTTPStatus.BAD_REQUEST)
+        if length < 0:
+            raise _BadRequest(HTTPStatus.BAD_REQUEST)
+        if length > MAX_BODY_SIZE:
+            raise _BadRequest(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        body = await reader.readexactly(length)
+
+        if target != self.path:
+            raise _BadRequest(HTTPStatus.NOT_FOUND)
+        if method != "POST":
+            raise _BadRequest(HTTPStatus.METHOD_NOT_ALLOWED)
+        if not hmac.compare_digest(headers.get(SECRET_HEADER, "").encode(), self.secret_token):
+            raise _BadRequest(HTTPStatus.FORBIDDEN)
+
+        try:
+            update = Update.de_json(json.loads(body), self.app.bot)
+        except (ValueError, TypeError, KeyError):
+            raise _BadRequest(HTTPStatus.BAD_REQUEST)
+        if update:
+            await self.app.update_queue.put(update)
+
+        connection = headers.get("connection", "").lower()
+        return connection != "close" and (version != "HTTP/1.0" or connection == "keep-alive")
+
+    @staticmethod
+    def _write_response(writer: asyncio.StreamWriter, status: HTTPStatus, keep_alive: bool):
+        writer.write((f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                      f"Content-Length: 0\r\n"
+                      f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode("latin-1"))
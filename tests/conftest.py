@@ -0,0 +1,74 @@
+"""
+Тесты не требуют Telegram и Postgres: python -m pytest из корня проекта.
+Тесты Postgres выполняются, только если задан TEST_POSTGRES_DSN - отдельная база, в которую накатываются
+миграции, после каждого теста таблицы очищаются
+"""
+
+import contextlib
+import datetime
+import os
+
+import pytest
+from telegram import User
+
+os.environ.setdefault("BOT_TOKEN", "test")
+os.environ.setdefault("DEV_MODE", "1")
+os.environ["MEMORY_STORAGE_PATH"] = ""  # tests never touch the dev journal
+
+from src import db  # noqa: E402
+from src.core import config  # noqa: E402
+from src.domain.model import GameSanta, Player  # noqa: E402
+
+TEST_POSTGRES_DSN = os.environ.get("TEST_POSTGRES_DSN")
+TABLES = "games, players, notifications, bot_user_data, bot_conversations, game_reminders, games_archive"
+
+
+@pytest.fixture
+def postgres(monkeypatch):
+    """
+    Фабрика пула к тестовой базе, пул живет внутри event loop теста:
+
+        async with postgres():
+            ...
+    """
+    if not TEST_POSTGRES_DSN:
+        pytest.skip("TEST_POSTGRES_DSN is not set")
+    monkeypatch.setattr(config, "POSTGRES_DSN", TEST_POSTGRES_DSN)
+    db.setup()
+
+    @contextlib.asynccontextmanager
+    async def pool():
+        await db.init_pool()
+        try:
+            yield
+        finally:
+            async with db.connection() as conn:
+                await conn.execute(f"TRUNCATE {TABLES} CASCADE")
+            await db.close_pool()
+
+    return pool
+
+
+def _new_game(initiator_id: int = 1, title: str = "Game", description: str = "Description",
+              date_finish: datetime.date = datetime.date(2026, 12, 31)) -> GameSanta:
+    game = GameSanta.build_from_user(User(initiator_id, "Admin", False))
+    game.title = title
+    game.description = description
+    game.date_finish = date_finish
+    return game
+
+
+def _new_player(telegram_id: int, fullname: str = None, username: str = None) -> Player:
+    return Player.build_from_user(User(telegram_id, fullname or f"Player {telegram_id}", False, username=username))
+
+
+@pytest.fixture
+def new_game():
+    """Фабрика несохраненной игры: new_game(initiator_id=1, title="Game", description=..., date_finish=...)"""
+    return _new_game
+
+
+@pytest.fixture
+def new_player():
+    """Фабрика игрока: new_player(telegram_id, fullname=None, username=None)"""
+    return _new_player
@@ -0,0 +1,188 @@
+"""
+Оптимистичная блокировка игр: много корутин одновременно меняют одну игру, ни одно изменение не теряется
+"""
+
+import asyncio
+import random
+import types
+
+import pytest
+
+from src.core.exception import StaleGameError
+from src.domain.model import GameSanta, GameState
+from src.repository import Repository, RepositoryCache, RepositoryMemory
+from src.tg.utils import context as tg_context
+from src.tg.utils.context import CustomContext
+
+WRITERS = 100
+JOINS = 100
+
+
+class _JitterMemory(RepositoryMemory):
+    """Задержки как у запросов к БД, чтобы корутины перемешивались между чтением и записью"""
+
+    async def get(self, game_uuid: str) -> GameSanta:
+        await asyncio.sleep(random.random() / 1000)
+        return await super().get(game_uuid)
+
+    async def save(self, game: GameSanta) -> GameSanta:
+        await asyncio.sleep(random.random() / 1000)
+        return await super().save(game)
+
+
+def _context(repository) -> CustomContext:
+    # save_game needs only db_storage
+    return types.SimpleNamespace(db_storage=repository)
+
+
+async def _save_game(repository, game: GameSanta, change) -> GameSanta | None:
+    return await CustomContext.save_game(_context(repository), game, change)
+
+
+async def _increment_concurrently(repository, new_game, new_player):
+    game = await repository.save(new_game(description="0"))
+
+    async def writer():
+        def change(fresh: GameSanta) -> bool:
+            fresh.description = str(int(fresh.description) + 1)  # read-modify-write
+            return True
+
+        await _save_game(repository, await repository.get(game.uuid), change)
+
+    async def joiner(i: int):
+        await repository.join_game(game.uuid, new_player(1000 + i))
+
+    await asyncio.gather(*(writer() for _ in range(WRITERS)), *(joiner(i) for i in range(JOINS)))
+
+    final = await repository.get(game.uuid)
+    assert final.description == str(WRITERS)
+    assert len(final.players) == JOINS
+    assert final.version == WRITERS + JOINS
+
+
+@pytest.mark.parametrize("cached", [False, True], ids=["memory", "cache"])
+def test_concurrent_changes_are_not_lost(monkeypatch, cached, new_game, new_player):
+    monkeypatch.setattr(tg_context, "SAVE_ATTEMPTS", 10 ** 6)
+    repository = _JitterMemory(maxsize=0)
+    asyncio.run(_increment_concurrently(RepositoryCache(repository) if cached else repository, new_game, new_player))
+
+
+def test_concurrent_changes_are_not_lost_postgres(monkeypatch, postgres, new_game, new_player):
+    monkeypatch.setattr(tg_context, "SAVE_ATTEMPTS", 10 ** 6)
+
+    async def run():
+        async with postgres():
+            await _increment_concurrently(RepositoryCache(Repository()), new_game, new_player)
+
+    asyncio.run(run())
+
+
+def test_stale_save_writes_nothing(new_game, new_player):
+    async def run():
+        repository = RepositoryMemory(maxsize=0)
+        game = await repository.save(new_game())
+        first, second = await repository.get(game.uuid), await repository.get(game.uuid)
+
+        first.description = "first"
+        await repository.save(first)
+        second.description = "second"
+        second.notify([new_player(2)], "text")
+        with pytest.raises(StaleGameError):
+            await repository.save(second)
+
+        assert (await repository.get(game.uuid)).description == "first"
+        assert not repository.notifications
+
+    asyncio.run(run())
+
+
+def test_registration_switch_is_not_reverted(new_game):
+    """Два админа нажимают кнопку по одному и тому же состоянию: второй видит свежую игру, а не переключает назад"""
+
+    async def run():
+        repository = _JitterMemory(maxsize=0)
+        game = await repository.save(new_game())
+
+        async def switch(seen: GameSanta):
+            seen_state = seen.state
+
+            def change(fresh: GameSanta) -> bool:
+                if fresh.state != seen_state:
+                    return False
+                fresh.change_registration()
+                return True
+
+            return await _save_game(repository, seen, change)
+
+        # both admins see the same message, the jitter must not let one of them read after the other saved
+        seen = await asyncio.gather(repository.get(game.uuid), repository.get(game.uuid))
+        results = await asyncio.gather(*(switch(s) for s in seen))
+        assert all(r.state == GameState.REGISTRATION_CLOSE for r in results)
+        assert (await repository.get(game.uuid)).state == GameState.REGISTRATION_CLOSE
+
+    asyncio.run(run())
+
+
+def test_cache_copies_big_shuffled_game(new_game, new_player):
+    """Копия игры в кэше не рекурсивна: цепочка получателей длиной в тысячи игроков"""
+
+    async def run():
+        repository = RepositoryCache(RepositoryMemory(maxsize=0))
+        game = await repository.save(new_game())
+        for i in range(5000):
+            await repository.join_game(game.uuid, new_player(1000 + i))
+        await repository.shuffle_game(game.uuid)
+
+        first, second = await repository.get(game.uuid), await repository.get(game.uuid)
+        assert first is not second and first.players[0] is not second.players[0]
+        assert [p.recipient.telegram_id for p in first.players] == [p.recipient.telegram_id for p in second.players]
+
+        first.description = "changed"
+        assert (await repository.get(game.uuid)).description == "Description"
+
+    asyncio.run(run())
+
+
+class _SlowShuffleMemory(RepositoryMemory):
+    """Распределение пишется с задержкой, как транзакция в БД"""
+
+    async def shuffle_game(self, game_uuid: str, template: str = None, parse_mode: str = None):
+        await asyncio.sleep(0.01)
+        return await super().shuffle_game(game_uuid, template, parse_mode)
+
+
+def test_cache_is_not_left_stale_by_shuffle(new_game, new_player):
+    """Чтение во время распределения кладет в кэш игру до распределения, после записи она сбрасывается"""
+
+    async def run():
+        repository = RepositoryCache(_SlowShuffleMemory(maxsize=0), maxsize=10, ttl=60)
+        game = await repository.save(new_game())
+        for i in range(3):
+            await repository.join_game(game.uuid, new_player(1000 + i))
+
+        shuffle = asyncio.create_task(repository.shuffle_game(game.uuid))
+        await asyncio.sleep(0)
+        assert (await repository.get(game.uuid)).state == GameState.REGISTRATION_OPEN
+        await shuffle
+
+        shuffled = await repository.get(game.uuid)
+        assert shuffled.state == GameState.ALLOCATED
+        assert all(p.recipient for p in shuffled.players)
+
+    asyncio.run(run())
+
+
+def test_cache_keeps_newer_version(new_game):
+    async def run():
+        repository = RepositoryCache(RepositoryMemory(maxsize=0), maxsize=10, ttl=60)
+        game = await repository.save(new_game())
+        stale = await repository.get(game.uuid)
+
+        game.description = "new"
+        await repository.save(game)
+        repository._put(stale)  # a read that started before the save finishes after it
+
+        fresh = await repository.get(game.uuid)
+        assert fresh.description == "new" and fresh.version > stale.version
+
+    asyncio.run(run())
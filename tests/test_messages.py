@@ -0,0 +1,135 @@
+"""
+Кэш отрисовки игры: текст и клавиатура берутся из кэша для той же версии игры и роли пользователя,
+строка с получателем подставляется каждому своя, изменение игры дает новый рендер,
+view_game не вызывает edit_text, если сообщение уже показывает то же самое
+"""
+
+import asyncio
+import types
+from unittest import mock
+
+import pytest
+
+from src.domain.model import GameSanta
+from src.repository import RepositoryMemory
+from src.tg.elements import messages
+from src.tg.elements.messages import ViewGameMessage
+from src.tg.handlers import admin_santa
+
+BOT_LINK = "https://t.me/santa_bot"
+ADMIN_ID = 1
+
+
+@pytest.fixture
+def saved_game(new_game, new_player):
+    """Фабрика игры в repository с игроками 10, 11, ..."""
+
+    async def factory(repository: RepositoryMemory, players: int = 3) -> GameSanta:
+        game = await repository.save(new_game(ADMIN_ID, "Party", "Gifts up to 10$"))
+        for telegram_id in range(10, 10 + players):
+            await repository.join_game(game.uuid, new_player(telegram_id))
+        return await repository.get(game.uuid)
+
+    return factory
+
+
+def _cached_keys(game: GameSanta) -> list[tuple]:
+    return [key for key in messages._view_game_cache if key[0] == game.uuid]
+
+
+def test_render_is_cached_per_version_and_role(saved_game):
+    async def run():
+        repository = RepositoryMemory(maxsize=0, path="")
+        game = await saved_game(repository)
+
+        first = ViewGameMessage(game, BOT_LINK, ADMIN_ID)
+        again = ViewGameMessage(await repository.get(game.uuid), BOT_LINK, ADMIN_ID)
+        assert again.reply_markup is first.reply_markup
+        assert (again.text, again.render_key) == (first.text, first.render_key)
+
+        member, outsider = ViewGameMessage(game, BOT_LINK, 10), ViewGameMessage(game, BOT_LINK, 99)
+        assert member.reply_markup is not first.reply_markup
+        assert member.reply_markup == outsider.reply_markup  # only the owner gets the admin buttons
+        assert len({first.render_key, member.render_key, outsider.render_key}) == 3
+        assert len(_cached_keys(game)) == 3
+
+    asyncio.run(run())
+
+
+def test_recipient_line_is_filled_per_user(saved_game):
+    async def run():
+        repository = RepositoryMemory(maxsize=0, path="")
+        game = await saved_game(repository)
+        await repository.shuffle_game(game.uuid)
+        game = await repository.get(game.uuid)
+
+        views = {p.telegram_id: ViewGameMessage(game, BOT_LINK, p.telegram_id) for p in game.players}
+        assert len(_cached_keys(game)) == 1  # all members share one render
+        for telegram_id, view in views.items():
+            recipient = game.get_player(telegram_id).recipient
+            assert f"tg://user?id={recipient.telegram_id}" in view.text
+        assert len({view.text for view in views.values()}) == len(views)
+        assert len({view.render_key for view in views.values()}) == len(views)
+
+    asyncio.run(run())
+
+
+def test_changed_game_is_rendered_again(saved_game):
+    async def run():
+        repository = RepositoryMemory(maxsize=0, path="")
+        game = await saved_game(repository)
+        before = ViewGameMessage(game, BOT_LINK, ADMIN_ID)
+
+        game.title = "New party"
+        unsaved = ViewGameMessage(game, BOT_LINK, ADMIN_ID)
+        assert "New party" in unsaved.text
+        assert len(_cached_keys(game)) == 1  # a game with unsaved changes is not cached
+
+        await repository.save(game)
+        after = ViewGameMessage(await repository.get(game.uuid), BOT_LINK, ADMIN_ID)
+        assert "New party" in after.text and after.render_key != before.render_key
+        assert len(_cached_keys(game)) == 2
+
+    asyncio.run(run())
+
+
+def test_render_with_players_count_is_not_cached(saved_game, new_player):
+    async def run():
+        repository = RepositoryMemory(maxsize=0, path="")
+        game = await saved_game(repository, players=0)
+        result = await repository.join_game(game.uuid, new_player(10))
+
+        view = ViewGameMessage(result.game, BOT_LINK, 10, result.players_count)
+        assert "Зарегистрировано 1 игроков" in view.text
+        assert not _cached_keys(game)
+
+    asyncio.run(run())
+
+
+def test_view_game_skips_unchanged_edit(saved_game):
+    async def run():
+        repository = RepositoryMemory(maxsize=0, path="")
+        game = await saved_game(repository)
+        message = types.SimpleNamespace(chat_id=ADMIN_ID, message_id=100, reply_markup=None)
+
+        async def edit_text(text, parse_mode=None, reply_markup=None):
+            message.reply_markup = reply_markup
+            return message
+
+        message.edit_text = mock.AsyncMock(side_effect=edit_text)
+        query = types.SimpleNamespace(answer=mock.AsyncMock())
+        update = types.SimpleNamespace(callback_query=query, effective_message=message,
+                                       effective_user=types.SimpleNamespace(id=ADMIN_ID))
+        context = types.SimpleNamespace(db_storage=repository, game_id=game.uuid,
+                                        bot=types.SimpleNamespace(link=BOT_LINK))
+
+        await admin_santa.view_game(update, context)
+        await admin_santa.view_game(update, context)
+        assert message.edit_text.await_count == 1 and query.answer.await_count == 1
+
+        game.description = "Changed"
+        await repository.save(game)
+        await admin_santa.view_game(update, context)
+        assert message.edit_text.await_count == 2
+
+    asyncio.run(run())
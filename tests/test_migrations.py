@@ -0,0 +1,74 @@
+"""
+Слияние дублей игроков в миграции уникальности: в распределенной игре дубль вырезается из цикла подарков,
+каждый оставшийся игрок дарит ровно одному и получает ровно от одного, никто не дарит себе
+"""
+
+import asyncio
+import importlib.util
+import os
+
+from src import db
+
+MIGRATION = os.path.join(os.path.dirname(__file__), "..", "migrations", "20261018_02_Hn4wZ-unique-player-per-game.py")
+
+
+def _merge_duplicates_sql() -> str:
+    spec = importlib.util.spec_from_file_location("unique_player_per_game", MIGRATION)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.create
+
+
+async def _game(conn, telegram_ids: list[int], gives: dict[int, int]) -> tuple[str, list[int]]:
+    """
+    :param telegram_ids: строки игроков по порядку, повтор - дубль
+    :param gives: позиция дарящего -> позиция получателя
+    """
+    game_uuid = await conn.fetchval("""
+        INSERT INTO games (state, initiator_id, initiator_fullname, title, description, date_finish)
+        VALUES (11, 1, 'Admin', 'Game', '', DATE '2026-12-31') RETURNING uuid
+    """)
+    ids = []
+    for telegram_id in telegram_ids:
+        ids.append(await conn.fetchval("""
+            INSERT INTO players (telegram_id, fullname, game_uuid) VALUES ($1, 'Player', $2) RETURNING id
+        """, telegram_id, game_uuid))
+    for giver, receiver in gives.items():
+        await conn.execute("UPDATE players SET recipient_id = $1 WHERE id = $2", ids[receiver], ids[giver])
+    return game_uuid, ids
+
+
+async def _pairs(conn, game_uuid: str) -> dict[int, int | None]:
+    rows = await conn.fetch("""
+        SELECT p.telegram_id, r.telegram_id AS recipient
+        FROM players AS p LEFT JOIN players AS r ON r.id = p.recipient_id
+        WHERE p.game_uuid = $1
+    """, game_uuid)
+    return {row["telegram_id"]: row["recipient"] for row in rows}
+
+
+def test_duplicates_are_cut_out_of_the_cycle(postgres):
+    async def run():
+        async with postgres():
+            async with db.connection() as conn:
+                await conn.execute("ALTER TABLE players DROP CONSTRAINT players_game_uuid_telegram_id_key")
+
+                # 10 -> 11 -> 12 -> 11' -> 13 -> 10, the duplicate 11' also has a recipient
+                shuffled, _ = await _game(conn, [10, 11, 12, 11, 13], {0: 1, 1: 2, 2: 3, 3: 4, 4: 0})
+                # 10 -> 11 -> 11' -> 10, cutting 11' out makes 11 give to 10
+                adjacent, _ = await _game(conn, [10, 11, 11], {0: 1, 1: 2, 2: 0})
+                # the kept row joined after the shuffle: it takes the place of the duplicate
+                late, _ = await _game(conn, [20, 21, 20], {2: 1, 1: 2})
+                # two duplicates of one user
+                twice, _ = await _game(conn, [30, 31, 32, 31, 31], {0: 1, 1: 2, 2: 3, 3: 4, 4: 0})
+                not_shuffled, _ = await _game(conn, [40, 41, 41], {})
+
+                await conn.execute(_merge_duplicates_sql())
+
+                assert await _pairs(conn, shuffled) == {10: 11, 11: 12, 12: 13, 13: 10}
+                assert await _pairs(conn, adjacent) == {10: 11, 11: 10}
+                assert await _pairs(conn, late) == {20: 21, 21: 20}
+                assert await _pairs(conn, twice) == {30: 31, 31: 32, 32: 30}
+                assert await _pairs(conn, not_shuffled) == {40: None, 41: None}
+
+    asyncio.run(run())
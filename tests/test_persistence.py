@@ -0,0 +1,110 @@
+"""
+Черновики диалогов переживают рестарт: сохраненные игры всех диалогов загружаются одним запросом
+"""
+
+import asyncio
+import copy
+import json
+
+from telegram.ext import Application
+from telegram.request import BaseRequest
+
+from src.domain.model import GameSanta
+from src.repository import Repository, RepositoryMemory
+from src.tg.handlers.common import CreateGameStates
+from src.tg.utils.context import KEY_STORAGE
+from src.tg.utils.persistence import PostgresPersistence
+
+DIALOGS = 50
+SHUFFLED_PLAYERS = 1000
+
+
+class _CountingRepository(Repository):
+    def __init__(self):
+        self.calls = {"get": 0, "get_many": 0}
+
+    async def get(self, game_uuid: str) -> GameSanta:
+        self.calls["get"] += 1
+        return await super().get(game_uuid)
+
+    async def get_many(self, game_uuids):
+        self.calls["get_many"] += 1
+        return await super().get_many(game_uuids)
+
+
+def test_drafts_are_restored_in_one_query(postgres, new_game):
+    async def run():
+        async with postgres():
+            repository = _CountingRepository()
+            persistence = PostgresPersistence(repository, CreateGameStates, update_interval=60)
+
+            saved = {}
+            for user_id in range(1, DIALOGS + 1):
+                game = await repository.save(new_game(user_id))
+                saved[user_id] = game.uuid
+                await persistence.update_user_data(user_id, {KEY_STORAGE: game})
+            draft = new_game(1000)
+            await persistence.update_user_data(1000, {KEY_STORAGE: draft})
+            deleted = await repository.save(new_game(1001))
+            await persistence.update_user_data(1001, {KEY_STORAGE: deleted})
+            await repository.delete(deleted)
+            await persistence.flush()
+
+            restarted = PostgresPersistence(repository, CreateGameStates, update_interval=60)
+            user_data = await restarted.get_user_data()
+
+            assert repository.calls == {"get": 0, "get_many": 1}
+            assert {user_id: data[KEY_STORAGE].uuid for user_id, data in user_data.items()
+                    if user_id in saved} == saved
+            assert user_data[1000][KEY_STORAGE].uuid is None
+            assert user_data[1000][KEY_STORAGE].title == draft.title
+            assert KEY_STORAGE not in user_data[1001]
+
+    asyncio.run(run())
+
+
+class _NoNetwork(BaseRequest):
+    """Application не обращается к Bot API в этом тесте"""
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, *args, **kwargs):
+        raise AssertionError("Bot API is not available in tests")
+
+
+def test_update_persistence_copies_shuffled_game(monkeypatch, new_game, new_player):
+    """PTB копирует user_data через deepcopy: цепочка получателей большой игры не должна уходить в рекурсию"""
+
+    async def run():
+        persistence = PostgresPersistence(RepositoryMemory(maxsize=0, path=""), CreateGameStates, update_interval=60)
+        monkeypatch.setattr(persistence, "_schedule_write", lambda: None)
+        app = (Application.builder().token("0:test").request(_NoNetwork()).get_updates_request(_NoNetwork())
+               .persistence(persistence).build())
+
+        game = new_game(1)
+        game.uuid = "game"
+        for telegram_id in range(10, 10 + SHUFFLED_PLAYERS):
+            game.add_saved_player(new_player(telegram_id))
+        game.shuffle()
+        game.title = "Changed"
+        app.user_data[1][KEY_STORAGE] = game
+        app.mark_data_for_update_persistence(user_ids=1)
+
+        await app.update_persistence()
+        assert json.loads(persistence._dirty_user_data[1]) == {KEY_STORAGE: {"uuid": "game"}}
+
+        copied = copy.deepcopy(game)
+        assert [(p.telegram_id, p.recipient.telegram_id) for p in copied.players] == \
+               [(p.telegram_id, p.recipient.telegram_id) for p in game.players]
+        assert copied.players[0] is not game.players[0] and copied.players[0].recipient in copied.players
+        assert copied.meta.changed_fields == game.meta.changed_fields and copied.meta.shuffled_players
+
+    asyncio.run(run())
@@ -0,0 +1,79 @@
+"""
+Запросы игр пользователя идут по индексам: EXPLAIN запросов repository на заполненных таблицах
+не содержит последовательного чтения games и players
+"""
+
+import asyncio
+import contextlib
+import json
+
+from src import db
+from src.repository import Repository
+
+GAMES = 20000
+PLAYERS_PER_GAME = 5
+
+FILL = f"""
+    INSERT INTO games (state, initiator_id, initiator_fullname, title, description, date_finish)
+    SELECT 11, g, 'Admin', 'Game', 'Description', DATE '2026-12-31' + g % 30
+    FROM generate_series(1, {GAMES}) AS g;
+
+    INSERT INTO players (telegram_id, fullname, username, game_uuid)
+    SELECT games.initiator_id * 10 + p, 'Player', NULL, games.uuid
+    FROM games, generate_series(1, {PLAYERS_PER_GAME}) AS p;
+
+    ANALYZE games;
+    ANALYZE players;
+"""
+
+
+def _scans(plan: dict):
+    yield plan["Node Type"], plan.get("Relation Name")
+    for child in plan.get("Plans", ()):
+        yield from _scans(child)
+
+
+async def _explain(monkeypatch, call) -> list[tuple[str, str]]:
+    """Выполняет call и возвращает узлы планов всех его запросов"""
+    queries = []
+    connection = db.connection
+
+    @contextlib.asynccontextmanager
+    async def logged_connection():
+        async with connection() as conn:
+            with conn.query_logger(queries.append):
+                yield conn
+
+    monkeypatch.setattr(db, "connection", logged_connection)
+    await call()
+    monkeypatch.setattr(db, "connection", connection)
+
+    scans = []
+    async with db.connection() as conn:
+        for query in queries:
+            plan = await conn.fetchval(f"EXPLAIN (FORMAT JSON) {query.query}", *query.args)
+            scans.extend(_scans(json.loads(plan)[0]["Plan"]))
+    return scans
+
+
+def test_user_games_are_index_driven(monkeypatch, postgres):
+    async def run():
+        async with postgres():
+            async with db.connection() as conn:
+                await conn.execute(FILL)
+                game_uuid = str(await conn.fetchval("SELECT uuid FROM games WHERE initiator_id = 42"))
+
+            repository = Repository()
+            user_id = 42 * 10 + 1  # a member of the game of initiator 42
+            calls = {
+                "get": lambda: repository.get(game_uuid),
+                "get_list": lambda: repository.get_list(user_id),
+                "get_summaries": lambda: repository.get_summaries(user_id, 10),
+                "get_summaries_owner": lambda: repository.get_summaries(42, 10),
+            }
+            for name, call in calls.items():
+                scans = await _explain(monkeypatch, call)
+                seq_scans = [table for node, table in scans if node == "Seq Scan" and table in ("games", "players")]
+                assert not seq_scans, f"{name} reads {seq_scans} sequentially"
+
+    asyncio.run(run())
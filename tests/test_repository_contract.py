@@ -0,0 +1,247 @@
+"""
+Общий контракт repository: RepositoryMemory (с журналом и без), RepositoryCache и Repository
+ведут себя одинаково - возвращаемые значения, статусы, формат CSV
+"""
+
+import asyncio
+import contextlib
+import datetime
+import json
+import uuid
+
+import pytest
+
+from src.core import config
+from src.core.exception import StaleGameError
+from src.domain.model import GameState, JoinStatus, ShuffleStatus
+from src.repository import Repository, RepositoryCache, RepositoryMemory
+
+BACKENDS = ["memory", "memory_log", "cache", "postgres"]
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, tmp_path):
+    """Фабрика repository, которая используется внутри event loop теста: async with backend() as repository"""
+    if request.param == "postgres":
+        pool = request.getfixturevalue("postgres")
+
+        @contextlib.asynccontextmanager
+        async def postgres_repository():
+            async with pool():
+                yield Repository()
+
+        return postgres_repository
+
+    @contextlib.asynccontextmanager
+    async def memory_repository():
+        match request.param:
+            case "memory":
+                yield RepositoryMemory(maxsize=0, path="")
+            case "memory_log":
+                yield RepositoryMemory(maxsize=0, path=str(tmp_path / "games.log"))
+            case "cache":
+                yield RepositoryCache(RepositoryMemory(maxsize=0, path=""), maxsize=10, ttl=60)
+
+    return memory_repository
+
+
+def _run(backend, test):
+    async def run():
+        async with backend() as repository:
+            await test(repository)
+
+    asyncio.run(run())
+
+
+def test_save_and_get(backend, new_game):
+    async def test(repository):
+        game = new_game()
+        saved = await repository.save(game)
+        assert saved is game
+        assert game.uuid and game.version == 0 and not game.meta.changed
+
+        loaded = await repository.get(game.uuid)
+        assert loaded is not game
+        assert (loaded.title, loaded.description, loaded.date_finish, loaded.state, loaded.initiator_id) == \
+               (game.title, game.description, game.date_finish, GameState.REGISTRATION_OPEN, 1)
+        assert loaded.players == []
+        assert await repository.get(str(uuid.uuid4())) is None
+
+        loaded.description = "Changed"
+        await repository.save(loaded)
+        assert loaded.version == 1
+        assert (await repository.get(game.uuid)).description == "Changed"
+
+    _run(backend, test)
+
+
+def test_stale_save_is_rejected(backend, new_game):
+    async def test(repository):
+        game = await repository.save(new_game())
+        first, second = await repository.get(game.uuid), await repository.get(game.uuid)
+        first.title = "First"
+        await repository.save(first)
+
+        second.title = "Second"
+        with pytest.raises(StaleGameError):
+            await repository.save(second)
+        assert (await repository.get(game.uuid)).title == "First"
+
+    _run(backend, test)
+
+
+def test_join_game(backend, new_game, new_player):
+    async def test(repository):
+        game = await repository.save(new_game(title="Party"))
+        player = new_player(10)
+
+        result = await repository.join_game(game.uuid, player)
+        assert (result.status, result.title) == (JoinStatus.JOINED, "Party")
+        assert player.id is not None and player.game_uuid == game.uuid
+        # the reply is rendered from the result without reading the game again
+        assert (result.game.uuid, result.game.version, result.game.title) == (game.uuid, 1, "Party")
+        assert [p.telegram_id for p in result.game.players] == [10] and result.players_count == 1
+        assert (await repository.join_game(game.uuid, new_player(13))).players_count == 2
+        assert (await repository.join_game(game.uuid, new_player(10))).status == JoinStatus.ALREADY_JOINED
+        assert (await repository.join_game(str(uuid.uuid4()), new_player(11))).status == JoinStatus.NOT_FOUND
+
+        loaded = await repository.get(game.uuid)
+        assert [p.telegram_id for p in loaded.players] == [10, 13]
+        assert loaded.version == 2
+
+        loaded.change_registration()
+        await repository.save(loaded)
+        assert (await repository.join_game(game.uuid, new_player(12))).status == JoinStatus.REGISTRATION_CLOSED
+
+    _run(backend, test)
+
+
+def test_shuffle_game(backend, new_game, new_player):
+    async def test(repository):
+        game = await repository.save(new_game())
+        await repository.join_game(game.uuid, new_player(10))
+        assert (await repository.shuffle_game(game.uuid)).status == ShuffleStatus.NOT_ENOUGH_PLAYERS
+        assert (await repository.shuffle_game(str(uuid.uuid4()))).status == ShuffleStatus.NOT_FOUND
+
+        for telegram_id in range(11, 15):
+            await repository.join_game(game.uuid, new_player(telegram_id))
+        result = await repository.shuffle_game(game.uuid, "{title} {recipient} {username}", "MarkdownV2")
+        assert (result.status, result.players) == (ShuffleStatus.SHUFFLED, 5)
+
+        loaded = await repository.get(game.uuid)
+        assert loaded.state == GameState.ALLOCATED
+        assert sorted(p.recipient.telegram_id for p in loaded.players) == list(range(10, 15))
+        assert all(p.recipient is not p for p in loaded.players)
+
+        notifications = await repository.claim_notifications(100, lease=60)
+        assert sorted(n.chat_id for n in notifications) == list(range(10, 15))
+        assert (await repository.shuffle_game(game.uuid)).status == ShuffleStatus.WRONG_STATE
+
+    _run(backend, test)
+
+
+def test_players_csv(backend, new_game, new_player):
+    async def test(repository):
+        game = await repository.save(new_game())
+        assert await repository.get_players_csv(game.uuid) is None
+
+        await repository.join_game(game.uuid, new_player(10, 'Ivan "Vanya"; Jr', "vanya"))
+        await repository.join_game(game.uuid, new_player(11, "Anna"))
+        players = (await repository.get(game.uuid)).players
+        splitter = config.CSV_SPLITTER
+
+        csv = (await repository.get_players_csv(game.uuid)).read().decode()
+        assert csv.splitlines() == [
+            splitter.join(("id", "telegram_id", "fullname", "username", "recipient_id", "game_uuid")),
+            splitter.join((str(players[0].id), "10", '"Ivan ""Vanya""; Jr"', "vanya", "", game.uuid)),
+            splitter.join((str(players[1].id), "11", "Anna", "", "", game.uuid)),
+        ]
+
+        csv = (await repository.get_players_csv(game.uuid, ("fullname", "telegram_id"))).read().decode()
+        assert csv.splitlines()[0] == splitter.join(("fullname", "telegram_id"))
+        with pytest.raises(ValueError):
+            await repository.get_players_csv(game.uuid, ("password",))
+
+    _run(backend, test)
+
+
+def test_user_games(backend, new_game, new_player):
+    async def test(repository):
+        own = await repository.save(new_game(initiator_id=1, title="Own"))
+        joined = await repository.save(new_game(initiator_id=2, title="Joined"))
+        await repository.save(new_game(initiator_id=3, title="Other"))
+        await repository.join_game(joined.uuid, new_player(1))
+
+        assert sorted(g.title for g in await repository.get_list(1)) == ["Joined", "Own"]
+
+        page = await repository.get_summaries(1, limit=1)
+        assert len(page.items) == 1 and page.next_cursor and page.prev_cursor is None
+        rest = await repository.get_summaries(1, limit=1, cursor=page.next_cursor)
+        summaries = {s.title: s for s in page.items + rest.items}
+        assert (summaries["Own"].is_owner, summaries["Own"].is_member) == (True, False)
+        assert (summaries["Joined"].is_owner, summaries["Joined"].is_member) == (False, True)
+        assert summaries["Joined"].players_count == 1
+
+        games = await repository.get_many([own.uuid, joined.uuid, str(uuid.uuid4())])
+        assert {g.title for g in games.values()} == {"Own", "Joined"} and set(games) == {own.uuid, joined.uuid}
+
+    _run(backend, test)
+
+
+def test_delete_and_archive(backend, new_game, new_player):
+    async def test(repository):
+        deleted = await repository.save(new_game(title="Deleted"))
+        await repository.delete(deleted)
+        assert await repository.get(deleted.uuid) is None
+
+        old = new_game(title="Old")
+        old.date_finish = datetime.date(2020, 1, 1)
+        await repository.save(old)
+        await repository.join_game(old.uuid, new_player(10))
+        current = await repository.save(new_game(title="Current"))
+
+        assert await repository.archive_games(datetime.date(2021, 1, 1), limit=10) == [old.uuid]
+        assert await repository.get(old.uuid) is None
+        assert await repository.get(current.uuid) is not None
+        archived = await repository.get_archived(10)
+        assert [(g.title, [p.telegram_id for p in g.players]) for g in archived] == [("Old", [10])]
+
+    _run(backend, test)
+
+
+def test_memory_eviction_keeps_games_in_log(tmp_path, new_game, new_player):
+    """Вытеснение из памяти не удаляет игру: она читается из журнала и переживает рестарт"""
+
+    async def run():
+        path = str(tmp_path / "games.log")
+        repository = RepositoryMemory(maxsize=2, path=path)
+        games = [await repository.save(new_game(title=f"Game {i}")) for i in range(3)]
+        await repository.join_game(games[2].uuid, new_player(10))
+        assert games[0].uuid not in repository.storage
+
+        with open(path, encoding="utf-8") as log:
+            assert all(json.loads(line)["op"] != "delete" for line in log)
+
+        assert (await repository.get(games[0].uuid)).title == "Game 0"
+        assert games[1].uuid not in repository.storage  # the least recently used one gave its place
+
+        restarted = RepositoryMemory(maxsize=2, path=path)
+        for i, game in enumerate(games):
+            assert (await restarted.get(game.uuid)).title == f"Game {i}"
+        assert [p.telegram_id for p in (await restarted.get(games[2].uuid)).players] == [10]
+
+    asyncio.run(run())
+
+
+def test_memory_archive_is_not_evicted(new_game, new_player):
+    async def run():
+        repository = RepositoryMemory(maxsize=2, path="")
+        for i in range(5):
+            game = new_game(title=f"Old {i}")
+            game.date_finish = datetime.date(2020, 1, 1)
+            await repository.join_game((await repository.save(game)).uuid, new_player(10))
+            await repository.archive_games(datetime.date(2021, 1, 1), limit=10)
+
+        assert sorted(g.title for g in await repository.get_archived(10)) == [f"Old {i}" for i in range(5)]
+
+    asyncio.run(run())
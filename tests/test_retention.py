@@ -0,0 +1,54 @@
+"""
+Фоновая очистка: старые игры уходят в архив пачками, из outbox удаляются старые отправленные
+и неотправленные окончательно уведомления, ожидающие отправки остаются
+"""
+
+import asyncio
+import datetime
+
+from src import db
+from src.domain.model import NotificationStatus
+from src.repository import Repository, RepositoryMemory
+from src.tg.utils import retention
+from src.tg.utils.retention import GameArchiver, NotificationPruner
+
+
+def test_archiver_moves_games_in_batches(monkeypatch, new_game):
+    monkeypatch.setattr(retention, "BATCH_PAUSE", 0)
+
+    async def run():
+        repository = RepositoryMemory(maxsize=0, path="")
+        for i in range(7):
+            await repository.save(new_game(title=f"Game {i}", description="", date_finish=datetime.date(2020, 1, 1)))
+
+        archiver = GameArchiver(repository, ttl_days=30, batch_size=3)
+        assert await archiver.archive(datetime.date(2026, 1, 1)) == 7
+        assert archiver.stats == {"archived": 7, "batches": 3, "running": 0}
+        assert not repository.storage and len(repository.archive) == 7
+
+    asyncio.run(run())
+
+
+def test_pruner_keeps_pending_notifications(monkeypatch, postgres):
+    monkeypatch.setattr(retention, "BATCH_PAUSE", 0)
+
+    async def run():
+        async with postgres():
+            async with db.connection() as conn:
+                await conn.execute("""
+                    INSERT INTO notifications (chat_id, text, status, created_at)
+                    SELECT g, 'text', s, now() - make_interval(days => d)
+                    FROM generate_series(1, 5) AS g,
+                        unnest(array[$1, $2, $3]::smallint[]) AS s,
+                        unnest(array[1, 60]) AS d
+                """, *(int(s) for s in NotificationStatus))
+
+            pruner = NotificationPruner(Repository(), ttl_days=30, batch_size=3)
+            assert await pruner.prune() == 10  # sent and failed, 60 days old
+            assert pruner.stats["batches"] == 4
+
+            async with db.connection() as conn:
+                left = await conn.fetch("SELECT status, count(*) FROM notifications GROUP BY status ORDER BY status")
+            assert [(r["status"], r["count"]) for r in left] == [(21, 10), (22, 5), (23, 5)]
+
+    asyncio.run(run())
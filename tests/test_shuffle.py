@@ -0,0 +1,185 @@
+"""
+Свойства распределения Сант на случайных входах: каждый дарит ровно одному, никто не дарит себе
+и запрещенным получателям, с seed распределение воспроизводимо, невозможные запреты отклоняются
+"""
+
+import asyncio
+import datetime
+import random
+import types
+from unittest import mock
+
+import pytest
+
+from src.core import config
+from src.core.exception import ShuffleImpossibleError
+from src.domain.model import GameSanta, GameState
+from src.domain.shuffle import derange
+from src.repository import RepositoryMemory
+from src.tg.handlers import admin_santa
+from src.tg.utils.context import CustomContext
+
+CASES = 300
+
+
+def _random_forbidden(rng: random.Random, n: int, density: float) -> dict[int, set[int]]:
+    forbidden = {}
+    for giver in range(n):
+        banned = {r for r in range(n) if r != giver and rng.random() < density}
+        if banned:
+            forbidden[giver] = banned
+    return forbidden
+
+
+def _assert_valid(receivers: list[int], forbidden: dict[int, set[int]]):
+    n = len(receivers)
+    assert sorted(receivers) == list(range(n)), "every player receives exactly one gift"
+    for giver, receiver in enumerate(receivers):
+        assert giver != receiver
+        assert receiver not in forbidden.get(giver, ())
+
+
+def _feasible(n: int, forbidden: dict[int, set[int]]) -> bool:
+    """Перебор для маленьких n: существует ли допустимое распределение"""
+    def search(giver: int, taken: set[int]) -> bool:
+        if giver == n:
+            return True
+        for receiver in range(n):
+            if receiver != giver and receiver not in taken and receiver not in forbidden.get(giver, ()):
+                if search(giver + 1, taken | {receiver}):
+                    return True
+        return False
+
+    return search(0, set())
+
+
+def test_derange_without_exclusions_is_single_cycle():
+    rng = random.Random(1)
+    for n in range(2, 60):
+        receivers = derange(n, rng=rng)
+        _assert_valid(receivers, {})
+
+        seen, current = set(), 0
+        while current not in seen:
+            seen.add(current)
+            current = receivers[current]
+        assert len(seen) == n
+
+
+def test_derange_respects_exclusions():
+    rng = random.Random(2)
+    for _ in range(CASES):
+        n = rng.randint(2, 40)
+        forbidden = _random_forbidden(rng, n, rng.choice((0.05, 0.3, 0.6)))
+        try:
+            receivers = derange(n, forbidden, rng)
+        except ShuffleImpossibleError:
+            if n <= 8:
+                assert not _feasible(n, forbidden)
+            continue
+        _assert_valid(receivers, forbidden)
+
+
+def test_derange_finds_assignment_whenever_it_exists():
+    rng = random.Random(3)
+    for _ in range(CASES):
+        n = rng.randint(2, 7)
+        forbidden = _random_forbidden(rng, n, rng.choice((0.3, 0.5, 0.7)))
+        if _feasible(n, forbidden):
+            _assert_valid(derange(n, forbidden, rng), forbidden)
+        else:
+            with pytest.raises(ShuffleImpossibleError):
+                derange(n, forbidden, rng)
+
+
+def test_derange_is_reproducible_with_seed():
+    forbidden = _random_forbidden(random.Random(4), 50, 0.2)
+    first = derange(50, forbidden, random.Random(42))
+    assert derange(50, forbidden, random.Random(42)) == first
+
+
+@pytest.mark.parametrize("n, forbidden", [
+    (1, {}),
+    (2, {0: {1}}),
+    (3, {0: {1, 2}}),
+    (4, {0: {3}, 1: {3}, 2: {3}}),  # nobody may give to 3
+])
+def test_derange_impossible(n, forbidden):
+    with pytest.raises(ShuffleImpossibleError):
+        derange(n, forbidden, random.Random(0))
+
+
+def test_game_shuffle_applies_exclusions(new_game, new_player):
+    game = new_game()
+    game.uuid = "game"
+    for telegram_id in range(10, 30):
+        game.add_saved_player(new_player(telegram_id))
+    previous = [(p, p + 1) for p in range(10, 29)] + [(29, 10), (10, 999)]  # 999 is not in the game
+
+    game.shuffle(previous, seed=7)
+
+    assert game.state == GameState.ALLOCATED and game.meta.shuffled_players
+    pairs = {(p.telegram_id, p.recipient.telegram_id) for p in game.players}
+    assert len({receiver for _, receiver in pairs}) == len(game.players)
+    assert not pairs & set(previous)
+
+
+def test_previous_pairs_of_the_initiator(new_game, new_player):
+    async def run():
+        repository = RepositoryMemory(maxsize=0)
+
+        async def saved_game(date_finish: datetime.date, shuffle: bool) -> GameSanta:
+            game = await repository.save(new_game(date_finish=date_finish))
+            for telegram_id in range(10, 16):
+                await repository.join_game(game.uuid, new_player(telegram_id))
+            if shuffle:
+                await repository.shuffle_game(game.uuid)
+            return await repository.get(game.uuid)
+
+        await saved_game(datetime.date(2024, 12, 31), shuffle=True)
+        last = await saved_game(datetime.date(2025, 12, 31), shuffle=True)
+        current = await saved_game(datetime.date(2026, 12, 31), shuffle=False)
+        await repository.archive_games(datetime.date(2026, 1, 1), 10)
+
+        pairs = await repository.get_previous_pairs(current.uuid)
+        assert sorted(pairs) == sorted((p.telegram_id, p.recipient.telegram_id) for p in last.players)
+        assert await repository.get_previous_pairs("unknown") == []
+
+        game = await repository.get(current.uuid)
+        game.shuffle(pairs)
+        assert not {(p.telegram_id, p.recipient.telegram_id) for p in game.players} & set(pairs)
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("avoid_repeats", [False, True])
+def test_repeated_pair_is_still_shuffled(monkeypatch, avoid_repeats, new_game, new_player):
+    """Двое, игравшие вместе в прошлом году, не распределяются без повтора - тогда повтор разрешается"""
+    monkeypatch.setattr(config, "SHUFFLE_AVOID_REPEATS", avoid_repeats)
+
+    async def run():
+        repository = RepositoryMemory(maxsize=0)
+
+        async def saved_game(date_finish: datetime.date) -> GameSanta:
+            game = await repository.save(new_game(date_finish=date_finish))
+            for telegram_id in (10, 11):
+                await repository.join_game(game.uuid, new_player(telegram_id))
+            return game
+
+        await repository.shuffle_game((await saved_game(datetime.date(2025, 12, 31))).uuid)
+        game = await saved_game(datetime.date(2026, 12, 31))
+
+        query = types.SimpleNamespace(answer=mock.AsyncMock())
+        update = types.SimpleNamespace(callback_query=query)
+        context = types.SimpleNamespace(db_storage=repository, game_id=game.uuid)
+        context.save_game = lambda *args: CustomContext.save_game(context, *args)
+        with mock.patch.object(admin_santa, "view_game", mock.AsyncMock()) as view_game, \
+                mock.patch.object(repository, "get_previous_pairs", wraps=repository.get_previous_pairs) as pairs:
+            await admin_santa.shuffle_players(update, context)
+
+        assert (await repository.get(game.uuid)).state == GameState.ALLOCATED
+        view_game.assert_awaited_once()
+        assert pairs.await_count == int(avoid_repeats)
+        assert query.answer.await_count == int(avoid_repeats)  # the admin is told that the pairs are repeated
+
+    asyncio.run(run())
@@ -0,0 +1,76 @@
+"""
+Вебхук: обновления с верным секретом попадают в очередь Application по одному keep-alive соединению,
+запросы с чужим секретом, путем или методом отклоняются
+"""
+
+import asyncio
+import json
+import types
+
+from src.tg.utils.webhook import SECRET_HEADER, WebhookServer
+
+PATH = "/telegram"
+SECRET = "secret"
+
+
+def _request(body: bytes, secret: str = SECRET, path: str = PATH, method: str = "POST") -> bytes:
+    return (f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n{SECRET_HEADER}: {secret}\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n").encode() + body
+
+
+def _update(update_id: int) -> bytes:
+    return json.dumps({"update_id": update_id, "message": {
+        "message_id": 1, "date": 0, "text": "/start", "chat": {"id": 10, "type": "private"},
+    }}).encode()
+
+
+async def _status(reader: asyncio.StreamReader) -> int:
+    status = int((await reader.readline()).split()[1])
+    while await reader.readline() not in (b"\r\n", b""):
+        pass
+    return status
+
+
+def _serve(test):
+    async def run():
+        app = types.SimpleNamespace(bot=None, update_queue=asyncio.Queue())
+        server = WebhookServer(app, "127.0.0.1", 0, PATH, SECRET)
+        await server.start()
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", server._server.sockets[0].getsockname()[1])
+            try:
+                await test(app.update_queue, reader, writer)
+            finally:
+                writer.close()
+        finally:
+            await server.stop()
+
+    asyncio.run(run())
+
+
+def test_updates_are_queued_over_keep_alive():
+    async def test(queue, reader, writer):
+        for update_id in (1, 2):
+            writer.write(_request(_update(update_id)))
+            assert await _status(reader) == 200
+        assert [queue.get_nowait().update_id for _ in range(2)] == [1, 2]
+
+    _serve(test)
+
+
+def test_wrong_requests_are_rejected():
+    cases = [
+        (_request(_update(1), secret="wrong"), 403),
+        (_request(_update(1), path="/other"), 404),
+        (_request(b"", method="GET"), 405),
+        (_request(b"not json"), 400),
+        (_request(b"").replace(b"Content-Length: 0", b"Content-Length: -1"), 400),
+    ]
+    for request, expected in cases:
+        async def test(queue, reader, writer):
+            writer.write(request)
+            assert await _status(reader) == expected
+            assert await reader.read() == b""  # the connection is closed after an error
+            assert queue.empty()
+
+        _serve(test)